@@ -39,6 +39,43 @@ base_url = plex_base_url.rstrip('/')
 album_images = {}
 
 
+def _setup_session(
+    ssn: 'Session',
+    pool_size: int = 10,
+    retries: int = 3
+) -> 'Session':
+    """Mount an adapter on the session that keeps a pool of connections
+    alive and retries failed requests with a backoff.
+
+    Args:
+        ssn (Session): The requests session to set up.
+        pool_size (int, optional): The amount of connections to keep alive.
+            Defaults to 10.
+        retries (int, optional): The amount of times to retry a request that
+            failed to connect or got a 429 or 5xx response.
+            Defaults to 3.
+
+    Returns:
+        Session: The set up session.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False
+        )
+    )
+    ssn.mount('http://', adapter)
+    ssn.mount('https://', adapter)
+    return ssn
+
+
 def _process_album(
     ssn: 'Session',
     album_key: str
@@ -177,7 +214,7 @@ if __name__ == '__main__':
     from requests import Session
 
     # Setup vars
-    ssn = Session()
+    ssn = _setup_session(Session())
     ssn.headers.update({'Accept': 'application/json'})
     ssn.params.update({'X-Plex-Token': plex_api_token}) # type: ignore
 
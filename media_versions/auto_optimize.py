@@ -121,6 +121,79 @@ class LibraryFilter:
         return
 
 
+def _setup_session(
+    ssn: 'Session',
+    pool_size: int = 10,
+    retries: int = 3
+) -> 'Session':
+    """Mount an adapter on the session that keeps a pool of connections
+    alive and retries failed requests with a backoff.
+
+    Args:
+        ssn (Session): The requests session to set up.
+        pool_size (int, optional): The amount of connections to keep alive.
+            Defaults to 10.
+        retries (int, optional): The amount of times to retry a request that
+            failed to connect or got a 429 or 5xx response.
+            Defaults to 3.
+
+    Returns:
+        Session: The set up session.
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            raise_on_status=False
+        )
+    )
+    ssn.mount('http://', adapter)
+    ssn.mount('https://', adapter)
+    return ssn
+
+
+def _get_paged(
+    ssn: 'Session',
+    url: str,
+    params: Dict[str, Any] = {},
+    page_size: int = 500
+) -> Generator[Dict[str, Any], Any, Any]:
+    """Get the entries of a listing page by page,
+    so that only one page is in memory at a time.
+
+    Args:
+        ssn (Session): The plex requests session to fetch with.
+        url (str): The url of the listing.
+        params (Dict[str, Any], optional): The params to give with the request.
+            Defaults to {}.
+        page_size (int, optional): The amount of entries to request at once.
+            Defaults to 500.
+
+    Yields:
+        Generator[Dict[str, Any], Any, Any]: The entries of the listing.
+    """
+    start = 0
+    while True:
+        container: Dict[str, Any] = ssn.get(url, params={
+            **params,
+            'X-Plex-Container-Start': start,
+            'X-Plex-Container-Size': page_size
+        }).json()['MediaContainer']
+        entries: List[dict] = container.get('Metadata', [])
+        yield from entries
+
+        start += len(entries)
+        if not entries or start >= container.get('totalSize', start):
+            break
+    return
+
+
 def _get_library_entries(
     ssn: 'Session',
     library_filter: LibraryFilter
@@ -152,9 +225,10 @@ def _get_library_entries(
             continue
 
         print(lib['title'])
-        lib_output: List[dict] = ssn.get(
+        lib_output = _get_paged(
+            ssn,
             f'{base_url}/library/sections/{lib["key"]}/all'
-        ).json()['MediaContainer'].get('Metadata', [])
+        )
 
         if lib['type'] == 'movie':
             for movie in lib_output:
@@ -274,7 +348,7 @@ if __name__ == '__main__':
     from requests import Session
 
     # Setup vars
-    ssn = Session()
+    ssn = _setup_session(Session())
     ssn.headers.update({'Accept': 'application/json'})
     ssn.params.update({'X-Plex-Token': plex_api_token}) # type: ignore
 
@@ -26,6 +26,16 @@ plex_port = getenv('plex_port', plex_port)
 plex_api_token = getenv('plex_api_token', plex_api_token)
 base_url = f"http://{plex_ip}:{plex_port}"
 
+def _setup_session(ssn):
+	# keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def m3u_to_playlist(ssn, library_name: str, file_path: str, users: list=['@me']):
 	# Check for illegal arg parsing
 	if not path.isfile(file_path):
@@ -54,7 +64,7 @@ if __name__ == '__main__':
 	from argparse import ArgumentParser
 
 	# Setup vars
-	ssn = Session()
+	ssn = _setup_session(Session())
 	ssn.headers.update({'Accept': 'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 
@@ -30,6 +30,16 @@ overseerr_port = getenv('overseerr_port', overseerr_port)
 overseerr_api_token = getenv('overseerr_api_token', overseerr_api_token)
 overseerr_base_url = f"http://{overseerr_ip}:{overseerr_port}/api/v1"
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def overseerr_to_collection(plex_ssn, overseerr_ssn, library_name: str, collection_name: str='Overseerr requests'):
 	result_json = []
 
@@ -72,10 +82,10 @@ if __name__ == '__main__':
 	from argparse import ArgumentParser
 
 	#setup vars
-	plex_ssn = Session()
+	plex_ssn = _setup_session(Session())
 	plex_ssn.headers.update({'Accept': 'application/json'})
 	plex_ssn.params.update({'X-Plex-Token': plex_api_token})
-	overseerr_ssn = Session()
+	overseerr_ssn = _setup_session(Session())
 	overseerr_ssn.headers.update({'X-Api-Key': overseerr_api_token})
 
 	#setup arg parsing
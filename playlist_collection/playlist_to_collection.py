@@ -22,6 +22,16 @@ plex_port = getenv('plex_port', plex_port)
 plex_api_token = getenv('plex_api_token', plex_api_token)
 base_url = f"http://{plex_ip}:{plex_port}"
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def playlist_to_collection(ssn, library_name: str, playlist_name: str, remove_playlist: bool=False):
 	result_json = []
 
@@ -78,7 +88,7 @@ if __name__ == '__main__':
 	import requests, argparse
 
 	#setup vars
-	ssn = requests.Session()
+	ssn = _setup_session(requests.Session())
 	ssn.headers.update({'Accept': 'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 
@@ -22,6 +22,16 @@ radarr_port = getenv('radarr_port', radarr_port)
 radarr_api_token = getenv('radarr_api_token', radarr_api_token)
 base_url = f"http://{radarr_ip}:{radarr_port}/api/v3"
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def delete_unmonitor_on_tag(ssn, tag_name: str, delete_file: bool, unmonitor_movie: bool):
 	result_json = []
 
@@ -59,7 +69,7 @@ if __name__ == '__main__':
 	import requests, argparse
 
 	#setup vars
-	ssn = requests.Session()
+	ssn = _setup_session(requests.Session())
 	ssn.params.update({'apikey': radarr_api_token})
 
 	#setup arg parsing
@@ -24,6 +24,16 @@ radarr_ip = getenv('radarr_ip', radarr_ip)
 radarr_port = getenv('radarr_port', radarr_port)
 radarr_api_token = getenv('radarr_api_token', radarr_api_token)
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def unmonitor_downloaded_movies(ssn, movie_id: str):
 	result = ssn.put(f'http://{radarr_ip}:{radarr_port}/api/v3/movie/editor', json={'movieIds':[movie_id],'monitored': False})
 	return result
@@ -40,7 +50,7 @@ if __name__ == '__main__':
 	import requests
 
 	#setup vars
-	ssn = requests.Session()
+	ssn = _setup_session(requests.Session())
 	ssn.params.update({'apikey': radarr_api_token})
 	movie_id = str(getenv('radarr_movie_id'))
 
@@ -27,12 +27,28 @@ plex_api_token = ''
 database_folder = ''
 plex_linux_user = 'plex'
 plex_linux_group = 'plex'
+#The amount of rows that are written to the database file before the progress is saved
+write_batch_size = 1000
+#The maximum amount of seconds between saving the progress to the database file
+write_interval = 10.0
+#The maximum amount of megabytes of images that are kept in memory before they're written to the database file
+write_buffer_size = 64
+#The amount of images that are downloaded at the same time
+image_workers = 4
+#The amount of changes that are sent to plex at the same time when importing
+write_back_workers = 4
+#The amount of times a change is sent again when plex fails to handle it and the seconds to wait before the first retry (doubles every retry)
+write_back_retries = 3
+write_back_backoff = 1.0
 
 from sys import platform
 from os import getenv, path, listdir
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from sqlite3 import connect
 from datetime import datetime
-from time import perf_counter
+from hashlib import sha256
+from time import perf_counter, sleep
 linux_platform = platform == 'linux'
 if linux_platform == True:
 	from pwd import getpwnam
@@ -44,9 +60,29 @@ plex_ip = getenv('plex_ip', plex_ip)
 plex_port = getenv('plex_port', plex_port)
 plex_api_token = getenv('plex_api_token', plex_api_token)
 database_folder = getenv('database_folder', database_folder)
+write_batch_size = int(getenv('write_batch_size', write_batch_size))
+write_interval = float(getenv('write_interval', write_interval))
+write_buffer_size = int(getenv('write_buffer_size', write_buffer_size))
+image_workers = int(getenv('image_workers', image_workers))
+write_back_workers = int(getenv('write_back_workers', write_back_workers))
+write_back_retries = int(getenv('write_back_retries', write_back_retries))
+write_back_backoff = float(getenv('write_back_backoff', write_back_backoff))
 base_url = f"http://{plex_ip}:{plex_port}"
 request_cache = {}
 guid_map = {}
+guid_map_complete = False
+write_buffer = {}
+write_buffer_bytes = 0
+last_write = perf_counter()
+image_sources = None
+image_hashes = None
+image_executor = None
+image_downloads = {}
+image_queue = deque()
+write_back_executor = None
+write_back_chains = {}
+write_back_pending = deque()
+checkpoints = {}
 if linux_platform == True:
 	plex_linux_user = getenv('plex_linux_user', plex_linux_user)
 	plex_linux_group = getenv('plex_linux_group', plex_linux_group)
@@ -84,9 +120,9 @@ media_types = {
 			useOriginalTitle INTEGER(1),
 			watched_status TEXT,
 			hash VARCHAR(255),
-			chapter_thumbnails BLOB,
-			poster BLOB,
-			art BLOB
+			chapter_thumbnails TEXT,
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		1,
@@ -122,8 +158,8 @@ media_types = {
 			showOrdering VARCHAR(10),
 			languageOverride VARCHAR(5),
 			useOriginalTitle INTEGER(1),
-			poster BLOB,
-			art BLOB
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		4,
@@ -141,8 +177,8 @@ media_types = {
 			updated_at INTEGER(8),
 			title VARCHAR(255),
 			summary TEXT,
-			poster BLOB,
-			art BLOB
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		4,
@@ -173,9 +209,9 @@ media_types = {
 			intro_end INTEGER,
 			watched_status TEXT,
 			hash VARCHAR(255),
-			chapter_thumbnails BLOB,
-			poster BLOB,
-			art BLOB
+			chapter_thumbnails TEXT,
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		4,
@@ -201,8 +237,8 @@ media_types = {
 			Country TEXT,
 			Similar TEXT,
 			albumSort INTEGER(1),
-			poster BLOB,
-			art BLOB
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		10,
@@ -231,8 +267,8 @@ media_types = {
 			Genre TEXT,
 			Style TEXT,
 			Mood TEXT,
-			poster BLOB,
-			art BLOB
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		10,
@@ -281,8 +317,8 @@ media_types = {
 			collectionSort INTEGER(1),
 			subtype VARCHAR(10),
 			guids TEXT,
-			poster BLOB,
-			art BLOB
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		18,
@@ -302,8 +338,8 @@ media_types = {
 			summary TEXT,
 			playlistType VARCHAR(15),
 			guids TEXT,
-			poster BLOB,
-			art BLOB
+			poster VARCHAR(64),
+			art VARCHAR(64)
 		);
 		""",
 		15,
@@ -411,6 +447,27 @@ media_types = {
 		[]
 	)
 }
+#every image is stored once in the image table, with the records referring to it by the hash of it's content
+image_tables = """
+CREATE TABLE IF NOT EXISTS image (
+	hash VARCHAR(64) PRIMARY KEY,
+	data BLOB
+);
+CREATE TABLE IF NOT EXISTS image_source (
+	machine_id TEXT,
+	url TEXT,
+	hash VARCHAR(64),
+	PRIMARY KEY (machine_id, url)
+);
+CREATE TABLE IF NOT EXISTS checkpoint (
+	machine_id TEXT,
+	type VARCHAR(6),
+	process TEXT,
+	library_key VARCHAR(15),
+	rating_key VARCHAR(15),
+	PRIMARY KEY (machine_id, type, process, library_key)
+);
+"""
 process_summary = {
 	'metadata': "The standard plex metadata like title, summary, tags and more.",
 	'advanced_metadata': "The advanced plex settings (metadata) for media",
@@ -432,11 +489,21 @@ metadata_skip_keys = ('rating_key','guid','updated_at','poster','art','watched_s
 
 def _leave(db, plex_db=None, e=None):
 	#called upon early exit of script
+	global image_executor
+
 	print('Shutting down...')
+	#records that are still waiting on images are exported the next time as they aren't in the database file
+	image_queue.clear()
+	if image_executor != None:
+		image_executor.shutdown(wait=True, cancel_futures=True)
+		image_executor = None
+	#changes that haven't been sent to plex yet are dropped
+	_write_back_wait(cancel=True)
+	_flush(db.cursor())
 	db.commit()
 	if plex_db != None:
 		plex_db.commit()
-	print('Progress saved')
+	print('Progress saved; use -R/--Resume to continue where it stopped')
 	if e != None:
 		print('AN ERROR OCCURED. ALL YOUR PROGRESS IS SAVED. PLEASE SHARE THE FOLLOWING WITH THE DEVELOPER:')
 		raise e
@@ -452,11 +519,267 @@ def _req_cache(ssn, url, params={}, headers={}):
 
 	return request_cache[url]
 
-def _guid_to_ratingkey(ssn, guid: str):
-	global guid_map
+def _write(cursor, comm: str, values: list):
+	#buffer the command so that it can be executed in a batch together with the same commands
+	#the commands are executed grouped per command and not in the order that they were given,
+	#so the buffered commands shouldn't depend on each other
+	global write_buffer_bytes
+
+	write_buffer.setdefault(comm, []).append(values)
+	write_buffer_bytes += sum(len(v) for v in values if isinstance(v, bytes))
+	if sum(map(len, write_buffer.values())) >= write_batch_size \
+	or write_buffer_bytes >= write_buffer_size * 1_000_000 \
+	or perf_counter() - last_write >= write_interval:
+		_flush(cursor)
+
+	return
+
+def _flush(cursor):
+	#execute all buffered commands and save the progress
+	global write_buffer, write_buffer_bytes, last_write
+
+	#empty the buffer first so that a failing batch isn't tried again when leaving
+	buffer, write_buffer = write_buffer, {}
+	write_buffer_bytes = 0
+	last_write = perf_counter()
+	for comm, values in buffer.items():
+		cursor.executemany(comm, values)
+	cursor.connection.commit()
+
+	return
+
+def _image_sources(ssn, cursor):
+	#the url of an image contains the time that the image was set,
+	#so an url that has been downloaded before doesn't have to be downloaded again
+	global image_sources, image_hashes
+
+	if image_sources == None:
+		machine_id = _req_cache(ssn, f'{base_url}/')['MediaContainer']['machineIdentifier']
+		cursor.execute("SELECT url, hash FROM image_source WHERE machine_id = ?;", (machine_id,))
+		image_sources = dict(cursor.fetchall())
+		cursor.execute("SELECT hash FROM image;")
+		image_hashes = set(h[0] for h in cursor.fetchall())
+
+	return image_sources
+
+def _image_hash(ssn, cursor, content: bytes, url: str=None):
+	#store the image and return the hash to refer to it with
+	sources = _image_sources(ssn, cursor)
+	image_hash = sha256(content).hexdigest()
+	if not image_hash in image_hashes:
+		_write(cursor, "INSERT OR IGNORE INTO image(hash, data) VALUES (?, ?);", [image_hash, content])
+		image_hashes.add(image_hash)
+	if url != None:
+		machine_id = _req_cache(ssn, f'{base_url}/')['MediaContainer']['machineIdentifier']
+		_write(cursor, "INSERT OR REPLACE INTO image_source(machine_id, url, hash) VALUES (?, ?, ?);", [machine_id, url, image_hash])
+		sources[url] = image_hash
+
+	return image_hash
+
+def _download_image(ssn, url: str, token: str):
+	r = ssn.get(f'{base_url}{url}', params={'X-Plex-Token': token})
+	if r.status_code != 200: return None
+	return r.content
+
+def _queue_write(ssn, cursor, type: str, db_keys: list, db_values: list, images: dict):
+	#write the record once the images (column -> url) are downloaded, without waiting for them
+	global image_executor
+
+	if image_executor == None:
+		image_executor = ThreadPoolExecutor(max_workers=image_workers)
+
+	sources = _image_sources(ssn, cursor)
+	downloads = {}
+	for column, url in images.items():
+		if url in sources:
+			db_keys.append(column)
+			db_values.append(sources[url])
+			continue
+		if not url in image_downloads:
+			#the token of the current user is needed to download images of it's playlists
+			image_downloads[url] = image_executor.submit(_download_image, ssn, url, ssn.params.get('X-Plex-Token'))
+		downloads[column] = (url, image_downloads[url])
+
+	image_queue.append((type, db_keys, db_values, downloads))
+	#only wait when too many records are waiting so that memory usage stays bounded
+	_write_downloaded(ssn, cursor, wait=len(image_queue) > write_batch_size)
+
+	return
+
+def _write_downloaded(ssn, cursor, wait: bool=False, wait_all: bool=False):
+	#write the records of which the images are downloaded, in the order that they were queued
+	sources = _image_sources(ssn, cursor)
+	while image_queue:
+		type, db_keys, db_values, downloads = image_queue[0]
+		if not (wait or wait_all) and not all(f.done() for _, f in downloads.values()):
+			break
+
+		for column, (url, future) in downloads.items():
+			if url in sources:
+				#another record with the same image was written first
+				image_hash = sources[url]
+			else:
+				image_downloads.pop(url, None)
+				content = future.result()
+				if content == None: continue
+				image_hash = _image_hash(ssn, cursor, content, url=url)
+			db_keys.append(column)
+			db_values.append(image_hash)
+
+		comm = f"""
+		INSERT OR REPLACE INTO {type} ({",".join(db_keys)})
+		VALUES ({",".join(['?'] * len(db_keys))})
+		"""
+		_write(cursor, comm, db_values)
+		image_queue.popleft()
+		wait = False
+
+	return
 
-	rating_key = guid_map.get(guid)
+def _send(ssn, method: str, url: str, **kwargs):
+	#send the request, trying again with increasing delays when plex can't handle it (right now)
+	for attempt in range(write_back_retries + 1):
+		if attempt > 0:
+			sleep(write_back_backoff * 2 ** (attempt - 1))
+		try:
+			r = getattr(ssn, method)(url, **kwargs)
+		except IOError:
+			if attempt == write_back_retries: raise
+			continue
+		if r.status_code < 500 and r.status_code != 429:
+			break
+
+	#raise when plex keeps failing or when the admin token is refused, as every following change would be lost too
+	if r.status_code >= 500 or r.status_code == 429 or (r.status_code == 401 and kwargs.get('params', {}).get('X-Plex-Token') == plex_api_token):
+		r.raise_for_status()
+	return r
+
+def _write_back_calls(ssn, rating_key: str, previous, calls: list):
+	#wait for the earlier changes of the same media so that they're applied in the order that they were given
+	if previous != None:
+		wait([previous])
+	for method, url, kwargs in calls:
+		r = _send(ssn, method, url, **kwargs)
+		if 400 <= r.status_code < 500:
+			#plex refused only this change (e.g. the library isn't shared with the user), so continue with the rest
+			print(f'	Failed to apply change to {rating_key}: {method.upper()} {url.replace(base_url, "")} returned {r.status_code}')
+
+	return
+
+def _write_back(ssn, rating_key: str, calls: list):
+	#send the changes (method, url, kwargs) of the media to plex without waiting for them
+	global write_back_executor
+
+	if not calls: return
+	if write_back_executor == None:
+		write_back_executor = ThreadPoolExecutor(max_workers=write_back_workers)
+
+	previous = write_back_chains.get(rating_key)
+	future = write_back_executor.submit(_write_back_calls, ssn, rating_key, previous, calls)
+	write_back_chains[rating_key] = future
+	write_back_pending.append((rating_key, future))
+
+	#only wait when too many changes are waiting so that memory usage stays bounded
+	while write_back_pending and (
+		len(write_back_pending) > write_back_workers * 16
+		or write_back_pending[0][0] == None
+		or write_back_pending[0][1].done()
+	):
+		_write_back_done(*write_back_pending.popleft())
+
+	return
+
+def _write_back_after(func):
+	#call the function once all changes that were given before it are sent to plex
+	if write_back_pending:
+		write_back_pending.append((None, func))
+	else:
+		func()
+
+	return
+
+def _write_back_done(rating_key: str, future):
 	if rating_key == None:
+		#function given to _write_back_after
+		future()
+		return
+	if write_back_chains.get(rating_key) is future:
+		write_back_chains.pop(rating_key)
+	#raises the error of the changes if they failed
+	future.result()
+
+	return
+
+def _write_back_wait(cancel: bool=False):
+	#wait for all changes to be sent to plex
+	global write_back_executor
+
+	if write_back_executor == None: return
+	if cancel == True:
+		write_back_pending.clear()
+		write_back_chains.clear()
+		write_back_executor.shutdown(wait=True, cancel_futures=True)
+	else:
+		while write_back_pending:
+			_write_back_done(*write_back_pending.popleft())
+		write_back_executor.shutdown(wait=True)
+	write_back_executor = None
+
+	return
+
+def _checkpoint_skip(library_key: str, rating_key: str):
+	#whether the media was already done in the run that is resumed
+	resume_from = checkpoints.get(library_key)
+	if resume_from == None:
+		return False
+	if resume_from == rating_key:
+		#continue after this media
+		checkpoints.pop(library_key)
+	return True
+
+def _checkpoint(ssn, cursor, type: str, process: str, library_key: str, rating_key: str):
+	#record that the media is done once everything of it is written
+	machine_id = _req_cache(ssn, f'{base_url}/')['MediaContainer']['machineIdentifier']
+	db_keys = ['machine_id', 'type', 'process', 'library_key', 'rating_key']
+	db_values = [machine_id, type, process, library_key, rating_key]
+	if type == 'export':
+		#written after the records of the media that are still waiting on their images
+		_queue_write(ssn, cursor, 'checkpoint', db_keys, db_values, {})
+	elif type == 'import':
+		#written once the changes of the media are sent to plex
+		comm = "INSERT OR REPLACE INTO checkpoint (machine_id, type, process, library_key, rating_key) VALUES (?, ?, ?, ?, ?);"
+		_write_back_after(lambda: _write(cursor, comm, db_values))
+
+	return
+
+def _image_data(cursor, value):
+	#images are referred to by their hash but older database files have them inline
+	if value == None or isinstance(value, bytes):
+		return value
+
+	image = cursor.connection.execute("SELECT data FROM image WHERE hash = ?;", (value,)).fetchone()
+	return image[0] if image != None else None
+
+def _paged(ssn, url: str, params: dict={}, page_size: int=500):
+	#request the listing page by page so that only one page is in memory at a time
+	start = 0
+	while True:
+		container = ssn.get(url, params={**params, 'X-Plex-Container-Start': start, 'X-Plex-Container-Size': page_size}).json()['MediaContainer']
+		entries = container.get('Metadata',[])
+		yield from entries
+
+		start += len(entries)
+		#servers that don't support paging give everything at once without a total size
+		if not entries or start >= container.get('totalSize', start):
+			break
+
+	return
+
+def _guid_to_ratingkey(ssn, guid: str):
+	global guid_map_complete
+
+	if not guid in guid_map and guid_map_complete == False:
+		#map the guids of all movies and episodes at once instead of going through the libraries for every guid
 		sections = _req_cache(ssn, f'{base_url}/library/sections')['MediaContainer'].get('Directory',[])
 		for lib in sections:
 			if lib['type'] == 'movie':
@@ -464,20 +787,12 @@ def _guid_to_ratingkey(ssn, guid: str):
 			elif lib['type'] == 'show':
 				media_type = '4'
 			else: continue
-			lib_output = _req_cache(ssn, f'{base_url}/library/sections/{lib["key"]}/all', params={'type': media_type, 'includeGuids': '1'})['MediaContainer'].get('Metadata',[])
-			for media in lib_output:
-				media_guid = str(media['Guid'])
-				if media_guid == guid:
-					rating_key = media['ratingKey']
-					guid_map[media_guid] = media['ratingKey']
-					break
-			else:
-				continue
-			break
-		else:
-			rating_key = None
+			for media in _paged(ssn, f'{base_url}/library/sections/{lib["key"]}/all', params={'type': media_type, 'includeGuids': '1'}):
+				if 'Guid' in media:
+					guid_map.setdefault(str(media['Guid']), media['ratingKey'])
+		guid_map_complete = True
 
-	return rating_key
+	return guid_map.get(guid)
 
 def _export(
 		type: str, data: dict, ssn, cursor, user_data: tuple, watched_map: dict, timestamp_map: dict,
@@ -515,15 +830,14 @@ def _export(
 	rating_key = data['ratingKey']
 
 	#skip media if it hasn't been edited since last time (or it isn't matched to any series)
+	#an outdated record is replaced when writing the new one
 	updated_at = timestamp_map[type].get(rating_key)
 	if updated_at != None:
 		if updated_at == data.get('updatedAt',0):
 			return
-		else:
-			cursor.execute(f"DELETE FROM {type} WHERE rating_key = '{rating_key}'")
 	elif type == 'collection':
 		#collection either hasn't been added to db yet or has been imported after exporting
-		cursor.execute(f'DELETE FROM {type} WHERE title = "{data["title"]}";')
+		_write(cursor, f"DELETE FROM {type} WHERE title = ? AND rating_key != ?;", [data['title'], rating_key])
 
 	#if requested, export collection here and return function (collection is a "special" case)
 	if type == 'collection':
@@ -550,25 +864,13 @@ def _export(
 		db_keys.append('guids')
 		db_values.append("|".join(str(m['Guid']) for m in collection_content if 'Guid' in m))
 
-		#export images
+		#export images and write to database
+		images = {}
 		if 'thumb' in collection_info:
-			r = ssn.get(f'{base_url}{collection_info["thumb"]}')
-			if r.status_code == 200:
-				db_keys.append('poster')
-				db_values.append(r.content)
-
+			images['poster'] = collection_info['thumb']
 		if 'art' in collection_info:
-			r = ssn.get(f'{base_url}{collection_info["art"]}')
-			if r.status_code == 200:
-				db_keys.append('art')
-				db_values.append(r.content)
-
-		#write to database
-		comm = f"""
-		INSERT INTO {type} ({",".join(db_keys)})
-		VALUES ({",".join(['?'] * len(db_keys))})
-		"""
-		cursor.execute(comm, db_values)
+			images['art'] = collection_info['art']
+		_queue_write(ssn, cursor, type, db_keys, db_values, images)
 		return
 
 	#if requested, export playlist here and return function (playlist is a "special" case)
@@ -583,25 +885,13 @@ def _export(
 		db_keys.append('guids')
 		db_values.append("|".join(str(m['Guid']) for m in playlist_content if 'Guid' in m))
 
-		#export images
+		#export images and write to database
+		images = {}
 		if 'thumb' in data:
-			r = ssn.get(f'{base_url}{data["thumb"]}')
-			if r.status_code == 200:
-				db_keys.append('poster')
-				db_values.append(r.content)
-
+			images['poster'] = data['thumb']
 		if 'art' in data:
-			r = ssn.get(f'{base_url}{data["thumb"]}')
-			if r.status_code == 200:
-				db_keys.append('art')
-				db_values.append(r.content)
-
-		#write to database
-		comm = f"""
-		INSERT INTO {type} ({",".join(db_keys)})
-		VALUES ({",".join(['?'] * len(db_keys))})
-		"""
-		cursor.execute(comm, db_values)
+			images['art'] = data['art']
+		_queue_write(ssn, cursor, type, db_keys, db_values, images)
 		return
 
 	if not 'Guid' in data: return
@@ -663,28 +953,19 @@ def _export(
 		if path.isdir(bundle):
 			db_keys += ['hash','chapter_thumbnails']
 			db_values.append(hash)
-			db_values.append((b'\0' * 20).join(map(lambda c: open(path.join(bundle, c), 'rb').read(), listdir(bundle))))
+			db_values.append(",".join(map(lambda c: _image_hash(ssn, cursor, open(path.join(bundle, c), 'rb').read()), listdir(bundle))))
 
+	images = {}
 	if (target_poster == True and not type in ('episode','track')) or (target_episode_poster == True and type == 'episode'):
 		if 'thumb' in media_info:
-			r = ssn.get(f'{base_url}{media_info["thumb"]}')
-			if r.status_code == 200:
-				db_keys.append('poster')
-				db_values.append(r.content)
+			images['poster'] = media_info['thumb']
 
 	if (target_art == True and not type in ('episode','track')) or (target_episode_art == True and type == 'episode'):
 		if 'art' in media_info:
-			r = ssn.get(f'{base_url}{media_info["art"]}')
-			if r.status_code == 200:
-				db_keys.append('art')
-				db_values.append(r.content)
+			images['art'] = media_info['art']
 
 	#write to the database
-	comm = f"""
-	INSERT INTO {type} ({",".join(db_keys)})
-	VALUES ({",".join(['?'] * len(db_keys))})
-	"""
-	cursor.execute(comm, db_values)
+	_queue_write(ssn, cursor, type, db_keys, db_values, images)
 
 	return
 
@@ -722,7 +1003,7 @@ def _import(
 		#go through every library and check if a collection "fits" in it
 		for lib in sections:
 			if not lib['type'] in collection_types: continue
-			lib_output = ssn.get(f'{base_url}/library/sections/{lib["key"]}/all', params={'type': media_types[lib['type']][3], 'includeGuids': '1'}).json()['MediaContainer'].get('Metadata',[])
+			lib_output = _paged(ssn, f'{base_url}/library/sections/{lib["key"]}/all', params={'type': media_types[lib['type']][3], 'includeGuids': '1'})
 			#guid -> ratingkey
 			lib_content = {str(m['Guid']): m['ratingKey'] for m in lib_output if 'Guid' in m}
 			collection_output = ssn.get(f'{base_url}/library/sections/{lib["key"]}/collections').json()['MediaContainer'].get('Metadata',[])
@@ -740,25 +1021,30 @@ def _import(
 						ssn.delete(f'{base_url}/library/collections/{old_ratingkey}')
 					#create collection
 					new_ratingkey = ssn.post(f'{base_url}/library/collections', params={'title': collection[2], 'smart': '0', 'sectionId': lib['key'], 'type': media_types[lib['type']][3], 'uri': f'server://{machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(collection_keys)}'}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+					#the token is given with the changes themselves as the token of the session changes for the playlists before they're sent
+					calls = []
 					#set poster
 					if collection[10] != None:
-						ssn.post(f'{base_url}/library/collections/{new_ratingkey}/posters', data=collection[10])
+						calls.append(('post', f'{base_url}/library/collections/{new_ratingkey}/posters', {'data': _image_data(cursor, collection[10]), 'params': {'X-Plex-Token': plex_api_token}}))
 					#set art
 					if collection[11] != None:
-						ssn.post(f'{base_url}/library/collections/{new_ratingkey}/arts', data=collection[11])
+						calls.append(('post', f'{base_url}/library/collections/{new_ratingkey}/arts', {'data': _image_data(cursor, collection[11]), 'params': {'X-Plex-Token': plex_api_token}}))
 					#set settings
 					payload = {
 						'type': media_type,
 						'id': new_ratingkey,
+						'X-Plex-Token': plex_api_token
 					}
 					for option, value in zip(target_keys, collection):
 						if option in metadata_skip_keys: continue
 						payload[f'{option}.value'] = value or ''
 						payload[f'{option}.locked'] = 1
-					ssn.put(f'{base_url}/library/sections/{lib["key"]}/all', params=payload)
+					calls.append(('put', f'{base_url}/library/sections/{lib["key"]}/all', {'params': payload}))
 					#set advanced settings
 					payload = {o: v for o, v in zip(target_keys, collection) if o in advanced_collection_keys}
-					ssn.put(f'{base_url}/library/metadata/{new_ratingkey}/prefs', params=payload)
+					payload['X-Plex-Token'] = plex_api_token
+					calls.append(('put', f'{base_url}/library/metadata/{new_ratingkey}/prefs', {'params': payload}))
+					_write_back(ssn, new_ratingkey, calls)
 		return
 
 	if type == 'playlist':
@@ -778,14 +1064,19 @@ def _import(
 			#create playlist
 			rating_keys = ",".join(filter(lambda x: x != None, (_guid_to_ratingkey(ssn, g) for g in playlist[6].split("|"))))
 			new_ratingkey = ssn.post(f'{base_url}/playlists', params={'type': playlist[5], 'title': playlist[3], 'smart': '0', 'uri': f'server://{machine_id}/com.plexapp.plugins.library/library/metadata/{rating_keys}'}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+			#the token is given with the changes themselves as the token of the session changes before they're sent
+			calls = []
 			#set summary
 			if playlist[4] or '' != '':
-				ssn.put(f'{base_url}/playlists/{new_ratingkey}', params={'summary': playlist[4]})
+				calls.append(('put', f'{base_url}/playlists/{new_ratingkey}', {'params': {'summary': playlist[4], 'X-Plex-Token': user_token}}))
 			#set images
 			if playlist[7] or '' != '':
-				ssn.post(f'{base_url}/playlists/{new_ratingkey}/posters', data=playlist[7])
+				calls.append(('post', f'{base_url}/playlists/{new_ratingkey}/posters', {'data': _image_data(cursor, playlist[7]), 'params': {'X-Plex-Token': user_token}}))
 			if playlist[8] or '' != '':
-				ssn.post(f'{base_url}/playlists/{new_ratingkey}/arts', data=playlist[8])
+				calls.append(('post', f'{base_url}/playlists/{new_ratingkey}/arts', {'data': _image_data(cursor, playlist[8]), 'params': {'X-Plex-Token': user_token}}))
+			_write_back(ssn, new_ratingkey, calls)
+		#the media is imported using the admin token
+		ssn.params.update({'X-Plex-Token': plex_api_token})
 		return
 
 	rating_key = data['ratingKey']
@@ -807,6 +1098,8 @@ def _import(
 	target_keys = next(zip(*cursor.description))
 
 	#import data
+	#the changes to plex are sent in the background, in the order that they're added
+	calls = []
 	if target_metadata == True:
 		payload = {
 			'type': media_type,
@@ -838,17 +1131,17 @@ def _import(
 				payload[f'{option}.locked'] = 1
 
 		#upload to plex
-		ssn.put(f'{base_url}/library/sections/{media_lib_id}/all', params=payload)
+		calls.append(('put', f'{base_url}/library/sections/{media_lib_id}/all', {'params': {**payload, 'X-Plex-Token': plex_api_token}}))
 
 	if target_advanced_metadata == True and type in ('movie','show','artist'):
 		payload = {o: v for o, v in zip(target_keys, target) if o in advanced_metadata_keys}
-		ssn.put(f'{base_url}/library/metadata/{rating_key}/prefs', params=payload)
+		calls.append(('put', f'{base_url}/library/metadata/{rating_key}/prefs', {'params': {**payload, 'X-Plex-Token': plex_api_token}}))
 
 	if 'poster' in target_keys and ((type != 'episode' and target_poster == True) or (type == 'episode' and target_episode_poster == True)):
-		ssn.post(f'{base_url}/library/metadata/{rating_key}/posters', data=target[target_keys.index('poster')])
+		calls.append(('post', f'{base_url}/library/metadata/{rating_key}/posters', {'data': _image_data(cursor, target[target_keys.index('poster')]), 'params': {'X-Plex-Token': plex_api_token}}))
 
 	if 'art' in target_keys and ((type != 'episode' and target_art == True) or (type == 'episode' and target_episode_art == True)):
-		ssn.post(f'{base_url}/library/metadata/{rating_key}/arts', data=target[target_keys.index('art')])
+		calls.append(('post', f'{base_url}/library/metadata/{rating_key}/arts', {'data': _image_data(cursor, target[target_keys.index('art')]), 'params': {'X-Plex-Token': plex_api_token}}))
 
 	if 'watched_status' in target_keys and target_watched == True:
 		watched_info = target[target_keys.index('watched_status')].split(',')
@@ -861,13 +1154,14 @@ def _import(
 			#set watched status of media for this user
 			if watched_state == 'True':
 				#mark watched
-				ssn.get(f'{base_url}/:/scrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': rating_key, 'X-Plex-Token': user_token})
+				calls.append(('get', f'{base_url}/:/scrobble', {'params': {'identifier': 'com.plexapp.plugins.library', 'key': rating_key, 'X-Plex-Token': user_token}}))
 			elif watched_state == 'False':
 				#mark not-watched
-				ssn.get(f'{base_url}/:/unscrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': rating_key, 'X-Plex-Token': user_token})
+				calls.append(('get', f'{base_url}/:/unscrobble', {'params': {'identifier': 'com.plexapp.plugins.library', 'key': rating_key, 'X-Plex-Token': user_token}}))
 			elif watched_state.isdigit():
 				#mark partially watched
-				ssn.get(f'{base_url}/:/progress', params={'identifier': 'com.plexapp.plugins.library', 'key': rating_key, 'time': watched_state, 'state': 'stopped', 'X-Plex-Token': user_token})
+				calls.append(('get', f'{base_url}/:/progress', {'params': {'identifier': 'com.plexapp.plugins.library', 'key': rating_key, 'time': watched_state, 'state': 'stopped', 'X-Plex-Token': user_token}}))
+	_write_back(ssn, rating_key, calls)
 
 	if 'intro_start' in target_keys and 'intro_end' in target_keys and target_intro_markers == True:
 		#check if media already has intro marker
@@ -913,7 +1207,12 @@ def _import(
 		bundle = path.join(path.dirname(path.dirname(database_folder)), 'Media', 'localhost', hash[0], f'{hash[1:]}.bundle', 'Contents', 'Chapters')
 		#check if media doesn't already have autogenerated thumbs and if hash matches
 		if target[target_keys.index('hash')] == hash and not path.isdir(bundle):
-			thumbs = target[target_keys.index('chapter_thumbnails')].split(b'\0' * 20)
+			chapter_thumbnails = target[target_keys.index('chapter_thumbnails')]
+			if isinstance(chapter_thumbnails, bytes):
+				#older database files have the thumbnails inline
+				thumbs = chapter_thumbnails.split(b'\0' * 20)
+			else:
+				thumbs = [_image_data(cursor, h) for h in chapter_thumbnails.split(',')]
 			#create folder path to put thumbs in
 			bundle = path.dirname(path.dirname(database_folder))
 			for folder in ('Media', 'localhost', hash[0], f'{hash[1:]}.bundle', 'Contents', 'Chapters'):
@@ -973,8 +1272,11 @@ def plex_exporter_importer(
 		library_name: str=None,
 		movie_name: str=None,
 		series_name: str=None, season_number: int=None, episode_number: int=None,
-		artist_name: str=None, album_name: str=None, track_name: str=None
+		artist_name: str=None, album_name: str=None, track_name: str=None,
+		resume: bool=False
 	):
+	global image_executor, checkpoints
+
 	result_json, watched_map, timestamp_map = [], {}, {}
 	lib_target_specifiers = (library_name,movie_name,series_name,season_number,episode_number,artist_name,album_name,track_name)
 	all_target_specifiers = (all_movie, all_show, all_music)
@@ -1100,13 +1402,31 @@ def plex_exporter_importer(
 	#setup variables
 	db = connect(database_file)
 	cursor = db.cursor()
+	if type == 'export':
+		#trade durability of the last few transactions for write speed (the file itself can't get corrupted by this)
+		cursor.execute("PRAGMA journal_mode = WAL;")
+		cursor.execute("PRAGMA synchronous = NORMAL;")
+		cursor.execute("PRAGMA cache_size = -65536;")
 	#create tables
 	cursor.executescript(''.join(media_type[2] for media_type in media_types.values()))
+	cursor.executescript(image_tables)
 
 	machine_id = _req_cache(ssn, f'{base_url}/')['MediaContainer']['machineIdentifier']
 	shared_users = ssn.get(f'http://plex.tv/api/servers/{machine_id}/shared_servers').text
 	result = map(lambda r: r.split('"')[0:3:2], shared_users.split('userID="')[1:])
 	user_data = tuple(zip(*result)) or ((),())
+
+	#the media that is done is recorded per library so that an interrupted run can be resumed
+	checkpoint_process = ",".join(sorted(process))
+	checkpoints = {}
+	if type in ('export','import'):
+		if resume == True:
+			cursor.execute("SELECT library_key, rating_key FROM checkpoint WHERE machine_id = ? AND type = ? AND process = ?;", (machine_id, type, checkpoint_process))
+			checkpoints = dict(cursor.fetchall())
+		else:
+			cursor.execute("DELETE FROM checkpoint WHERE machine_id = ? AND type = ?;", (machine_id, type))
+			db.commit()
+
 	if type == 'export':
 		method = _export
 	elif type == 'import':
@@ -1153,6 +1473,7 @@ def plex_exporter_importer(
 			print('Collections')
 			if type in ('export','reset'):
 				if type == 'export':
+					_flush(cursor)
 					cursor.execute(f"SELECT rating_key, updated_at FROM 'collection';")
 					timestamp_map['collection'] = dict(cursor.fetchall())
 				for lib in sections:
@@ -1172,6 +1493,7 @@ def plex_exporter_importer(
 		if 'playlist' in process:
 			print('Playlists')
 			if type == 'export':
+				_flush(cursor)
 				cursor.execute(f"SELECT rating_key, updated_at FROM 'playlist';")
 				timestamp_map['playlist'] = dict(cursor.fetchall())
 				complete_user_data = (list(user_data[0]) + ['_admin'], list(user_data[1]) + [plex_api_token])
@@ -1202,6 +1524,9 @@ def plex_exporter_importer(
 			lib_output = ssn.get(f'{base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1'})
 			if lib_output.status_code != 200: continue
 			lib_output = lib_output.json()['MediaContainer'].get('Metadata',[])
+			if not checkpoints.get(lib['key']) in set(m['ratingKey'] for m in lib_output):
+				#the media that was done last isn't there anymore so the complete library would be skipped
+				checkpoints.pop(lib['key'], None)
 
 			if lib['type'] in ('movie','show') and type == 'export' and 'watched_status' in process:
 				#create watched map for every user to reduce requests
@@ -1213,6 +1538,7 @@ def plex_exporter_importer(
 
 			if type == 'export' and not lib['type'] in timestamp_map:
 				#create timestamp map
+				_flush(cursor)
 				lib_types = media_types[lib['type']][4]
 				for lib_type in lib_types:
 					cursor.execute(f"SELECT rating_key, updated_at FROM {lib_type};")
@@ -1222,11 +1548,14 @@ def plex_exporter_importer(
 				for movie in lib_output:
 					if movie_name != None and movie['title'] != movie_name:
 						continue
+					if _checkpoint_skip(lib['key'], movie['ratingKey']):
+						continue
 
 					if verbose == True: print(f'	{movie["title"]}')
 					response = method(type='movie', data=movie, watched_map=watched_map, timestamp_map=timestamp_map, **args)
 					if isinstance(response, str): return response
 					else: result_json.append(movie['ratingKey'])
+					_checkpoint(ssn, cursor, type, checkpoint_process, lib['key'], movie['ratingKey'])
 
 					if movie_name != None:
 						break
@@ -1238,6 +1567,8 @@ def plex_exporter_importer(
 				for show in lib_output:
 					if series_name != None and show['title'] != series_name:
 						continue
+					if _checkpoint_skip(lib['key'], show['ratingKey']):
+						continue
 
 					if verbose == True: print(f'	{show["title"]}')
 					#process show
@@ -1283,6 +1614,7 @@ def plex_exporter_importer(
 						if episode_number != None:
 							return 'Episode not found'
 
+					_checkpoint(ssn, cursor, type, checkpoint_process, lib['key'], show['ratingKey'])
 					if series_name != None:
 						break
 				else:
@@ -1293,6 +1625,8 @@ def plex_exporter_importer(
 				for artist in lib_output:
 					if artist_name != None and artist['title'] != artist_name:
 						continue
+					if _checkpoint_skip(lib['key'], artist['ratingKey']):
+						continue
 
 					if verbose == True: print(f'	{artist["title"]}')
 					#process artist
@@ -1338,6 +1672,7 @@ def plex_exporter_importer(
 						if track_name != None:
 							return 'Track not found'
 
+					_checkpoint(ssn, cursor, type, checkpoint_process, lib['key'], artist['ratingKey'])
 					if artist_name != None:
 						break
 				else:
@@ -1352,6 +1687,14 @@ def plex_exporter_importer(
 		else:
 			if library_name != None:
 				return 'Library not found'
+
+		_write_back_wait()
+		_write_downloaded(ssn, cursor, wait_all=True)
+		_flush(cursor)
+		if type in ('export','import'):
+			#everything is done so a next run starts from the beginning
+			cursor.execute("DELETE FROM checkpoint WHERE machine_id = ? AND type = ?;", (machine_id, type))
+			db.commit()
 	except Exception as e:
 		if 'has no column named' in str(e):
 			_leave(**exit_args, e='Database file is too old, please delete the file and export to a new one')
@@ -1359,6 +1702,12 @@ def plex_exporter_importer(
 			_leave(**exit_args, e=e)
 
 	#save the database
+	if image_executor != None:
+		image_executor.shutdown(wait=True)
+		image_executor = None
+	if type == 'export':
+		#move everything into the database file itself so that it can be copied on it's own
+		cursor.execute("PRAGMA wal_checkpoint(TRUNCATE);")
 	db.commit()
 	if type == 'import' and ('intro_marker' in process or 'chapter_thumbnail' in process):
 		plex_db.commit()
@@ -1367,10 +1716,16 @@ def plex_exporter_importer(
 
 if __name__ == '__main__':
 	from requests import Session
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
 	from argparse import ArgumentParser, RawDescriptionHelpFormatter
 
 	#setup vars
 	ssn = Session()
+	#enough connections for all image and write back workers and retry when plex fails to respond
+	adapter = HTTPAdapter(pool_maxsize=image_workers + write_back_workers + 1, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
 	ssn.headers.update({'Accept':'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 
@@ -1400,6 +1755,7 @@ EPILOG
 	parser.add_argument('-t','--Type', choices=process_types, required=True, type=str, help='Either export/import plex metadata or reset import (unlock all fields)')
 	parser.add_argument('-p','--Process', choices=process_summary.keys(), help='EXPORT/IMPORT ONLY: Select what to export/import; this argument can be given multiple times to select multiple things', action='append', required=True)
 	parser.add_argument('-L','--Location', type=str, help='SEE EPILOG', default=path.dirname(path.abspath(__file__)))
+	parser.add_argument('-R','--Resume', action='store_true', help='EXPORT/IMPORT ONLY: Continue where the previous run stopped instead of starting over')
 	parser.add_argument('-v','--Verbose', help='Make script more verbose', action='store_true')
 
 	#args regarding target selection
@@ -1429,7 +1785,8 @@ EPILOG
 		library_name=args.LibraryName,
 		movie_name=args.MovieName,
 		series_name=args.SeriesName, season_number=args.SeasonNumber, episode_number=args.EpisodeNumber,
-		artist_name=args.ArtistName, album_name=args.AlbumName, track_name=args.TrackName
+		artist_name=args.ArtistName, album_name=args.AlbumName, track_name=args.TrackName,
+		resume=args.Resume
 	)
 	print(f'Time: {round(perf_counter() - start_time, 3)}s')
 	if not isinstance(response, list):
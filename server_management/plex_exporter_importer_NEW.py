@@ -27,16 +27,49 @@ plex_api_token = '' #'X8BxyR35P1WSRGQpNuz8'
 database_folder = ''
 plex_linux_user = 'plex'
 plex_linux_group = 'plex'
+# The amount of shows/artists whose seasons/albums and episodes/tracks are fetched at the same time
+crawl_workers = 4
+# The maximum amount of media info responses that are kept in memory
+cache_size = 2000
+# A database file to store media info responses in, so that they can be reused between runs and processes (e.g. '/tmp/plex_cache.db')
+# When set, the targeted media is also kept in this file instead of in memory
+# Leave empty to only keep (a limited amount of) responses in memory
+cache_file = ''
+# The amount of rows that are written to the database file before the progress is saved
+write_batch_size = 1000
+# The maximum amount of seconds between saving the progress to the database file
+write_interval = 10.0
+# The maximum amount of megabytes of images that are kept in memory before they're written to the database file
+write_buffer_size = 64
+# The amount of images that are downloaded at the same time
+image_workers = 4
+# The amount of media that is unlocked with one request when resetting
+reset_chunk_size = 500
+# The amount of media of which the info is read at once from the plex database when exporting on the server itself
+plex_database_read_size = 500
+# The amount of media that is requested at once when listing the media in a library
+listing_page_size = 500
 
 from abc import ABC, abstractmethod
-from datetime import datetime
+from ast import literal_eval
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from hashlib import sha256
+from itertools import islice
+from json import dumps, loads
 from os import getenv, listdir, path
-from sqlite3 import connect, Cursor
+from sqlite3 import connect, Connection, Cursor
 from sys import platform
-from time import perf_counter
-from typing import Dict, List, Tuple, Union
+from threading import Lock
+from time import perf_counter, time
+from typing import Deque, Dict, Generator, Iterator, List, Sequence, Tuple, Union
+from urllib.parse import parse_qsl
+from urllib.request import pathname2url
 
 from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 is_linux = platform == 'linux'
 if is_linux:
@@ -49,6 +82,16 @@ plex_ip = getenv('plex_ip', plex_ip)
 plex_port = getenv('plex_port', plex_port)
 plex_api_token = getenv('plex_api_token', plex_api_token)
 database_folder = getenv('database_folder', database_folder)
+crawl_workers = int(getenv('crawl_workers', crawl_workers))
+cache_size = int(getenv('cache_size', cache_size))
+cache_file = getenv('cache_file', cache_file)
+write_batch_size = int(getenv('write_batch_size', write_batch_size))
+write_interval = float(getenv('write_interval', write_interval))
+write_buffer_size = int(getenv('write_buffer_size', write_buffer_size))
+image_workers = int(getenv('image_workers', image_workers))
+reset_chunk_size = int(getenv('reset_chunk_size', reset_chunk_size))
+plex_database_read_size = int(getenv('plex_database_read_size', plex_database_read_size))
+listing_page_size = int(getenv('listing_page_size', listing_page_size))
 base_url = f"http://{plex_ip}:{plex_port}"
 if is_linux:
 	plex_linux_user = getpwnam(getenv('plex_linux_user', plex_linux_user)).pw_uid
@@ -84,8 +127,8 @@ data_types = {
 				collectionSort VARCHAR(2),
 				subtype VARCHAR(10),
 				guids TEXT,
-				thumb BLOB,
-				art BLOB
+				thumb VARCHAR(64),
+				art VARCHAR(64)
 			);
 			""",
 		'metadata_keys': (
@@ -204,26 +247,331 @@ data_types = {
 				summary TEXT,
 				playlistType VARCHAR(15),
 				guids TEXT,
-				thumb BLOB,
-				art BLOB
+				thumb VARCHAR(64),
+				art VARCHAR(64)
 			);
 			""",
 		'metadata_keys': (
 			'title', 'summary'
 		)
 	},
-	'movie': {},
-	'show': {},
-	'artist': {}
+	'image': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS image (
+				hash VARCHAR(64) PRIMARY KEY,
+				data BLOB
+			);
+			""",
+		'metadata_keys': ()
+	},
+	'image_source': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS image_source (
+				machine_id TEXT,
+				url TEXT,
+				hash VARCHAR(64),
+				PRIMARY KEY (machine_id, url)
+			);
+			""",
+		'metadata_keys': ()
+	},
+	'watermark': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS watermark (
+				machine_id TEXT,
+				library_key VARCHAR(15),
+				process VARCHAR(20),
+				exported_at INTEGER(10),
+				PRIMARY KEY (machine_id, library_key, process)
+			);
+			""",
+		'metadata_keys': ()
+	},
+	'checkpoint': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS checkpoint (
+				machine_id TEXT,
+				type VARCHAR(6),
+				process VARCHAR(20),
+				library_key VARCHAR(15),
+				rating_key VARCHAR(15),
+				PRIMARY KEY (machine_id, type, process, library_key)
+			);
+			""",
+		'metadata_keys': ()
+	},
+	'movie': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS movie (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				titleSort VARCHAR(255),
+				originalTitle VARCHAR(255),
+				originallyAvailableAt VARCHAR(10),
+				contentRating VARCHAR(15),
+				userRating FLOAT,
+				studio VARCHAR(255),
+				tagline VARCHAR(255),
+				summary TEXT,
+				Genre TEXT,
+				Writer TEXT,
+				Director TEXT,
+				languageOverride VARCHAR(5),
+				useOriginalTitle INTEGER(1)
+			);
+			""",
+		'metadata_keys': (
+			'title', 'titleSort', 'originalTitle',
+			'originallyAvailableAt', 'contentRating', 'userRating',
+			'studio', 'tagline', 'summary',
+			'Genre', 'Writer', 'Director'
+		),
+		'advanced_metadata_keys': (
+			'languageOverride', 'useOriginalTitle'
+		)
+	},
+	'show': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS show (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				titleSort VARCHAR(255),
+				originalTitle VARCHAR(255),
+				originallyAvailableAt VARCHAR(10),
+				contentRating VARCHAR(15),
+				userRating FLOAT,
+				studio VARCHAR(255),
+				tagline VARCHAR(255),
+				summary TEXT,
+				Genre TEXT,
+				episodeSort INTEGER(1),
+				autoDeletionItemPolicyUnwatchedLibrary INTEGER(2),
+				autoDeletionItemPolicyWatchedLibrary INTEGER(3),
+				flattenSeasons INTEGER(1),
+				showOrdering VARCHAR(10),
+				languageOverride VARCHAR(5),
+				useOriginalTitle INTEGER(1)
+			);
+			""",
+		'metadata_keys': (
+			'title', 'titleSort', 'originalTitle',
+			'originallyAvailableAt', 'contentRating', 'userRating',
+			'studio', 'tagline', 'summary',
+			'Genre'
+		),
+		'advanced_metadata_keys': (
+			'episodeSort', 'autoDeletionItemPolicyUnwatchedLibrary', 'autoDeletionItemPolicyWatchedLibrary',
+			'flattenSeasons', 'showOrdering', 'languageOverride', 'useOriginalTitle'
+		)
+	},
+	'season': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS season (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				summary TEXT
+			);
+			""",
+		'metadata_keys': (
+			'title', 'summary'
+		),
+		'advanced_metadata_keys': ()
+	},
+	'episode': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS episode (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				titleSort VARCHAR(255),
+				originallyAvailableAt VARCHAR(10),
+				contentRating VARCHAR(15),
+				userRating FLOAT,
+				summary TEXT,
+				Writer TEXT,
+				Director TEXT
+			);
+			""",
+		'metadata_keys': (
+			'title', 'titleSort',
+			'originallyAvailableAt', 'contentRating', 'userRating',
+			'summary',
+			'Writer', 'Director'
+		),
+		'advanced_metadata_keys': ()
+	},
+	'artist': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS artist (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				titleSort VARCHAR(255),
+				summary TEXT,
+				Genre TEXT,
+				Style TEXT,
+				Mood TEXT,
+				Country TEXT,
+				Similar TEXT,
+				albumSort INTEGER(1)
+			);
+			""",
+		'metadata_keys': (
+			'title', 'titleSort', 'summary',
+			'Genre', 'Style', 'Mood', 'Country', 'Similar'
+		),
+		'advanced_metadata_keys': (
+			'albumSort',
+		)
+	},
+	'album': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS album (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				titleSort VARCHAR(255),
+				originallyAvailableAt VARCHAR(10),
+				contentRating VARCHAR(15),
+				userRating FLOAT,
+				studio VARCHAR(255),
+				summary TEXT,
+				Genre TEXT,
+				Style TEXT,
+				Mood TEXT
+			);
+			""",
+		'metadata_keys': (
+			'title', 'titleSort',
+			'originallyAvailableAt', 'contentRating', 'userRating',
+			'studio', 'summary',
+			'Genre', 'Style', 'Mood'
+		),
+		'advanced_metadata_keys': ()
+	},
+	'track': {
+		'table_command':
+			"""
+			CREATE TABLE IF NOT EXISTS track (
+				rating_key VARCHAR(15) PRIMARY KEY,
+				guid VARCHAR(120),
+				updated_at INTEGER(10),
+				title VARCHAR(255),
+				originalTitle VARCHAR(255),
+				contentRating VARCHAR(15),
+				userRating FLOAT,
+				"index" INTEGER,
+				parentIndex INTEGER,
+				Mood TEXT
+			);
+			""",
+		'metadata_keys': (
+			'title', 'originalTitle',
+			'contentRating', 'userRating', 'index', 'parentIndex',
+			'Mood'
+		),
+		'advanced_metadata_keys': ()
+	}
+}
+media_types = ('movie', 'show', 'season', 'episode', 'artist', 'album', 'track')
+# The plex type ids of the media in each type of library, in the order that they should be processed
+library_type_ids = {
+	'movie': ('1',),
+	'show': ('2', '3', '4'),
+	'artist': ('8', '9', '10')
+}
+type_ids = {
+	'movie': '1', 'show': '2', 'season': '3', 'episode': '4',
+	'artist': '8', 'album': '9', 'track': '10',
+	'collection': '18'
 }
+# The tag types in the plex database of the tags that are exported
+tag_types = {
+	'Genre': 1, 'Director': 4, 'Writer': 5, 'Country': 8, 'Similar': 9,
+	'Mood': 300, 'Style': 301, 'Guid': 314
+}
+# Processes of which the exported data changing also changes the updatedAt value of the media.
+# For these, only the media that has been updated since the last export needs to be exported again.
+incremental_processes = ('metadata', 'advanced_metadata')
 types = ('export', 'import', 'reset')
 
+class Listing:
+	def __init__(self, ssn: Session, url: str, params: dict={}, page_size: int=listing_page_size) -> None:
+		self.ssn = ssn
+		self.url = url
+		self.params = params
+		self.page_size = page_size
+		# Whether all pages could be requested the last time it was iterated over
+		self.complete = False
+		return
+
+	def __iter__(self) -> Iterator[dict]:
+		# Request the media page by page so that only one page is in memory at a time
+		self.complete = False
+		start = 0
+		while True:
+			response = self.ssn.get(self.url, params={
+				**self.params,
+				'X-Plex-Container-Start': start,
+				'X-Plex-Container-Size': self.page_size
+			})
+			if not response.ok: return
+			container: dict = response.json()['MediaContainer']
+			media: List[dict] = container.get('Metadata', [])
+			yield from media
+
+			start += len(media)
+			# Servers that don't support paging give everything at once without a total size
+			if not media or start >= container.get('totalSize', start):
+				break
+
+		self.complete = True
+		return
+
 class RequestCache:
-	def __init__(self) -> None:
+	def __init__(self, max_size: int=cache_size, file: str=cache_file) -> None:
 		self.ssn: Session = None
+		self.max_size = max_size
+		self.file = file
 		self.__machine_id: str = None
 		self.__sections: List[dict] = None
-		self.__media_infos: Dict[str, dict] = {}
+		# rating_key -> (updated_at, media_info) with the least recently used entry first
+		self.__media_infos: OrderedDict[str, Tuple[int, Union[dict, None]]] = OrderedDict()
+		self.__db: Union[Connection, None] = None
+		self.__db_writes = 0
+		self.__lock = Lock()
+
+	@property
+	def db(self) -> Union[Connection, None]:
+		if self.__db is None and self.file:
+			self.__db = connect(self.file, timeout=10.0, check_same_thread=False)
+			self.__db.execute("""
+				CREATE TABLE IF NOT EXISTS media_info (
+					rating_key VARCHAR(15) PRIMARY KEY,
+					updated_at INTEGER(10),
+					data TEXT
+				);
+			""")
+		return self.__db
 
 	@property
 	def machine_id(self) -> str:
@@ -237,19 +585,419 @@ class RequestCache:
 			self.__sections = self.ssn.get(f'{base_url}/library/sections').json()['MediaContainer'].get('Directory', [])
 		return self.__sections
 	
-	def media_info(self, rating_key: str) -> Union[dict, None]:
-		if not rating_key in self.__media_infos:
+	def media_info(self, rating_key: str, updated_at: int=None) -> Union[dict, None]:
+		# When updated_at is given, a cached response is only used when it's of the same version
+		with self.__lock:
+			if rating_key in self.__media_infos:
+				cached_updated_at, info = self.__media_infos[rating_key]
+				if updated_at is None or cached_updated_at == updated_at:
+					self.__media_infos.move_to_end(rating_key)
+					return info
+
+			info = None
+			if self.db is not None and updated_at is not None:
+				row = self.db.execute(
+					"SELECT data FROM media_info WHERE rating_key = ? AND updated_at = ?;",
+					(rating_key, updated_at)
+				).fetchone()
+				if row is not None:
+					info = loads(row[0])
+
+		if info is None:
 			r = self.ssn.get(
 				f'{base_url}/library/metadata/{rating_key}',
 				params={'includeGuids': '1', 'includeMarkers': '1', 'includeChapters': '1', 'includePreferences': '1'}
 			)
 			if r.ok:
-				self.__media_infos[rating_key] = r.json()['MediaContainer']['Metadata'][0]
-			else:
-				self.__media_infos[rating_key] = None
-		return self.__media_infos[rating_key]
+				info = r.json()['MediaContainer']['Metadata'][0]
+				if self.db is not None:
+					with self.__lock:
+						self.db.execute(
+							"INSERT OR REPLACE INTO media_info(rating_key, updated_at, data) VALUES (?, ?, ?);",
+							(rating_key, info.get('updatedAt', 0), dumps(info))
+						)
+						# Commit once in a while so that other runs can already make use of the responses
+						self.__db_writes += 1
+						if self.__db_writes % 250 == 0:
+							self.db.commit()
+
+		with self.__lock:
+			self.__media_infos[rating_key] = (info.get('updatedAt', 0) if info else updated_at, info)
+			self.__media_infos.move_to_end(rating_key)
+			while len(self.__media_infos) > self.max_size:
+				self.__media_infos.popitem(last=False)
+		return info
+
+	def clear_results(self) -> None:
+		with self.__lock:
+			self.db.execute("""
+				CREATE TEMP TABLE IF NOT EXISTS targeted_media (
+					position INTEGER PRIMARY KEY,
+					data TEXT
+				);
+			""")
+			self.db.execute("DELETE FROM targeted_media;")
+
+	def add_result(self, result: dict) -> None:
+		with self.__lock:
+			self.db.execute("INSERT INTO targeted_media(data) VALUES (?);", (dumps(result),))
+
+	def iter_results(self) -> Iterator[dict]:
+		# Stream the results from the file instead of loading them all at once
+		for (data,) in self.db.execute("SELECT data FROM targeted_media ORDER BY position;"):
+			yield loads(data)
+
+	def close(self) -> None:
+		if self.__db is not None:
+			self.__db.commit()
+			self.__db.close()
+			self.__db = None
+		return
 cache = RequestCache()
 
+class PlexDatabase:
+	def __init__(self, plex_cursor: Cursor, read_size: int=plex_database_read_size) -> None:
+		self.cursor = plex_cursor
+		self.read_size = read_size
+		# rating key -> media info of the media that is read ahead
+		self.__media_infos: Dict[str, dict] = {}
+		return
+
+	@staticmethod
+	def _timestamp(value: Union[int, str, None]) -> Union[int, None]:
+		# Depending on the version of plex, times are stored as epoch or as text
+		if value is None or isinstance(value, int):
+			return value
+		return int(datetime.strptime(value[:19], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc).timestamp())
+
+	@staticmethod
+	def _preferences(extra_data: Union[str, None]) -> dict:
+		# Depending on the version of plex, extra data is stored as json or as a query string
+		if not extra_data:
+			return {}
+		if extra_data.startswith('{'):
+			data = loads(extra_data)
+		else:
+			data = dict(parse_qsl(extra_data))
+		return {k[3:]: str(v) for k, v in data.items() if k.startswith('pv:')}
+
+	def _read(self, rating_keys: List[str]) -> Dict[str, dict]:
+		# Read the info of all the media at once, in the same shape as the info that the api gives
+		media_infos: Dict[str, dict] = {}
+		marks = ",".join(['?'] * len(rating_keys))
+		type_names = {v: k for k, v in type_ids.items()}
+
+		# Keep the reads consistent with each other while the server keeps on writing
+		self.cursor.execute("BEGIN;")
+		try:
+			self.cursor.execute(f"""
+				SELECT
+					m.id, m.metadata_type, m.parent_id, p."index",
+					m.title, m.title_sort, m.original_title, m.originally_available_at,
+					m.content_rating, m.studio, m.tagline, m.summary, m."index",
+					m.updated_at, m.extra_data, s.rating
+				FROM metadata_items m
+				LEFT JOIN metadata_items p ON p.id = m.parent_id
+				LEFT JOIN metadata_item_settings s ON s.guid = m.guid AND s.account_id = 1
+				WHERE m.id IN ({marks});
+			""", rating_keys)
+			for (
+				rating_key, type_id, parent_id, parent_index,
+				title, title_sort, original_title, available_at,
+				content_rating, studio, tagline, summary, index,
+				updated_at, extra_data, user_rating
+			) in self.cursor.fetchall():
+				if not str(type_id) in type_names: continue
+				media_info = {
+					'ratingKey': str(rating_key),
+					'type': type_names[str(type_id)],
+					'title': title,
+					'titleSort': title_sort,
+					'originalTitle': original_title,
+					'contentRating': content_rating,
+					'studio': studio,
+					'tagline': tagline,
+					'summary': summary,
+					'index': index,
+					'parentIndex': parent_index,
+					'userRating': user_rating,
+					'updatedAt': self._timestamp(updated_at)
+				}
+				if parent_id is not None:
+					media_info['parentRatingKey'] = str(parent_id)
+				if available_at:
+					available_at = self._timestamp(available_at)
+					media_info['originallyAvailableAt'] = datetime.fromtimestamp(available_at, timezone.utc).strftime('%Y-%m-%d')
+				# The api leaves out empty values
+				media_info = {k: v for k, v in media_info.items() if v not in (None, '')}
+				media_info['Guid'] = []
+				media_info['Marker'] = []
+				preferences = self._preferences(extra_data)
+				media_info['Preferences'] = {'Setting': [{'id': k, 'value': v} for k, v in preferences.items()]}
+				media_infos[str(rating_key)] = media_info
+
+			# Tags, in the order that they're shown
+			self.cursor.execute(f"""
+				SELECT t.metadata_item_id, tags.tag_type, tags.tag
+				FROM taggings t
+				INNER JOIN tags ON tags.id = t.tag_id
+				WHERE t.metadata_item_id IN ({marks}) AND tags.tag_type IN ({",".join(map(str, tag_types.values()))})
+				ORDER BY t.metadata_item_id, t."index";
+			""", rating_keys)
+			tag_names = {v: k for k, v in tag_types.items()}
+			for rating_key, tag_type, tag in self.cursor.fetchall():
+				media_info = media_infos.get(str(rating_key))
+				if media_info is None: continue
+				if tag_names[tag_type] == 'Guid':
+					media_info['Guid'].append({'id': tag})
+				else:
+					media_info.setdefault(tag_names[tag_type], []).append({'tag': tag})
+
+			# Markers
+			self.cursor.execute(f"""
+				SELECT metadata_item_id, text, time_offset, end_time_offset
+				FROM taggings
+				WHERE metadata_item_id IN ({marks}) AND text IN ('intro', 'credits')
+				ORDER BY metadata_item_id, time_offset;
+			""", rating_keys)
+			for rating_key, marker_type, start, end in self.cursor.fetchall():
+				media_info = media_infos.get(str(rating_key))
+				if media_info is None: continue
+				media_info['Marker'].append({'type': marker_type, 'startTimeOffset': start, 'endTimeOffset': end})
+		finally:
+			self.cursor.execute("COMMIT;")
+
+		for media_info in media_infos.values():
+			# The guids are always kept (even when there are none) as the media is stored by them
+			if not media_info['Marker']: del media_info['Marker']
+		return media_infos
+
+	def read_ahead(self, media: Iterator[dict]) -> Iterator[dict]:
+		# Read the info of the media in chunks while it's being iterated over
+		media = iter(media)
+		while True:
+			chunk = list(islice(media, self.read_size))
+			if not chunk: break
+			self.__media_infos = self._read([m['ratingKey'] for m in chunk])
+			yield from chunk
+		self.__media_infos = {}
+		return
+
+	def media_info(self, rating_key: str) -> Union[dict, None]:
+		# Only has the info of the media in the chunk that is currently iterated over
+		return self.__media_infos.get(rating_key)
+
+class DatabaseWriter:
+	def __init__(self, cursor: Cursor, batch_size: int=write_batch_size, interval: float=write_interval, buffer_size: int=write_buffer_size, fast_writes: bool=False) -> None:
+		self.cursor = cursor
+		self.batch_size = batch_size
+		self.interval = interval
+		# In MB
+		self.buffer_size = buffer_size
+		self.fast_writes = fast_writes
+		# command -> list of parameters to execute the command with
+		self.__batches: Dict[str, List[Sequence]] = {}
+		self.__pending = 0
+		self.__pending_size = 0
+		self.__last_flush = perf_counter()
+
+		if fast_writes:
+			# Trade durability of the last few transactions for write speed,
+			# the database file itself can't get corrupted by this
+			self.cursor.execute("PRAGMA journal_mode = WAL;")
+			self.cursor.execute("PRAGMA synchronous = NORMAL;")
+			self.cursor.execute("PRAGMA cache_size = -65536;")
+
+	def execute(self, comm: str, params: Sequence=()) -> None:
+		# The commands are executed grouped per command and not in the order that they were given,
+		# so commands given to the writer shouldn't depend on each other
+		self.__batches.setdefault(comm, []).append(params)
+		self.__pending += 1
+		self.__pending_size += sum(len(p) for p in params if isinstance(p, bytes))
+		if (
+			self.__pending >= self.batch_size
+			or self.__pending_size >= self.buffer_size * 1_000_000
+			or perf_counter() - self.__last_flush >= self.interval
+		):
+			self.flush()
+		return
+
+	def insert(self, table: str, db_info: dict) -> None:
+		# Add the record, replacing the record with the same primary key if it exists
+		self.execute(f"""
+			INSERT OR REPLACE INTO {table}({",".join(db_info.keys())})
+			VALUES ({",".join(['?'] * len(db_info))});
+		""", list(db_info.values()))
+		return
+
+	def flush(self) -> None:
+		# Empty the batches first so that a failing batch isn't tried again when shutting down
+		batches, self.__batches = self.__batches, {}
+		self.__pending = 0
+		self.__pending_size = 0
+		self.__last_flush = perf_counter()
+		for comm, params in batches.items():
+			self.cursor.executemany(comm, params)
+		self.cursor.connection.commit()
+		return
+
+	def close(self) -> None:
+		self.flush()
+		if self.fast_writes:
+			# Move everything into the database file itself so that it can be copied on it's own
+			self.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+		return
+
+class ImageStore:
+	def __init__(self, ssn: Session, cursor: Cursor, writer: DatabaseWriter, workers: int=image_workers) -> None:
+		self.ssn = ssn
+		self.writer = writer
+
+		# Every image is stored once, with the records referring to it by the hash of it's content
+		cursor.execute(data_types['image']['table_command'])
+		cursor.execute(data_types['image_source']['table_command'])
+		cursor.execute("SELECT hash FROM image;")
+		self.__hashes = set(h for (h,) in cursor)
+		# The url of an image contains the time that the image was set,
+		# so an url that has been downloaded before doesn't have to be downloaded again
+		cursor.execute("SELECT url, hash FROM image_source WHERE machine_id = ?;", (cache.machine_id,))
+		self.__sources: Dict[str, str] = dict(cursor)
+
+		# Images are downloaded in the background and the records are written once their images are downloaded
+		self.__executor = ThreadPoolExecutor(max_workers=workers)
+		self.__downloads: Dict[str, Future] = {}
+		self.__pending: Deque[Tuple[str, dict, Dict[str, Tuple[str, Future]]]] = deque()
+
+	def _download(self, url: str, token: str) -> Union[Tuple[str, bytes], None]:
+		r = self.ssn.get(f'{base_url}{url}', params={'X-Plex-Token': token})
+		if not r.ok:
+			return None
+		return sha256(r.content).hexdigest(), r.content
+
+	def _store(self, url: str, download: Union[Tuple[str, bytes], None]) -> Union[str, None]:
+		# Returns the hash of the image, or None if it couldn't be downloaded
+		self.__downloads.pop(url, None)
+		if download is None:
+			return None
+
+		image_hash, content = download
+		if not image_hash in self.__hashes:
+			self.writer.execute("INSERT OR IGNORE INTO image(hash, data) VALUES (?, ?);", (image_hash, content))
+			self.__hashes.add(image_hash)
+		self.writer.execute(
+			"INSERT OR REPLACE INTO image_source(machine_id, url, hash) VALUES (?, ?, ?);",
+			(cache.machine_id, url, image_hash)
+		)
+		self.__sources[url] = image_hash
+		return image_hash
+
+	def insert(self, table: str, db_info: dict, images: Dict[str, str]) -> None:
+		# Insert the record once the images (column -> url) are downloaded, without waiting for them
+		downloads: Dict[str, Tuple[str, Future]] = {}
+		for column, url in images.items():
+			if url in self.__sources:
+				db_info[column] = self.__sources[url]
+				continue
+
+			if not url in self.__downloads:
+				# The token of the current user is needed to download images of it's playlists
+				self.__downloads[url] = self.__executor.submit(self._download, url, self.ssn.params.get('X-Plex-Token'))
+			downloads[column] = (url, self.__downloads[url])
+
+		self.__pending.append((table, db_info, downloads))
+		# Only wait when too many records are waiting so that memory usage stays bounded
+		self._write_downloaded(wait=len(self.__pending) > write_batch_size)
+		return
+
+	def _write_downloaded(self, wait: bool=False) -> None:
+		# Write the records of which the images are downloaded, in the order that they were given
+		while self.__pending:
+			table, db_info, downloads = self.__pending[0]
+			if not wait and not all(f.done() for _, f in downloads.values()):
+				break
+
+			for column, (url, future) in downloads.items():
+				if url in self.__sources:
+					# Another record with the same image was written first
+					db_info[column] = self.__sources[url]
+				else:
+					db_info[column] = self._store(url, future.result())
+			self.writer.insert(table, db_info)
+			self.__pending.popleft()
+			wait = False
+		return
+
+	def flush(self) -> None:
+		while self.__pending:
+			self._write_downloaded(wait=True)
+		return
+
+	def close(self, cancel: bool=False) -> None:
+		# When cancelled, records that are still waiting on images are dropped.
+		# They'll be exported the next time as they aren't in the database file.
+		if cancel:
+			self.__pending.clear()
+		else:
+			self.flush()
+		self.__executor.shutdown(wait=True, cancel_futures=cancel)
+		return
+
+class Checkpoints:
+	def __init__(self, cursor: Cursor, writer: DatabaseWriter, type: str, resume: bool=False) -> None:
+		self.writer = writer
+		self.type = type
+		cursor.execute(data_types['checkpoint']['table_command'])
+
+		# (process, library key) -> rating key of the last media that was done in the earlier run
+		self.__resume_from: Dict[Tuple[str, str], str] = {}
+		if resume:
+			cursor.execute(
+				"SELECT process, library_key, rating_key FROM checkpoint WHERE machine_id = ? AND type = ?;",
+				(cache.machine_id, type)
+			)
+			self.__resume_from = {(process, library_key): rating_key for process, library_key, rating_key in cursor}
+		else:
+			self.clear()
+		return
+
+	@property
+	def resuming(self) -> bool:
+		return bool(self.__resume_from)
+
+	def keep(self, media: Iterator[Tuple[str, str]]) -> None:
+		# Forget the checkpoints of media that isn't there anymore (library key, rating key),
+		# as the complete library would be skipped otherwise
+		present = set(media)
+		for (process, library_key), rating_key in list(self.__resume_from.items()):
+			if not (library_key, rating_key) in present:
+				del self.__resume_from[(process, library_key)]
+		return
+
+	def skip(self, process: str, library_key: str, rating_key: str) -> bool:
+		# Whether the media was already done in the earlier run
+		resume_from = self.__resume_from.get((process, library_key))
+		if resume_from is None:
+			return False
+		if resume_from == rating_key:
+			# Continue after this media
+			del self.__resume_from[(process, library_key)]
+		return True
+
+	def done(self, process: str, library_key: str, rating_key: str) -> None:
+		# Written together with the data of the media
+		self.writer.execute("""
+			INSERT OR REPLACE INTO checkpoint(machine_id, type, process, library_key, rating_key)
+			VALUES (?, ?, ?, ?, ?);
+		""", (cache.machine_id, self.type, process, library_key, rating_key))
+		return
+
+	def clear(self) -> None:
+		self.writer.execute(
+			"DELETE FROM checkpoint WHERE machine_id = ? AND type = ?;",
+			(cache.machine_id, self.type)
+		)
+		return
+
 class GetTargetedMedia:
 	def __init__(self,
 	    all_media: bool, all_movie: bool, all_show: bool, all_music: bool,
@@ -257,9 +1005,16 @@ class GetTargetedMedia:
 		movie_names: List[str],
 		series_name: str, season_number: int, episode_number: int,
 		artist_name: str, album_name: str, track_name: str,
-		ssn: Session, verbose: bool=False
+		ssn: Session, verbose: bool=False, workers: int=1
 	) -> None:
 		self.results: List[dict] = []
+		self.crawled = False
+		# library key -> timestamp; only media updated since then is targeted in the library
+		self.updated_since: Dict[str, int] = {}
+		# The keys of the libraries that are targeted completely
+		self.libraries: List[str] = []
+		# The key of the library that is being walked
+		self.library_key: Union[str, None] = None
 		
 		self.all_media = all_media
 		self.all_movie = all_movie
@@ -275,31 +1030,123 @@ class GetTargetedMedia:
 		self.track_name = track_name
 		self.ssn = ssn
 		self.verbose = verbose
+		self.workers = workers
+
+	def _fetch_tree(self, parent: dict) -> Tuple[Union[dict, None], Union[List[dict], None], List[dict]]:
+		# Fetch the info, children (seasons/albums) and leaves (episodes/tracks) of a show or artist
+		# The info is None when it couldn't be fetched and the children are None when they couldn't be fetched
+		info = cache.media_info(parent['ratingKey'], parent.get('updatedAt'))
+		if not info:
+			return None, None, []
+
+		children = self.ssn.get(f'{base_url}{parent["key"]}', params={'includeGuids': '1'})
+		if not children.ok:
+			return info, None, []
+		children = children.json()['MediaContainer'].get('Metadata', [])
+
+		leaves = self.ssn.get(
+			f'{base_url}/library/metadata/{parent["ratingKey"]}/allLeaves', params={'includeGuids': '1'}
+		).json()['MediaContainer'].get('Metadata', [])
+
+		return info, children, leaves
+
+	def _crawl(self, parents: Iterator[dict]) -> Iterator[Tuple[dict, Tuple[Union[dict, None], Union[List[dict], None], List[dict]]]]:
+		# Fetch the tree of every parent with up to self.workers parents being fetched at the same time
+		# The trees are yielded in the same order as the parents are given, no matter which fetch finishes first
+		if self.workers <= 1:
+			for parent in parents:
+				yield parent, self._fetch_tree(parent)
+			return
 
-	def iter(self) -> dict:
-		if self.results:
-			for result in self.results:
-				yield result
+		parents = iter(parents)
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			# Keep a limited amount of parents fetched ahead so that memory usage stays bounded
+			pending = deque(
+				(parent, executor.submit(self._fetch_tree, parent))
+				for parent in islice(parents, self.workers * 2)
+			)
+			while pending:
+				parent, future = pending.popleft()
+				for next_parent in islice(parents, 1):
+					pending.append((next_parent, executor.submit(self._fetch_tree, next_parent)))
+				yield parent, future.result()
+
+	def iter(self) -> Iterator[dict]:
+		# Only crawl the first time; replay the results the times after that
+		# When there is a cache file, the results are kept in there instead of in memory
+		if self.crawled:
+			yield from (cache.iter_results() if cache.db is not None else self.results)
 			return
-		
+
+		if cache.db is not None:
+			cache.clear_results()
+		else:
+			self.results.clear()
+		self.libraries.clear()
+
+		for result in self._walk():
+			# Listings don't mention the library of their media
+			result.setdefault('librarySectionID', self.library_key)
+			if cache.db is not None:
+				cache.add_result(result)
+			else:
+				self.results.append(result)
+			yield result
+
+		self.crawled = True
+		return
+
+	def _walk_updated(self, lib: dict, since: int) -> Generator[dict, None, bool]:
+		# Only list the media in the library that has been updated since the timestamp
+		# Returns whether all updated media could be listed
+		for type_id in library_type_ids.get(lib['type'], ()):
+			lib_output = Listing(
+				self.ssn,
+				f'{base_url}/library/sections/{lib["key"]}/all',
+				{'type': type_id, 'includeGuids': '1', 'updatedAt>>': since}
+			)
+			for media in lib_output:
+				if self.verbose: print(f'	{media["title"]}')
+				if media['type'] in ('show', 'artist'):
+					# Same as a full crawl, give the complete info of shows and artists
+					media = cache.media_info(media['ratingKey'], media.get('updatedAt'))
+					if not media: continue
+				yield media
+			if not lib_output.complete: return False
+		return True
+
+	@property
+	def complete_library(self) -> bool:
+		# Whether the targeted libraries are targeted completely instead of only specific media in them
+		return self.movie_names is None and self.series_name is None and self.artist_name is None
+
+	def is_targeted(self, lib: dict) -> bool:
+		return (
+			lib['type'] in library_type_ids # lib is supported
+			and (
+				self.all_media
+				or (self.all_movie and lib['type'] == 'movie')
+				or (self.all_show and lib['type'] == 'show')
+				or (self.all_music and lib['type'] == 'artist')
+				or (self.library_names is not None and lib['title'] in self.library_names)
+			)
+		)
+
+	def _walk(self) -> Iterator[dict]:
 		for lib in cache.sections:
-			if not (
-				lib['type'] in data_types # lib is supported
-				and (
-					self.all_media
-					or (self.all_movie and lib['type'] == 'movie')
-					or (self.all_show and lib['type'] == 'show')
-					or (self.all_music and lib['type'] == 'artist')
-					or (self.library_names is not None and lib['title'] in self.library_names)
-				)
-			):
+			if not self.is_targeted(lib):
 				# A specific library is targeted and this one isn't it so skip
 				continue
 
 			print(lib['title'])
-			lib_output = ssn.get(f'{base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1'})
-			if not lib_output.ok: continue
-			lib_output = lib_output.json()['MediaContainer'].get('Metadata', [])
+			self.library_key = lib['key']
+			complete_library = self.complete_library
+			if complete_library and lib['key'] in self.updated_since:
+				if (yield from self._walk_updated(lib, self.updated_since[lib['key']])):
+					self.libraries.append(lib['key'])
+				continue
+
+			lib_output = Listing(self.ssn, f'{base_url}/library/sections/{lib["key"]}/all', {'includeGuids': '1'})
 
 			if lib['type'] == 'movie':
 				for movie in lib_output:
@@ -307,32 +1154,27 @@ class GetTargetedMedia:
 						continue
 					
 					if self.verbose: print(f'	{movie["title"]}')
-					self.results.append(movie)
 					yield movie
 					
 			elif lib['type'] == 'show':
-				for show in lib_output:
-					if self.series_name is not None and show['title'] != self.series_name:
-						continue
-					
+				shows = (
+					show for show in lib_output
+					if self.series_name is None or show['title'] == self.series_name
+				)
+				for show, (show_info, season_info, episode_info) in self._crawl(shows):
 					if self.verbose: print(f'	{show["title"]}')
 					# Process show
-					show_info = cache.media_info(show['ratingKey'])
 					if show_info:
-						self.results.append(show_info)
 						yield show_info
 					else:
 						continue
 
 					# Process seasons
-					season_info = self.ssn.get(f'{base_url}{show["key"]}', params={'includeGuids': '1'})
-					if not season_info.ok: continue
-					season_info = season_info.json()['MediaContainer'].get('Metadata', [])
+					if season_info is None: continue
 					for season in season_info:
 						if self.season_number is not None and season['index'] != self.season_number:
 							continue
 						
-						self.results.append(season)
 						yield season
 						
 						if self.season_number is not None:
@@ -342,9 +1184,6 @@ class GetTargetedMedia:
 							return 'Season not found'
 
 					# Process episodes
-					episode_info = ssn.get(
-						f'{base_url}/library/metadata/{show["ratingKey"]}/allLeaves', params={'includeGuids': '1'}
-					).json()['MediaContainer'].get('Metadata', [])
 					for episode in episode_info:
 						if self.season_number is not None and episode['parentIndex'] != self.season_number:
 							continue
@@ -352,7 +1191,6 @@ class GetTargetedMedia:
 							continue
 						
 						if self.verbose: print(f'		S{episode["parentIndex"]}E{episode["index"]} - {episode["title"]}')
-						self.results.append(episode)
 						yield episode
 						
 						if self.episode_number is not None:
@@ -368,28 +1206,24 @@ class GetTargetedMedia:
 						return 'Series not found'
 
 			elif lib['type'] == 'artist':
-				for artist in lib_output:
-					if self.artist_name is not None and artist['title'] != self.artist_name:
-						continue
-					
+				artists = (
+					artist for artist in lib_output
+					if self.artist_name is None or artist['title'] == self.artist_name
+				)
+				for artist, (artist_info, album_info, track_info) in self._crawl(artists):
 					if self.verbose: print(f'	{artist["title"]}')
 					# Process artist
-					artist_info = cache.media_info(artist['ratingKey'])
 					if artist_info:
-						self.results.append(artist_info)
 						yield artist_info
 					else:
 						continue
 
 					# Process albums
-					album_info = self.ssn.get(f'{base_url}{artist["key"]}', params={'includeGuids': '1'})
-					if not album_info.ok: continue
-					album_info = album_info.json()['MediaContainer'].get('Metadata', [])
+					if album_info is None: continue
 					for album in album_info:
 						if self.album_name is not None and album['title'] != self.album_name:
 							continue
 						
-						self.results.append(album)
 						yield album
 						
 						if self.album_name is not None:
@@ -399,9 +1233,6 @@ class GetTargetedMedia:
 							return 'Album not found'
 
 					# Process tracks
-					track_info = ssn.get(
-						f'{base_url}/library/metadata/{artist["ratingKey"]}/allLeaves', params={'includeGuids': '1'}
-					).json()['MediaContainer'].get('Metadata', [])
 					for track in track_info:
 						if self.album_name is not None and track['parentTitle'] != self.album_name:
 							continue
@@ -409,7 +1240,6 @@ class GetTargetedMedia:
 							continue
 						
 						if self.verbose: print(f'		D{track["parentIndex"]}T{track["index"]} - {track["title"]}')
-						self.results.append(track)
 						yield track
 						
 						if self.track_name is not None:
@@ -426,6 +1256,53 @@ class GetTargetedMedia:
 			else:
 				print('	Library not supported')
 
+			if complete_library and lib_output.complete:
+				self.libraries.append(lib['key'])
+
+class GuidIndex:
+	def __init__(self, ssn: Session) -> None:
+		self.ssn = ssn
+		# lib key -> (plex type id, guid id) -> rating key
+		self.__libraries: Dict[str, Dict[Tuple[str, str], str]] = {}
+		return
+
+	def library(self, lib: dict) -> Dict[Tuple[str, str], str]:
+		# Build the index of the library with one request per type of media in it
+		if not lib['key'] in self.__libraries:
+			index: Dict[Tuple[str, str], str] = {}
+			for type_id in library_type_ids.get(lib['type'], ()):
+				lib_output = Listing(
+					self.ssn,
+					f'{base_url}/library/sections/{lib["key"]}/all',
+					{'type': type_id, 'includeGuids': '1'}
+				)
+				for media in lib_output:
+					for guid in media.get('Guid', []):
+						index[(type_id, guid['id'])] = media['ratingKey']
+			self.__libraries[lib['key']] = index
+		return self.__libraries[lib['key']]
+
+	def find(self, guids: str, libraries: List[dict], media_type: str=None) -> Union[Tuple[str, dict], None]:
+		# guids is the str() of the Guid list as stored in the database
+		if not guids: return None
+		try:
+			guid_ids = [g['id'] for g in literal_eval(guids)]
+		except (ValueError, SyntaxError, TypeError, KeyError):
+			return None
+
+		for lib in libraries:
+			index = self.library(lib)
+			lib_type_ids = library_type_ids.get(lib['type'], ())
+			if media_type is not None:
+				if not type_ids[media_type] in lib_type_ids: continue
+				lib_type_ids = (type_ids[media_type],)
+			for type_id in lib_type_ids:
+				for guid_id in guid_ids:
+					rating_key = index.get((type_id, guid_id))
+					if rating_key is not None:
+						return rating_key, lib
+		return None
+
 class Type(ABC):
 	@abstractmethod
 	def run(self) -> Union[List[int], str]:
@@ -438,15 +1315,20 @@ class Export(Type):
 		process: List[str],
 		user_data: Tuple[tuple, tuple],
 		media_getter: GetTargetedMedia,
-		verbose: bool=False
+		verbose: bool=False, full_export: bool=False, resume: bool=False
 	) -> None:
 		self.ssn = ssn
 		self.cursor = cursor
+		self.writer = DatabaseWriter(cursor, fast_writes=True)
+		self.images = ImageStore(ssn, cursor, self.writer)
+		self.checkpoints = Checkpoints(cursor, self.writer, 'export', resume)
 		self.plex_cursor = plex_cursor
+		self.plex_db = PlexDatabase(plex_cursor) if plex_cursor is not None else None
 		self.process = process
 		self.user_data = user_data
 		self.media_getter = media_getter
 		self.verbose = verbose
+		self.full_export = full_export
 
 		self.function_mapping = {
 			'server_settings': self._server_settings,
@@ -464,7 +1346,7 @@ class Export(Type):
 		self.cursor.execute(data_types['server']['table_command'])
 		
 		# Delete old entries as they could be outdated
-		self.cursor.execute("DELETE FROM server WHERE machine_id = ?", (cache.machine_id,))
+		self.writer.execute("DELETE FROM server WHERE machine_id = ?;", (cache.machine_id,))
 		
 		# Build new db entry
 		db_info = {
@@ -476,10 +1358,7 @@ class Export(Type):
 			db_info[pref['id']] = pref['value']
 		
 		# Add to database
-		self.cursor.execute(f"""
-			INSERT INTO server({",".join(db_info.keys())})
-			VALUES ({",".join(['?'] * len(db_info))});
-		""", db_info.values())
+		self.writer.insert('server', db_info)
 
 		return []
 
@@ -506,13 +1385,13 @@ class Export(Type):
 					# Skip because it hasn't been updated since last export
 					continue
 
-				elif updated_at:
-					# Existing record is outdated so delete
-					self.cursor.execute("DELETE FROM collection WHERE rating_key = ?", (collection['ratingKey'],))
-				
-				else:
+				elif not updated_at:
 					# Collection either hasn't been added to db yet or has been imported after exporting
-					self.cursor.execute("DELETE FROM collection WHERE title = ?", (collection['title'],))
+					# An outdated record with the same rating key is replaced when inserting the new one
+					self.writer.execute(
+						"DELETE FROM collection WHERE title = ? AND rating_key != ?;",
+						(collection['title'], collection['ratingKey'])
+					)
 
 				# Fetch info of collection and build up database entry
 				data: dict = self.ssn.get(
@@ -536,16 +1415,11 @@ class Export(Type):
 					else:
 						db_info[key] = data.get(key)
 				
-				for poster_type in ('thumb', 'art'):
-					if poster_type in data:
-						r = self.ssn.get(f'{base_url}{data[poster_type]}')
-						db_info[poster_type] = r.content if r.ok else None
-				
-				comm = f"""
-					INSERT INTO collection({",".join(db_info.keys())})
-					VALUES ({",".join(['?'] * len(db_info))});
-				"""
-				self.cursor.execute(comm, list(db_info.values()))
+				self.images.insert('collection', db_info, {
+					poster_type: data[poster_type]
+					for poster_type in ('thumb', 'art')
+					if poster_type in data
+				})
 				result.append(collection['ratingKey'])
 
 		return result
@@ -573,7 +1447,6 @@ class Export(Type):
 				if updated_at == playlist.get('updatedAt', 0):
 					# Skip because it hasn't been updated since last export
 					continue
-				self.cursor.execute("DELETE FROM playlist WHERE rating_key = ?", (playlist['ratingKey'],))
 				
 				playlist_content = self.ssn.get(
 					f'{base_url}{playlist["key"]}',
@@ -590,42 +1463,171 @@ class Export(Type):
 					'guids': "|".join(str(m['Guid']) for m in playlist_content if 'Guid' in m)
 				}
 				
-				for poster_type in ('thumb', 'art'):
-					if poster_type in playlist:
-						r = self.ssn.get(f'{base_url}{playlist[poster_type]}')
-						db_info[poster_type] = r.content if r.ok else None
-
-				comm = f"""
-					INSERT INTO playlist({",".join(db_info.keys())})
-					VALUES ({",".join(['?'] * len(db_info))})
-				"""
-				self.cursor.execute(comm, list(db_info.values()))
+				self.images.insert('playlist', db_info, {
+					poster_type: playlist[poster_type]
+					for poster_type in ('thumb', 'art')
+					if poster_type in playlist
+				})
 				result.append(playlist['ratingKey'])
 				
 		return result
 	
+	def _upsert(self, table: str, db_info: dict) -> None:
+		# Add the record or, if it already exists, only update the given columns of it
+		columns = ",".join(f'"{k}"' for k in db_info.keys())
+		comm = f"""
+			INSERT INTO {table}({columns})
+			VALUES ({",".join(['?'] * len(db_info))})
+			ON CONFLICT(rating_key) DO UPDATE SET {",".join(f'"{k}" = excluded."{k}"' for k in db_info.keys())};
+		"""
+		self.writer.execute(comm, list(db_info.values()))
+		return
+
+	def _media(self) -> Iterator[dict]:
+		# The targeted media, of which the info is read ahead from the plex database when it's available
+		if self.plex_db is None:
+			return self.media_getter.iter()
+		return self.plex_db.read_ahead(self.media_getter.iter())
+
+	def _media_info(self, media: dict) -> Union[dict, None]:
+		if self.plex_db is not None:
+			media_info = self.plex_db.media_info(media['ratingKey'])
+			if media_info is not None:
+				return media_info
+		# Fall back to the api
+		return cache.media_info(media['ratingKey'], media.get('updatedAt'))
+
 	def _metadata(self) -> List[int]:
 		print('Metadata')
-		for media in self.media_getter.iter():
-			pass
-		return []
+		result: List[int] = []
+
+		# Create tables if they don't exist
+		for media_type in media_types:
+			self.cursor.execute(data_types[media_type]['table_command'])
+
+		for media in self._media():
+			library_key = str(media['librarySectionID'])
+			if self.checkpoints.skip('metadata', library_key, media['ratingKey']): continue
+			if not (media['type'] in media_types and 'Guid' in media): continue
+			if media['type'] != 'season':
+				# The library output doesn't contain all metadata
+				media = self._media_info(media)
+				if not media: continue
+
+			db_info = {
+				'rating_key': media['ratingKey'],
+				'guid': str(media['Guid']),
+				'updated_at': media.get('updatedAt', 0)
+			}
+			for key in data_types[media['type']]['metadata_keys']:
+				if key[0].isupper():
+					db_info[key] = ",".join(t['tag'] for t in media.get(key, [])) or None
+				elif key == 'titleSort':
+					db_info[key] = media.get('titleSort', media.get('title', ''))
+				else:
+					db_info[key] = media.get(key)
+
+			self._upsert(media['type'], db_info)
+			self.checkpoints.done('metadata', library_key, db_info['rating_key'])
+			result.append(media['ratingKey'])
+
+		return result
 
 	def _advanced_metadata(self) -> List[int]:
 		print('Advanced metadata')
-		for media in self.media_getter.iter():
-			pass
-		return []
+		result: List[int] = []
+
+		# Create tables if they don't exist
+		for media_type in media_types:
+			self.cursor.execute(data_types[media_type]['table_command'])
+
+		for media in self._media():
+			library_key = str(media['librarySectionID'])
+			if self.checkpoints.skip('advanced_metadata', library_key, media['ratingKey']): continue
+			if not (media['type'] in media_types and 'Guid' in media): continue
+			keys = data_types[media['type']]['advanced_metadata_keys']
+			if not keys: continue
+			media = self._media_info(media)
+			if not media: continue
+
+			db_info = {
+				'rating_key': media['ratingKey'],
+				'guid': str(media['Guid']),
+				'updated_at': media.get('updatedAt', 0)
+			}
+			for setting in media.get('Preferences', {}).get('Setting', []):
+				if setting['id'] in keys:
+					db_info[setting['id']] = setting['value']
+
+			self._upsert(media['type'], db_info)
+			self.checkpoints.done('advanced_metadata', library_key, db_info['rating_key'])
+			result.append(media['ratingKey'])
+
+		return result
+
+	def _media_processes(self) -> List[str]:
+		return [
+			p for p in self.process
+			if p in self.function_mapping and not p in ('server_settings', 'collection', 'playlist')
+		]
+
+	def _load_watermarks(self) -> None:
+		# Only target the media that has been updated since the last export of the library
+		self.cursor.execute(data_types['watermark']['table_command'])
+		media_processes = self._media_processes()
+		if (
+			self.full_export
+			or not media_processes
+			or any(not p in incremental_processes for p in media_processes)
+		):
+			return
+
+		self.cursor.execute(f"""
+			SELECT library_key, MIN(exported_at)
+			FROM watermark
+			WHERE machine_id = ? AND process IN ({",".join(['?'] * len(media_processes))})
+			GROUP BY library_key
+			HAVING COUNT(*) = ?;
+		""", (cache.machine_id, *media_processes, len(media_processes)))
+		self.media_getter.updated_since = dict(self.cursor)
+		return
+
+	def _save_watermarks(self, exported_at: int) -> None:
+		# Libraries of which only a part was targeted don't get a watermark
+		for library_key in self.media_getter.libraries:
+			for process in self._media_processes():
+				self.writer.execute("""
+					INSERT OR REPLACE INTO watermark(machine_id, library_key, process, exported_at)
+					VALUES (?, ?, ?, ?);
+				""", (cache.machine_id, library_key, process, exported_at))
+		return
 
 	def run(self) -> Union[List[int], str]:
 		result: List[int] = []
+		# Margin for the clock of this machine being ahead of the clock of the server
+		started_at = int(time()) - 300
+		self._load_watermarks()
+		if self.checkpoints.resuming and self._media_processes():
+			self.checkpoints.keep(
+				(str(m['librarySectionID']), m['ratingKey'])
+				for m in self.media_getter.iter()
+			)
 		
 		for process, func in self.function_mapping.items():
 			if process in self.process:
 				response = func()
+				# Write everything of the process before starting the next one
+				self.images.flush()
+				self.writer.flush()
 				if isinstance(response, str):
 					return response
 				result += response
 
+		self._save_watermarks(started_at)
+		# Everything is done so a next run starts from the beginning
+		self.checkpoints.clear()
+		self.images.close()
+		self.writer.close()
 		return result
 
 
@@ -637,35 +1639,389 @@ class Import(Type):
 		process: List[str],
 		user_data: Tuple[tuple, tuple],
 		media_getter: GetTargetedMedia,
-		verbose: bool=False
+		verbose: bool=False, resume: bool=False
 	) -> None:
 		self.ssn = ssn
 		self.cursor = cursor
+		self.writer = DatabaseWriter(cursor)
+		self.checkpoints = Checkpoints(cursor, self.writer, 'import', resume)
 		self.plex_cursor = plex_cursor
 		self.process = process
 		self.user_data = user_data
 		self.media_getter = media_getter
 		self.verbose = verbose
+		self.guid_index = GuidIndex(ssn)
+
+		self.function_mapping = {
+			'server_settings': self._server_settings,
+			'collection': self._collection,
+			'playlist': self._playlist,
+			'metadata': self._metadata,
+			'advanced_metadata': self._advanced_metadata
+		}
+		return
+
+	def _has_table(self, table: str) -> bool:
+		self.cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (table,))
+		return self.cursor.fetchone() is not None
+
+	def _rows(self, table: str, order: str='rowid') -> Iterator[dict]:
+		# Separate cursor so that the image lookups don't interfere with it
+		rows = self.cursor.connection.cursor()
+		rows.execute(f"SELECT * FROM {table} ORDER BY {order};")
+		keys = next(zip(*rows.description))
+		for row in rows:
+			yield dict(zip(keys, row))
+		return
+
+	def _image_data(self, image_hash: Union[str, None]) -> Union[bytes, None]:
+		if not image_hash: return None
+		self.cursor.execute("SELECT data FROM image WHERE hash = ?;", (image_hash,))
+		image = self.cursor.fetchone()
+		return image[0] if image is not None else None
+
+	def _post_images(self, endpoint: str, row: dict, params: dict={}) -> None:
+		for poster_type, url_type in (('thumb', 'posters'), ('art', 'arts')):
+			data = self._image_data(row.get(poster_type))
+			if data is not None:
+				self.ssn.post(f'{base_url}{endpoint}/{url_type}', data=data, params=params)
 		return
 
+	def _server_settings(self) -> Union[List, str]:
+		print('Server Settings')
+		if not self._has_table('server'): return []
+
+		rows = list(self._rows('server'))
+		settings = next((r for r in rows if r['machine_id'] == cache.machine_id), None)
+		if settings is None:
+			if len(rows) != 1: return []
+			# Importing the settings of another server
+			settings = rows[0]
+
+		payload = {
+			k: v
+			for k, v in settings.items()
+			if k != 'machine_id' and v is not None
+		}
+		self.ssn.put(f'{base_url}/:/prefs', params=payload)
+		return []
+
+	def _collection(self) -> Union[List[int], str]:
+		print('Collections')
+		result: List[int] = []
+		if not self._has_table('collection'): return result
+
+		collections = list(self._rows('collection'))
+		for lib in cache.sections:
+			lib_type_ids = library_type_ids.get(lib['type'], ())
+			lib_collections = [
+				c for c in collections
+				if type_ids.get(c['subtype']) in lib_type_ids and c['guids']
+			]
+			if not lib_collections: continue
+
+			# title -> rating key
+			existing_collections = {
+				c['title']: c['ratingKey']
+				for c in self.ssn.get(
+					f'{base_url}/library/sections/{lib["key"]}/collections'
+				).json()['MediaContainer'].get('Metadata', [])
+			}
+			for collection in lib_collections:
+				# Collection only fits in library if all of it's content is in it
+				rating_keys = []
+				for guids in collection['guids'].split('|'):
+					match = self.guid_index.find(guids, [lib], collection['subtype'])
+					if match is None: break
+					rating_keys.append(match[0])
+				else:
+					# Replace existing collection
+					old_rating_key = existing_collections.get(collection['title'])
+					if old_rating_key is not None:
+						self.ssn.delete(f'{base_url}/library/collections/{old_rating_key}')
+
+					new_rating_key = self.ssn.post(f'{base_url}/library/collections', params={
+						'title': collection['title'],
+						'smart': '0',
+						'sectionId': lib['key'],
+						'type': type_ids[collection['subtype']],
+						'uri': f'server://{cache.machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(rating_keys)}'
+					}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+
+					self._post_images(f'/library/collections/{new_rating_key}', collection)
+
+					payload = {
+						'type': type_ids['collection'],
+						'id': new_rating_key
+					}
+					for key in ('title', 'titleSort', 'contentRating', 'summary'):
+						payload[f'{key}.value'] = collection[key] or ''
+						payload[f'{key}.locked'] = 1
+					self.ssn.put(f'{base_url}/library/sections/{lib["key"]}/all', params=payload)
+
+					payload = {
+						k: collection[k]
+						for k in ('collectionMode', 'collectionSort')
+						if collection[k] is not None
+					}
+					if payload:
+						self.ssn.put(f'{base_url}/library/metadata/{new_rating_key}/prefs', params=payload)
+					result.append(new_rating_key)
+
+		return result
+
+	def _playlist(self) -> Union[List[int], str]:
+		print('Playlists')
+		result: List[int] = []
+		if not self._has_table('playlist'): return result
+
+		user_tokens = dict(zip(*self.user_data))
+		user_tokens['_admin'] = plex_api_token
+		user_playlists: Dict[str, List[dict]] = {}
+		for playlist in self._rows('playlist'):
+			user_token = user_tokens.get(str(playlist['user_id']))
+			if user_token is None or not playlist['guids']: continue
+			params = {'X-Plex-Token': user_token}
+
+			# Remove existing playlists with the same title
+			if not user_token in user_playlists:
+				user_playlists[user_token] = self.ssn.get(
+					f'{base_url}/playlists', params=params
+				).json()['MediaContainer'].get('Metadata', [])
+			for user_playlist in user_playlists[user_token]:
+				if user_playlist['title'] == playlist['title']:
+					self.ssn.delete(f'{base_url}/playlists/{user_playlist["ratingKey"]}', params=params)
+
+			rating_keys = []
+			for guids in playlist['guids'].split('|'):
+				match = self.guid_index.find(guids, cache.sections)
+				if match is not None:
+					rating_keys.append(match[0])
+			if not rating_keys: continue
+
+			new_rating_key = self.ssn.post(f'{base_url}/playlists', params={
+				**params,
+				'type': playlist['playlistType'],
+				'title': playlist['title'],
+				'smart': '0',
+				'uri': f'server://{cache.machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(rating_keys)}'
+			}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+
+			if playlist['summary']:
+				self.ssn.put(f'{base_url}/playlists/{new_rating_key}', params={**params, 'summary': playlist['summary']})
+			self._post_images(f'/playlists/{new_rating_key}', playlist, params)
+			result.append(new_rating_key)
+
+		return result
+
+	def _targets(self) -> Tuple[List[dict], Union[set, None]]:
+		# The libraries to import into and, if only specific media is targeted, the rating keys of that media
+		libraries = [lib for lib in cache.sections if self.media_getter.is_targeted(lib)]
+		rating_keys = None
+		if not self.media_getter.complete_library:
+			rating_keys = set(m['ratingKey'] for m in self.media_getter.iter())
+		return libraries, rating_keys
+
+	def _media_tables(self, lib: dict, process: str) -> List[str]:
+		# The media types in the database that can be imported into the library for the process
+		return [
+			media_type for media_type in media_types
+			if type_ids[media_type] in library_type_ids[lib['type']]
+			and data_types[media_type][f'{process}_keys']
+			and self._has_table(media_type)
+		]
+
+	def _import_media(self, process: str, apply) -> List[int]:
+		result: List[int] = []
+		libraries, rating_keys = self._targets()
+
+		for lib in libraries:
+			print(lib['title'])
+			for media_type in self._media_tables(lib, process):
+				# Ordered on rating key as the rowids change when the database is exported to again
+				for row in self._rows(media_type, 'rating_key'):
+					# The rating keys of the database rows are used as they're the same every run
+					if self.checkpoints.skip(process, lib['key'], row['rating_key']): continue
+					match = self.guid_index.find(row['guid'], [lib], media_type)
+					if (
+						match is not None
+						and (rating_keys is None or match[0] in rating_keys)
+						and apply(media_type, row, match[0], lib)
+					):
+						result.append(match[0])
+					self.checkpoints.done(process, lib['key'], row['rating_key'])
+
+		return result
+
+	def _apply_metadata(self, media_type: str, row: dict, rating_key: str, lib: dict) -> bool:
+		# Rows without title were only exported for the advanced metadata
+		if row['title'] is None: return False
+		media_info = cache.media_info(rating_key)
+		if not media_info: return False
+
+		payload = {
+			'type': type_ids[media_type],
+			'id': rating_key
+		}
+		if media_type == 'album':
+			payload['artist.id.value'] = media_info['parentRatingKey']
+
+		for key in data_types[media_type]['metadata_keys']:
+			value = row[key]
+			if key[0].isupper():
+				lower_key = key.lower()
+				# Add tags
+				for offset, tag in enumerate(value.split(',') if value else []):
+					payload[f'{lower_key}[{offset}].tag.tag'] = tag
+				# Remove other tags
+				if key in media_info:
+					payload[f'{lower_key}[].tag.tag-'] = ",".join(t['tag'] for t in media_info[key])
+				payload[f'{lower_key}.locked'] = 1
+			else:
+				payload[f'{key}.value'] = value if value is not None else ''
+				payload[f'{key}.locked'] = 1
+
+		self.ssn.put(f'{base_url}/library/sections/{lib["key"]}/all', params=payload)
+		return True
+
+	def _apply_advanced_metadata(self, media_type: str, row: dict, rating_key: str, lib: dict) -> bool:
+		payload = {
+			k: row[k]
+			for k in data_types[media_type]['advanced_metadata_keys']
+			if row[k] is not None
+		}
+		if not payload: return False
+
+		self.ssn.put(f'{base_url}/library/metadata/{rating_key}/prefs', params=payload)
+		return True
+
+	def _metadata(self) -> List[int]:
+		print('Metadata')
+		return self._import_media('metadata', self._apply_metadata)
+
+	def _advanced_metadata(self) -> List[int]:
+		print('Advanced metadata')
+		return self._import_media('advanced_metadata', self._apply_advanced_metadata)
+
 	def run(self) -> Union[List[int], str]:
-		pass
+		result: List[int] = []
+		media_processes = [p for p in self.process if p in ('metadata', 'advanced_metadata')]
+		if self.checkpoints.resuming and media_processes:
+			self.checkpoints.keep(
+				(lib['key'], rating_key)
+				for lib in self._targets()[0]
+				for media_type in set(t for p in media_processes for t in self._media_tables(lib, p))
+				for (rating_key,) in self.cursor.connection.execute(f"SELECT rating_key FROM {media_type};")
+			)
+
+		for process, func in self.function_mapping.items():
+			if process in self.process:
+				response = func()
+				self.writer.flush()
+				if isinstance(response, str):
+					return response
+				result += response
+
+		# Everything is done so a next run starts from the beginning
+		self.checkpoints.clear()
+		self.writer.close()
+		return result
 
 
 
 class Reset(Type):
 	def __init__(self,
 	    ssn: Session,
-	    verbose: bool=False
+		process: List[str],
+		media_getter: GetTargetedMedia,
+		verbose: bool=False, chunk_size: int=reset_chunk_size
 	) -> None:
 		self.ssn = ssn
+		self.process = process
+		self.media_getter = media_getter
 		self.verbose = verbose
+		self.chunk_size = chunk_size
+		return
+
+	def _unlock(self, lib_key: str, type_id: str, rating_keys: List[str], fields: List[str]) -> None:
+		# Unlock the fields of multiple media at once
+		for start in range(0, len(rating_keys), self.chunk_size):
+			payload = {
+				'type': type_id,
+				'id': ",".join(rating_keys[start:start + self.chunk_size])
+			}
+			for field in fields:
+				payload[f'{field}.locked'] = 0
+			self.ssn.put(f'{base_url}/library/sections/{lib_key}/all', params=payload)
 		return
 
+	def _fields(self, media_type: str) -> List[str]:
+		fields = []
+		prefix = 'episode_' if media_type == 'episode' else ''
+		if f'{prefix}poster' in self.process:
+			fields.append('thumb')
+		if f'{prefix}art' in self.process:
+			fields.append('art')
+		if 'metadata' in self.process:
+			fields += [k.lower() if k[0].isupper() else k for k in data_types[media_type]['metadata_keys']]
+		return fields
+
+	def _collection(self) -> List[int]:
+		print('Collections')
+		result: List[int] = []
+
+		fields = ['title', 'titleSort', 'contentRating', 'summary']
+		for lib in cache.sections:
+			collections: List[dict] = self.ssn.get(
+				f'{base_url}/library/sections/{lib["key"]}/collections'
+			).json()['MediaContainer'].get('Metadata', [])
+			rating_keys = [c['ratingKey'] for c in collections]
+			self._unlock(lib['key'], type_ids['collection'], rating_keys, fields)
+			result += rating_keys
+
+		return result
+
+	def _media(self) -> List[int]:
+		result: List[int] = []
+
+		# If only specific media is targeted, only reset that media
+		targeted_keys = None
+		if not self.media_getter.complete_library:
+			targeted_keys = set(m['ratingKey'] for m in self.media_getter.iter())
+
+		for lib in cache.sections:
+			if not self.media_getter.is_targeted(lib): continue
+			print(lib['title'])
+			for media_type, type_id in type_ids.items():
+				if not type_id in library_type_ids[lib['type']]: continue
+				fields = self._fields(media_type)
+				if not fields: continue
+
+				lib_output = Listing(
+					self.ssn,
+					f'{base_url}/library/sections/{lib["key"]}/all',
+					{'type': type_id}
+				)
+				rating_keys = [
+					m['ratingKey']
+					for m in lib_output
+					if targeted_keys is None or m['ratingKey'] in targeted_keys
+				]
+				self._unlock(lib['key'], type_id, rating_keys, fields)
+				result += rating_keys
+
+		return result
+
 	def run(self) -> Union[List[int], str]:
-		pass
+		result: List[int] = []
+
+		if 'collection' in self.process:
+			result += self._collection()
 
+		if any(p in self.process for p in ('metadata', 'poster', 'episode_poster', 'art', 'episode_art')):
+			result += self._media()
 
+		return result
 
 def plex_exporter_importer(
 	ssn: Session, type: str, process: List[str],
@@ -674,7 +2030,7 @@ def plex_exporter_importer(
 	movie_names: List[str],
 	series_name: str, season_number: int, episode_number: int,
 	artist_name: str, album_name: str, track_name: str, 
-	verbose: bool=False, location: str=None
+	verbose: bool=False, location: str=None, workers: int=1, full_export: bool=False, resume: bool=False
 ) -> Union[List[int], str]:
 	result: List[int] = []
 	cursor, plex_cursor = None, None
@@ -689,6 +2045,8 @@ def plex_exporter_importer(
 		return 'Importing chapter thumbnails on a non-linux system is not supported'
 	if any(not p in process_summary.keys() for p in process):
 		return 'One of the processes selected is invalid'
+	if workers < 1:
+		return 'The amount of workers has to be at least 1'
 
 	if all_media:
 		if (
@@ -744,15 +2102,27 @@ def plex_exporter_importer(
 	elif type == 'reset':
 		database_file = None
 		
-	if ('intro_marker' in process and type == 'import') or ('chapter_thumbnail' in process and type in ('import', 'export')):
-		# Importing intro markers or importing/exporting chapter thumbnails requires access to the plex database
-		if not database_folder:
+	requires_plex_database = ('intro_marker' in process and type == 'import') or ('chapter_thumbnail' in process and type in ('import', 'export'))
+	plex_database_file = None
+	if requires_plex_database or type == 'export':
+		# Find the plex database, which is only accessible when the script is run on the server itself
+		plex_database_folder = database_folder
+		if not plex_database_folder:
 			for s in ssn.get(f'{base_url}/:/prefs').json()['MediaContainer']['Setting']:
 				if s['id'] == 'ButlerDatabaseBackupPath':
-					database_folder = s['value']
+					plex_database_folder = s['value']
 					break
-		plex_database_file = path.join(database_folder, 'com.plexapp.plugins.library.db')
-		if not path.isfile(plex_database_file):
+		if plex_database_folder and path.isfile(path.join(plex_database_folder, 'com.plexapp.plugins.library.db')):
+			plex_database_file = path.join(plex_database_folder, 'com.plexapp.plugins.library.db')
+
+	if type == 'export' and plex_database_file is not None:
+		# Exporting reads from the plex database directly when possible, instead of requesting everything.
+		# It's only read from as plex keeps on writing to it.
+		plex_cursor = connect(f'file:{pathname2url(plex_database_file)}?mode=ro', uri=True, timeout=10.0).cursor()
+
+	elif requires_plex_database:
+		# Importing intro markers or importing/exporting chapter thumbnails requires access to the plex database
+		if plex_database_file is None:
 			return 'Intro marker or chapter thumbnail importing or chapter thumbnail exporting requires script to be run on the target server or the value of the variable "database_folder" is invalid'
 
 		# Importing intro markers or chapter thumbnails requires the script to be run as root
@@ -767,7 +2137,8 @@ def plex_exporter_importer(
 				return 'Intro marker or chapter thumbnail importing requires the script to be run as root (a.k.a. administrator)'
 		
 		plex_cursor = connect(plex_database_file, timeout=10.0).cursor()
-	cursor = connect(database_file, timeout=10.0).cursor()
+	if database_file is not None:
+		cursor = connect(database_file, timeout=10.0).cursor()
 
 
 
@@ -822,28 +2193,36 @@ def plex_exporter_importer(
 		movie_names,
 		series_name, season_number, episode_number,
 		artist_name, album_name, track_name, 
-		ssn, verbose
+		ssn, verbose, workers
 	)
 	if type == 'export':
-		runner = Export(ssn, cursor, plex_cursor, process, user_data, media_getter, verbose)
+		runner = Export(ssn, cursor, plex_cursor, process, user_data, media_getter, verbose, full_export, resume)
 	elif type == 'import':
-		runner = Import(ssn, cursor, plex_cursor, process, user_data, media_getter, verbose)
+		runner = Import(ssn, cursor, plex_cursor, process, user_data, media_getter, verbose, resume)
 	else:
-		runner = Reset(ssn, verbose)
+		runner = Reset(ssn, process, media_getter, verbose)
 	
 	# Start
 	try:
 		result = runner.run()
-		cursor.connection.commit()
+		if cursor is not None:
+			cursor.connection.commit()
 		if plex_cursor is not None:
 			plex_cursor.connection.commit()
+		cache.close()
 		return result
 	except Exception as e:
 		print('Shutting down...')
-		cursor.connection.commit()
+		if isinstance(runner, Export):
+			runner.images.close(cancel=True)
+		if isinstance(runner, (Export, Import)):
+			runner.writer.close()
+		if cursor is not None:
+			cursor.connection.commit()
 		if plex_cursor is not None:
 			plex_cursor.connection.commit()
-		print('Progress saved')
+		cache.close()
+		print('Progress saved; use -R/--Resume to continue where it stopped')
 		print('AN ERROR OCCURED. ALL YOUR PROGRESS IS SAVED. PLEASE SHARE THE FOLLOWING WITH THE DEVELOPER:')
 		raise e
 
@@ -852,6 +2231,10 @@ if __name__ == "__main__":
 
 	# Setup vars
 	ssn = Session()
+	# Enough connections for all crawl and image workers and retry when plex fails to respond
+	adapter = HTTPAdapter(pool_maxsize=crawl_workers + image_workers, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
 	ssn.headers.update({'Accept':'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 
@@ -882,6 +2265,9 @@ EPILOG
 	parser.add_argument('-t','--Type', choices=types, required=True, type=str, help='Either export/import plex metadata or reset import (unlock all fields)')
 	parser.add_argument('-p','--Process', choices=process_summary.keys(), help='EXPORT/IMPORT ONLY: Select what to export/import; this argument can be given multiple times to select multiple things', action='append', required=True)
 	parser.add_argument('-L','--Location', type=str, help='SEE EPILOG', default=path.dirname(path.abspath(__file__)))
+	parser.add_argument('-R','--Resume', action='store_true', help='EXPORT/IMPORT ONLY: Continue where the previous run stopped instead of starting over')
+	parser.add_argument('-F','--Full', action='store_true', help='EXPORT ONLY: Export all targeted media instead of only the media that has been updated since the last export')
+	parser.add_argument('-w','--Workers', type=int, help='The amount of shows/artists that are fetched at the same time when crawling the library', default=crawl_workers)
 	parser.add_argument('-v','--Verbose', help='Make script more verbose\n\nTarget Selectors', action='store_true')
 
 	# Args regarding target selection
@@ -912,7 +2298,7 @@ EPILOG
 		movie_names=args.MovieName,
 		series_name=args.SeriesName, season_number=args.SeasonNumber, episode_number=args.EpisodeNumber,
 		artist_name=args.ArtistName, album_name=args.AlbumName, track_name=args.TrackName,
-		verbose=args.Verbose, location=args.Location
+		verbose=args.Verbose, location=args.Location, workers=args.Workers, full_export=args.Full, resume=args.Resume
 	)
 	print(f'Time: {perf_counter() - start_time:.3f}s')
 	if not isinstance(response, list):
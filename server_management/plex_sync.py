@@ -3,7 +3,8 @@
 
 """
 The use case of this script is the following:
-	Keep data between two plex servers synced. Multiple things can be synced at the same time with multiuser support.
+	Keep data between plex servers synced. Multiple things can be synced at the same time with multiuser support.
+	The data of the source server is synced to all other servers (or the selected target servers) at the same time.
 	The following is supported:
 		collections, posters, watch history, playlists and intro markers
 Requirements (python3 -m pip install [requirement]):
@@ -40,11 +41,20 @@ backup_plex_api_token = ''
 #Hardcode the folder where the plex database is in
 #Leave empty unless really needed
 database_folder = ''
+#The file in which the matches between media on the source and target server are kept, so that later runs only have to match new media
+#Leave empty to keep it next to the script
+map_database_file = ''
+#The maximum amount of requests that are sent to a target server at the same time
+max_concurrent_requests = 10
+#More servers to keep synced, on top of the main and backup server
+#Format: [{'name': 'Replica', 'ip': '', 'port': '', 'api_token': ''}]
+extra_plex_servers = []
 
 from os import getenv, geteuid
-from os.path import join, isfile
-from aiohttp import ClientSession
-from asyncio import gather, run
+from os.path import abspath, dirname, join, isfile
+from aiohttp import ClientSession, TCPConnector
+from asyncio import new_event_loop, run_coroutine_threadsafe
+from threading import Thread
 from time import perf_counter
 
 # Environmental Variables
@@ -59,106 +69,283 @@ backup_plex_api_token = getenv('backup_plex_api_token', backup_plex_api_token)
 backup_base_url = f"http://{backup_plex_ip}:{backup_plex_port}"
 backup_plex_name = getenv('backup_plex_name', backup_plex_name)
 database_folder = getenv('database_folder', database_folder)
+map_database_file = getenv('map_database_file', map_database_file)
+if not map_database_file: map_database_file = join(dirname(abspath(__file__)), 'plex_sync.db')
+max_concurrent_requests = int(getenv('max_concurrent_requests', max_concurrent_requests))
+
+#server name -> (base url, api token)
+plex_servers = {
+	main_plex_name: (main_base_url, main_plex_api_token),
+	backup_plex_name: (backup_base_url, backup_plex_api_token),
+	**{s['name']: (f"http://{s['ip']}:{s['port']}", s['api_token']) for s in extra_plex_servers}
+}
+
+class sync_server:
+	def __init__(self, name: str, ssn):
+		self.name = name
+		self.ssn = ssn
+		self.base_url, self.api_token = plex_servers[name]
+		self.cache = {}
+		self.machine_id = self.get_data('/')['MediaContainer']['machineIdentifier']
+		#only used when the server is a target
+		self.map, self.index, self.session = {}, {}, None
+
+	def get_data(self, link: str, params: dict={}):
+		if not f'{link}{params}' in self.cache:
+			self.cache[f'{link}{params}'] = self.ssn.get(f'{self.base_url}{link}', params=params).json()
+		return self.cache[f'{link}{params}']
+
+	def get_listing(self, link: str, params: dict={}, page_size: int=500):
+		#yield the entries of a listing page by page instead of holding the complete listing
+		start = 0
+		while True:
+			container = self.ssn.get(f'{self.base_url}{link}', params={**params, 'X-Plex-Container-Start': start, 'X-Plex-Container-Size': page_size}).json()['MediaContainer']
+			page = container.get('Metadata', [])
+			yield from page
+			start += len(page)
+			if not page or start >= int(container.get('totalSize', start)): break
 
 class plex_sync:
-	def __init__(self, main_ssn, backup_ssn, source: str, sync: list, users: list=['@me'], sync_episode_posters: bool=True):
+	def __init__(self, ssns: dict, source: str, sync: list, targets: list=[], users: list=['@me'], sync_episode_posters: bool=True, full_watch_history: bool=False):
 		#check for illegal argument parsing
 		if any(s not in ('collections','posters','watch_history','playlists','intro_markers') for s in sync):
-			return 'Invalid value in "sync" list'
-		if not source in (main_plex_name, backup_plex_name):
-			return 'Invalid value for "source"'
+			raise ValueError('Invalid value in "sync" list')
+		if not source in plex_servers:
+			raise ValueError('Invalid value for "source"')
+		if any(t not in plex_servers or t == source for t in targets):
+			raise ValueError('Invalid value in "targets" list')
 		if 'intro_markers' in sync and geteuid() != 0:
-			return 'Script needs to be run as root when you want to sync intro_markers'
+			raise ValueError('Script needs to be run as root when you want to sync intro_markers')
 
 		#setup vars
-		self.result_json, self.user_tokens, self.map = [], [], {}
-		self.cache = {
-			'source': {},
-			'target': {}
+		self.result_json, self.user_tokens = [], []
+		#library type -> media type -> content type to search for (None -> content types to search for when media type is unknown)
+		self.content_types = {
+			'movie': {'movie': '1', None: ('1',)},
+			'show': {'show': '2', 'season': '3', 'episode': '4', None: ('2',)},
+			'artist': {'artist': '8', 'album': '9', 'track': '10', None: ('8','9','10')}
 		}
 		self.sync = sync
 		self.users = users
 		self.sync_episode_posters = sync_episode_posters
-		if source == main_plex_name:
-			self.source_ssn = main_ssn
-			self.target_ssn = backup_ssn
-			self.source_base_url = main_base_url
-			self.target_base_url = backup_base_url
-			self.source_api_token = main_plex_api_token
-			self.target_api_token = backup_plex_api_token
-		elif source == backup_plex_name:
-			self.source_ssn = backup_ssn
-			self.target_ssn = main_ssn
-			self.source_base_url = backup_base_url
-			self.target_base_url = main_base_url
-			self.source_api_token = backup_plex_api_token
-			self.target_api_token = main_plex_api_token
-		self.source_machine_id = self.__get_data('source','/')['MediaContainer']['machineIdentifier']
-		self.target_machine_id = self.__get_data('target','/')['MediaContainer']['machineIdentifier']
+		self.full_watch_history = full_watch_history
+		#the source server is crawled once and every target server gets the data at the same time
+		self.source = sync_server(source, ssns[source])
+		self.targets = [sync_server(name, ssns[name]) for name in (targets or plex_servers) if name != source]
+		if 'intro_markers' in sync and len(self.targets) > 1:
+			raise ValueError('Intro markers can only be synced to one target server at a time, as the script needs to be run on it')
+		self.__load_map()
 
 		return
 
 	#utility functions
-	def __get_data(self, source: str, link: str, params: dict={}, refresh: bool=False, json: bool=True):
-		if f'{link}{params}' in self.cache[source] and refresh == False:
-			return self.cache[source][f'{link}{params}']
-		else:
-			if source == 'source':
-				result = self.source_ssn.get(f'{self.source_base_url}{link}', params=params)
-				if json == True:
-					result = result.json()
-			elif source == 'target':
-				result = self.target_ssn.get(f'{self.target_base_url}{link}', params=params)
-				if json == True:
-					result = result.json()
-			self.cache[source][f'{link}{params}'] = result
-			return result
-
-	def __find_on_target(self, guid: list=[], title: str='', type: str=None):
-		sections = self.__get_data('target','/library/sections')['MediaContainer'].get('Directory', None)
+	def __find_on_target(self, target: sync_server, guid: list=[], title: str='', type: str=None):
+		sections = target.get_data('/library/sections')['MediaContainer'].get('Directory', None)
 		if sections == None: return None
 
+		#get the indexes of the target libraries that can contain the media type
+		indexes = []
 		for lib in sections:
-			#skip invalid lib
-			if not lib['type'] in ('show','movie','artist'): continue
-			#skip libs that don't contain the media type
-			if type != None:
-				if lib['type'] == 'show' and not type in ('episode','season','show'): continue
-				if lib['type'] == 'artist' and not type in ('track','album','artist'): continue
-				if lib['type'] == 'movie' and type != 'movie': continue
-
-			if lib['type'] == 'show':
-				if type == 'episode': content_type = '4'
-				elif type == 'season': content_type = '3'
-				else: content_type = ''
-			elif lib['type'] == 'artist':
-				if type == 'track': content_type = '10'
-				elif type == 'album': content_type = '9'
-				elif type == 'artist': content_type = '8'
-			elif lib['type'] == 'movie': content_type = '1'
-
-			if any((lib['type'] == 'show' and type == 'show', lib['type'] == 'movie' and type == 'movie')):
-				lib_output = self.__get_data('target',f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1'})['MediaContainer'].get('Metadata', [])
-			else:
-				lib_output = self.__get_data('target',f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': content_type})['MediaContainer'].get('Metadata', [])
-			for entry in lib_output:
-				if (guid and 'Guid' in entry and entry['Guid'] == guid) or (title and 'title' in entry and entry['title'] == title):
-					#media found on target server
-					return entry
+			if not lib['type'] in self.content_types: continue
+			if type == None: content_types = self.content_types[lib['type']][None]
+			elif type in self.content_types[lib['type']]: content_types = (self.content_types[lib['type']][type],)
+			else: continue
+			for content_type in content_types:
+				if not (lib['key'], content_type) in target.index:
+					#index the library once: every guid and title -> target ratingkey
+					guids, titles = {}, {}
+					for entry in target.get_listing(f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': content_type}):
+						for entry_guid in entry.get('Guid', []):
+							guids.setdefault(entry_guid['id'], entry['ratingKey'])
+						if 'title' in entry:
+							titles.setdefault(entry['title'], entry['ratingKey'])
+					target.index[(lib['key'], content_type)] = (guids, titles)
+				indexes.append((lib['key'], content_type, *target.index[(lib['key'], content_type)]))
+
+		#media found on target server based on guid, otherwise on title
+		for section_key, content_type, guids, titles in indexes:
+			for source_guid in guid:
+				if source_guid['id'] in guids:
+					return guids[source_guid['id']], section_key, content_type
+		if title:
+			for section_key, content_type, guids, titles in indexes:
+				if title in titles:
+					return titles[title], section_key, content_type
 		#media not found on target server
 		return None
 
+	def __map_to_target(self, target: sync_server, entry: dict, type: str=None):
+		#get the ratingkey of the media on the target server, using the stored matches when possible
+		key = (type or '', str(entry['Guid'] if 'Guid' in entry else entry.get('title','')))
+		if not key in target.map:
+			match = self.__find_on_target(target, guid=entry.get('Guid', []), title=entry.get('title', ''), type=type)
+			target.map[key] = match[0] if match else None
+			#also store media that isn't found so that it isn't searched for again until new media is added to the target server
+			self.map_cursor.execute("INSERT OR REPLACE INTO id_map VALUES (?,?,?,?,?,?,?);", (self.source.machine_id, target.machine_id, *key, *(match or (None, None, None))))
+		return target.map[key]
+
+	def __changed(self, target: sync_server, target_ratingkey: str, source: dict, keys: tuple):
+		#check if the values of the source item changed since they were last synced to the target item;
+		#returns the new state, which should only be saved once the changes were applied on the target server
+		state = str([source.get(key) for key in keys])
+		self.map_cursor.execute("SELECT state FROM synced_items WHERE source_machine_id = ? AND target_machine_id = ? AND rating_key = ?;", (self.source.machine_id, target.machine_id, target_ratingkey))
+		if self.map_cursor.fetchone() == (state,): return None
+		return state
+
+	def __save_synced(self, target: sync_server, target_ratingkey: str, state: str):
+		self.map_cursor.execute("INSERT OR REPLACE INTO synced_items VALUES (?,?,?,?);", (self.source.machine_id, target.machine_id, target_ratingkey, state))
+		return
+
+	def __load_map(self):
+		from sqlite3 import connect
+
+		self.map_db = connect(map_database_file)
+		self.map_cursor = self.map_db.cursor()
+		self.map_cursor.execute("CREATE TABLE IF NOT EXISTS id_map (source_machine_id TEXT, target_machine_id TEXT, type TEXT, key TEXT, rating_key TEXT, section_key TEXT, content_type TEXT, PRIMARY KEY (source_machine_id, target_machine_id, type, key));")
+		self.map_cursor.execute("CREATE TABLE IF NOT EXISTS target_sections (target_machine_id TEXT, section_key TEXT, content_type TEXT, item_count INTEGER, updated_at INTEGER, PRIMARY KEY (target_machine_id, section_key, content_type));")
+		self.map_cursor.execute("CREATE TABLE IF NOT EXISTS synced_items (source_machine_id TEXT, target_machine_id TEXT, rating_key TEXT, state TEXT, PRIMARY KEY (source_machine_id, target_machine_id, rating_key));")
+		self.map_cursor.execute("CREATE TABLE IF NOT EXISTS watch_history (source_machine_id TEXT, target_machine_id TEXT, user TEXT, viewed_at INTEGER, PRIMARY KEY (source_machine_id, target_machine_id, user));")
+
+		for target in self.targets:
+			#remove the matches that aren't valid anymore because of changes on the target server since the last run
+			sections = [lib for lib in target.get_data('/library/sections')['MediaContainer'].get('Directory', []) if lib['type'] in self.content_types]
+			added = False
+			for lib in sections:
+				for content_type in set(c for t, c in self.content_types[lib['type']].items() if t != None):
+					#get the amount of media and when the last change happened
+					container = target.ssn.get(f'{target.base_url}/library/sections/{lib["key"]}/all', params={'type': content_type, 'sort': 'updatedAt:desc', 'X-Plex-Container-Start': 0, 'X-Plex-Container-Size': 1}).json()['MediaContainer']
+					state = (int(container.get('totalSize', container.get('size', 0))), next(iter(container.get('Metadata', [])), {}).get('updatedAt', 0))
+					self.map_cursor.execute("SELECT item_count, updated_at FROM target_sections WHERE target_machine_id = ? AND section_key = ? AND content_type = ?;", (target.machine_id, lib['key'], content_type))
+					old_state = self.map_cursor.fetchone()
+					if old_state == None:
+						#new library
+						added = True
+						self.map_cursor.execute("DELETE FROM id_map WHERE target_machine_id = ? AND section_key = ? AND content_type = ?;", (target.machine_id, lib['key'], content_type))
+					elif old_state != state:
+						updated = list(target.get_listing(f'/library/sections/{lib["key"]}/all', params={'type': content_type, 'updatedAt>>': old_state[1] - 1}))
+						new_media = sum(1 for entry in updated if entry.get('addedAt', 0) > old_state[1])
+						added = added or new_media > 0
+						if state[0] != old_state[0] + new_media:
+							#media was removed from the library
+							self.map_cursor.execute("DELETE FROM id_map WHERE target_machine_id = ? AND section_key = ? AND content_type = ?;", (target.machine_id, lib['key'], content_type))
+						else:
+							#changed media could've gotten different guids
+							self.map_cursor.executemany("DELETE FROM id_map WHERE target_machine_id = ? AND rating_key = ?;", [(target.machine_id, entry['ratingKey']) for entry in updated])
+					self.map_cursor.execute("INSERT OR REPLACE INTO target_sections VALUES (?,?,?,?,?);", (target.machine_id, lib['key'], content_type, *state))
+
+			#remove the matches with libraries that were removed
+			section_keys = [lib['key'] for lib in sections]
+			for table in ('id_map', 'target_sections'):
+				self.map_cursor.execute(f"DELETE FROM {table} WHERE target_machine_id = ? AND section_key NOT IN ({','.join('?' * len(section_keys))});", (target.machine_id, *section_keys))
+			if added:
+				#media that wasn't found before could be found now
+				self.map_cursor.execute("DELETE FROM id_map WHERE target_machine_id = ? AND rating_key IS NULL;", (target.machine_id,))
+			self.map_db.commit()
+
+			self.map_cursor.execute("SELECT type, key, rating_key FROM id_map WHERE source_machine_id = ? AND target_machine_id = ?;", (self.source.machine_id, target.machine_id))
+			target.map = {(type, key): rating_key for type, key, rating_key in self.map_cursor}
+		return
+
+	def __start_requests(self):
+		#one event loop in the background with one session per target server sends the requests while the source server is crawled
+		self.requests, self.synced_requests, self.loop = [], [], new_event_loop()
+		Thread(target=self.loop.run_forever, daemon=True).start()
+		run_coroutine_threadsafe(self.__open_sessions(), self.loop).result()
+		return
+
+	async def __open_sessions(self):
+		for target in self.targets:
+			target.session = ClientSession(connector=TCPConnector(limit=max_concurrent_requests))
+		return
+
+	async def __close_sessions(self):
+		for target in self.targets:
+			await target.session.close()
+		return
+
+	async def __send(self, target: sync_server, method: str, link: str, params: dict):
+		async with target.session.request(method, f'{target.base_url}{link}', params={k: str(v) for k, v in params.items()}) as response:
+			if not 200 <= response.status < 300:
+				print(f'	Failed to apply change on {target.name}: {method} {link} returned {response.status}')
+			return response.status
+
+	def __request(self, target: sync_server, method: str, link: str, params: dict={}):
+		#queue a request to the target server; wait for the oldest ones when too many are queued
+		if len(self.requests) >= max_concurrent_requests * 10 * len(self.targets):
+			self.requests.pop(0).result()
+		request = run_coroutine_threadsafe(self.__send(target, method, link, params), self.loop)
+		self.requests.append(request)
+		return request
+
+	def __succeeded(self, requests: list):
+		#wait for the requests and check if they were all applied
+		return all(200 <= request.result() < 300 for request in requests)
+
+	def __wait_requests(self):
+		#wait for all queued requests to be sent
+		for request in self.requests:
+			request.result()
+		self.requests = []
+		#only mark the items as synced of which all changes were applied; the others are tried again next run
+		for target, target_ratingkey, state, requests in self.synced_requests:
+			if self.__succeeded(requests):
+				self.__save_synced(target, target_ratingkey, state)
+		self.synced_requests = []
+		return
+
+	def __stop_requests(self):
+		self.__wait_requests()
+		run_coroutine_threadsafe(self.__close_sessions(), self.loop).result()
+		self.loop.call_soon_threadsafe(self.loop.stop)
+		return
+
+	def __get_user_tokens(self):
+		#get list of tokens (users) to apply action to: [username, source token, {target name: target token}]
+		if self.user_tokens: return self.user_tokens
+		from re import findall as re_findall
+
+		#add user self if requested
+		if '@me' in self.users or '@all' in self.users:
+			self.user_tokens.append(['@me', self.source.api_token, {target.name: target.api_token for target in self.targets}])
+
+		#get data about every user (username at beginning and token at end)
+		source_shared_users = self.source.ssn.get(f'http://plex.tv/api/servers/{self.source.machine_id}/shared_servers', headers={}).text
+		target_shared_users = {target.name: target.ssn.get(f'http://plex.tv/api/servers/{target.machine_id}/shared_servers', headers={}).text for target in self.targets}
+		source_user_data = re_findall(r'(?<=username=").*?accessToken="\w+?(?=")', source_shared_users)
+		for source_user in source_user_data:
+			username = source_user.split('"')[0]
+			if not '@all' in self.users and not username in self.users:
+				continue
+			source_token = source_user.split('"')[-1]
+			target_tokens = {}
+			for target_name, shared_users in target_shared_users.items():
+				target_token = re_findall(rf'username="{username}.*?accessToken="\w+?(?=")', shared_users)
+				if target_token:
+					target_tokens[target_name] = target_token[0].split('"')[-1]
+			if target_tokens:
+				self.user_tokens.append([username, source_token, target_tokens])
+		return self.user_tokens
+
 	#THE function to run
 	def start_sync(self):
+		self.__start_requests()
+		try:
+			return self.__start_sync()
+		finally:
+			self.__stop_requests()
+
+	def __start_sync(self):
 		#sync non-user-specific data
 		if 'collections' in self.sync:
 			start_time = perf_counter()
 			self._collections()
+			self.__wait_requests()
 			print(f'Collections time: {round(perf_counter() - start_time,3)}s')
 
 		if 'posters' in self.sync:
 			start_time = perf_counter()
 			self._posters()
+			self.__wait_requests()
 			print(f'Posters time: {round(perf_counter() - start_time,3)}s')
 
 		if 'intro_markers' in self.sync:
@@ -171,35 +358,57 @@ class plex_sync:
 		if 'watch_history' in self.sync:
 			start_time = perf_counter()
 			self._watch_history()
+			self.__wait_requests()
 			print(f'Watch History time: {round(perf_counter() - start_time,3)}s')
 
 		if 'playlists' in self.sync:
 			start_time = perf_counter()
 			self._playlists()
+			self.__wait_requests()
 			print(f'Playlists time: {round(perf_counter() - start_time,3)}s')
 
+		#save the new matches for the next run
+		self.map_db.commit()
 		return list(set(self.result_json))
 
 	#non-user-specific actions
-	async def __process_collections(self, source_collection, target_lib, content_type):
-		session = ClientSession()
-		tasks = []
+	def __process_collections(self, target: sync_server, source_collection, target_lib, content_type, target_collection):
 		print(f'	{source_collection["title"]}')
 
-		#add collection on target server
-		source_collection_content = self.__get_data('source',f'/library/collections/{source_collection["ratingKey"]}/children', params={'includeGuids': '1'})['MediaContainer'].get('Metadata', [])
+		#get the content of the collection on the target server
+		source_collection_content = self.source.get_data(f'/library/collections/{source_collection["ratingKey"]}/children', params={'includeGuids': '1'})['MediaContainer'].get('Metadata', [])
 		target_collection_content = []
 		for entry in source_collection_content:
-			target_ratingkey = self.__find_on_target(guid=entry['Guid'] if 'Guid' in entry else [], title=entry['title'] if 'title' in entry else '')
+			target_ratingkey = self.__map_to_target(target, entry)
 			if target_ratingkey != None:
 				#media found on target server
-				target_collection_content.append(target_ratingkey['ratingKey'])
-		if not target_collection_content: return
+				target_collection_content.append(target_ratingkey)
+		if not target_collection_content:
+			if target_collection != None:
+				target.ssn.delete(f'{target.base_url}/library/collections/{target_collection["ratingKey"]}')
+			return
+
+		if target_collection == None:
+			#add collection on target server
+			new_ratingkey = target.ssn.post(f'{target.base_url}/library/collections', params={'title': source_collection['title'], 'smart': '0', 'sectionId': target_lib['key'], 'type': content_type, 'uri': f'server://{target.machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(target_collection_content)}'}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+		else:
+			#only add and remove the media that differs
+			new_ratingkey = target_collection['ratingKey']
+			current_content = set(entry['ratingKey'] for entry in target.get_listing(f'/library/collections/{new_ratingkey}/children'))
+			added_content = [r for r in target_collection_content if not r in current_content]
+			if added_content:
+				target.ssn.put(f'{target.base_url}/library/collections/{new_ratingkey}/items', params={'uri': f'server://{target.machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(added_content)}'})
+			for removed_ratingkey in current_content.difference(target_collection_content):
+				target.ssn.delete(f'{target.base_url}/library/collections/{new_ratingkey}/items/{removed_ratingkey}')
+		self.result_json += target_collection_content
 
-		new_ratingkey = self.target_ssn.post(f'{self.target_base_url}/library/collections', params={'title': source_collection['title'], 'smart': '0', 'sectionId': target_lib['key'], 'type': content_type, 'uri': f'server://{self.target_machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(target_collection_content)}'}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+		#sync poster and settings if they changed since the last run
+		state = self.__changed(target, new_ratingkey, source_collection, ('thumb','titleSort','contentRating','summary'))
+		if state == None: return
+		requests = []
 		#sync poster
 		if 'thumb' in source_collection:
-			tasks.append(session.post(f'{self.target_base_url}/library/collections/{new_ratingkey}/posters', params={'url': f'{self.source_base_url}{source_collection["thumb"]}?X-Plex-Token={self.source_api_token}','X-Plex-Token': self.target_api_token}))
+			requests.append(self.__request(target, 'POST', f'/library/collections/{new_ratingkey}/posters', params={'url': f'{self.source.base_url}{source_collection["thumb"]}?X-Plex-Token={self.source.api_token}','X-Plex-Token': target.api_token}))
 		#sync settings
 		payload = {
 			'type': '18',
@@ -207,22 +416,18 @@ class plex_sync:
 			'titleSort.value': source_collection.get('titleSort', source_collection.get('title','')),
 			'contentRating.value': source_collection.get('contentRating',''),
 			'summary.value': source_collection.get('summary',''),
-			'X-Plex-Token': self.target_api_token
+			'X-Plex-Token': target.api_token
 		}
-		tasks.append(session.put(f'{self.target_base_url}/library/sections/{target_lib["key"]}/all', params=payload))
-		self.result_json += target_collection_content
-		#launch all the upload requests at the same time
-		await gather(*tasks)
-		await session.close()
+		requests.append(self.__request(target, 'PUT', f'/library/sections/{target_lib["key"]}/all', params=payload))
+		self.synced_requests.append((target, new_ratingkey, state, requests))
+		return
 
 	def _collections(self):
 		print('Collections')
 
-		#get sections on both servers
-		source_sections = self.__get_data('source','/library/sections')['MediaContainer'].get('Directory', None)
+		#get sections on the source server
+		source_sections = self.source.get_data('/library/sections')['MediaContainer'].get('Directory', None)
 		if source_sections == None: return 'No libraries on the source server'
-		target_sections = self.__get_data('target','/library/sections')['MediaContainer'].get('Directory', None)
-		if target_sections == None: return 'No libraries on the target server'
 
 		#loop through the source libraries
 		for source_lib in source_sections:
@@ -231,353 +436,365 @@ class plex_sync:
 			elif source_lib['type'] == 'movie': content_type = 1
 			elif source_lib['type'] == 'artist': content_type = 10
 
-			#find the matching library on the target server
-			for target_lib_entry in target_sections:
-				if target_lib_entry['type'] == source_lib['type'] and target_lib_entry['title'] == source_lib['title']:
-					target_lib = target_lib_entry
-					break
-			else:
-				continue
+			#get the collections in the library on the source server
+			source_collections = self.source.get_data(f'/library/sections/{source_lib["key"]}/collections')['MediaContainer'].get('Metadata', [])
+
+			for target in self.targets:
+				#find the matching library on the target server
+				for target_lib_entry in target.get_data('/library/sections')['MediaContainer'].get('Directory', []):
+					if target_lib_entry['type'] == source_lib['type'] and target_lib_entry['title'] == source_lib['title']:
+						target_lib = target_lib_entry
+						break
+				else:
+					continue
 
-			#get the collections in the library on both servers
-			source_collections = self.__get_data('source',f'/library/sections/{source_lib["key"]}/collections')['MediaContainer'].get('Metadata', [])
-			target_collections = self.__get_data('target',f'/library/sections/{target_lib["key"]}/collections')['MediaContainer'].get('Metadata', [])
+				#match the collections on title
+				target_collections = target.get_data(f'/library/sections/{target_lib["key"]}/collections')['MediaContainer'].get('Metadata', [])
+				target_collections = {target_collection['title']: target_collection for target_collection in target_collections}
 
-			#delete all collections to keep deleted collections synced
-			for target_collection in target_collections:
-				self.target_ssn.delete(f'{self.target_base_url}/library/collections/{target_collection["ratingKey"]}')
+				#sync each source collection with the target server
+				for source_collection in source_collections:
+					self.__process_collections(target, source_collection, target_lib, content_type, target_collections.pop(source_collection['title'], None))
 
-			#sync each source collection with the target server
-			for source_collection in source_collections:
-				run(self.__process_collections(source_collection, target_lib, content_type))
+				#delete the collections that aren't on the source server anymore
+				for target_collection in target_collections.values():
+					target.ssn.delete(f'{target.base_url}/library/collections/{target_collection["ratingKey"]}')
 
 		return self.result_json
 
-	async def __process_posters(self, lib):
+	def __sync_poster(self, entry: dict, type: str):
+		#add the requests that will upload the poster of the source media to the media on every target server to a queue
+		if not 'thumb' in entry: return False
+		uploaded = False
+		for target in self.targets:
+			target_ratingkey = self.__map_to_target(target, entry, type)
+			if target_ratingkey == None: continue
+			self.__request(target, 'POST', f'/library/metadata/{target_ratingkey}/posters', params={'url': f'{self.source.base_url}{entry["thumb"]}?X-Plex-Token={self.source.api_token}','X-Plex-Token': target.api_token})
+			uploaded = True
+		return uploaded
+
+	def __process_posters(self, lib):
 		if not lib['type'] in ('show','movie','artist'): return
 		if lib['type'] == 'show': content_type = '4'
 		elif lib['type'] == 'movie': content_type = '1'
 		elif lib['type'] == 'artist': content_type = '10'
 
-		session = ClientSession()
-		tasks = []
 		print(f'	{lib["title"]}')
 		#sync series/season posters
 		if lib['type'] == 'show':
-			lib_output = self.__get_data('source',f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1'})['MediaContainer'].get('Metadata', [])
-			for show in lib_output:
-				if not 'thumb' in show: continue
-				key = show['Guid'] if 'Guid' in show else show['title']
-				if not str(key) in self.map:
-					target_ratingkey = self.__find_on_target(guid=show['Guid'] if 'Guid' in show else [], title=show['title'] if 'title' in show else '', type='show')
-					if target_ratingkey == None: continue
-					self.map[str(key)] = target_ratingkey['ratingKey']
-
-				tasks.append(session.post(f'{self.target_base_url}/library/metadata/{self.map[str(key)]}/posters', params={'url': f'{self.source_base_url}{show["thumb"]}?X-Plex-Token={self.source_api_token}','X-Plex-Token': self.target_api_token}))
-
-			lib_output = self.__get_data('source',f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': '3'})['MediaContainer'].get('Metadata', [])
-			for season in lib_output:
-				if not 'thumb' in season: continue
-				key = season['Guid'] if 'Guid' in season else season['title']
-				if not str(key) in self.map:
-					target_ratingkey = self.__find_on_target(guid=season['Guid'] if 'Guid' in season else [], title=season['title'] if 'title' in season else '', type='season')
-					if target_ratingkey == None: continue
-					self.map[str(key)] = target_ratingkey['ratingKey']
-
-				tasks.append(session.post(f'{self.target_base_url}/library/metadata/{self.map[str(key)]}/posters', params={'url': f'{self.source_base_url}{season["thumb"]}?X-Plex-Token={self.source_api_token}','X-Plex-Token': self.target_api_token}))
+			for show in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1'}):
+				self.__sync_poster(show, 'show')
+
+			for season in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': '3'}):
+				self.__sync_poster(season, 'season')
 
 		#if said so, skip syncing episode posters
 		if lib['type'] != 'show' or (self.sync_episode_posters == True and lib['type'] == 'show'):
-			lib_output = self.__get_data('source',f'/library/sections/{lib["key"]}/all', params={'type': content_type, 'includeGuids': '1'})['MediaContainer'].get('Metadata', [])
-			#make map of media: guids or title -> target ratingkey
-			for entry in lib_output:
-				key = entry['Guid'] if 'Guid' in entry else entry['title']
-				if str(key) in self.map: continue
-
-				target_ratingkey = self.__find_on_target(guid=entry['Guid'] if 'Guid' in entry else [], title=entry['title'] if 'title' in entry else '', type=entry['type'])
-				if target_ratingkey == None: continue
-				self.map[str(key)] = target_ratingkey['ratingKey']
-
 			#go through every media item in the library
-			for entry in lib_output:
-				if not 'thumb' in entry: continue
-				key = entry['Guid'] if 'Guid' in entry else entry['title']
-				if not str(key) in self.map: continue
-				target_ratingkey = self.map[str(key)]
-
-				#add the request that will upload the poster to target media to a queue
-				tasks.append(session.post(f'{self.target_base_url}/library/metadata/{target_ratingkey}/posters', params={'url': f'{self.source_base_url}{entry["thumb"]}?X-Plex-Token={self.source_api_token}','X-Plex-Token': self.target_api_token}))
-				self.result_json.append(entry['ratingKey'])
-		#launch all the upload requests at the same time
-		await gather(*tasks)
-		await session.close()
+			for entry in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'type': content_type, 'includeGuids': '1'}):
+				if self.__sync_poster(entry, entry['type']):
+					self.result_json.append(entry['ratingKey'])
+		return
 
 	def _posters(self):
 		print('Posters')
 
 		#get sections on source server
-		sections = self.__get_data('source','/library/sections')['MediaContainer'].get('Directory', None)
+		sections = self.source.get_data('/library/sections')['MediaContainer'].get('Directory', None)
 		if sections == None: return 'No libraries on the source server'
 
-		#process every library (at the same time) in __process_posters
+		#process every library in __process_posters; the uploads of all libraries are sent at the same time
 		for lib in sections:
-			run(self.__process_posters(lib))
+			self.__process_posters(lib)
 		return self.result_json
 
-	def _intro_markers(self):
+	def _intro_markers(self, batch_size: int=100):
 		print('Intro Markers')
 		from sqlite3 import connect
 		from datetime import datetime
+		target = self.targets[0]
 
 		#get location to database file
 		if database_folder == '':
-			db_folder = [s['value'] for s in self.__get_data('target','/:/prefs')['MediaContainer']['Setting'] if s['id'] == 'ButlerDatabaseBackupPath'][0]
+			db_folder = [s['value'] for s in target.get_data('/:/prefs')['MediaContainer']['Setting'] if s['id'] == 'ButlerDatabaseBackupPath'][0]
+		else:
+			db_folder = database_folder
 		db_file = join(db_folder, 'com.plexapp.plugins.library.db')
 		if not isfile(db_file):
 			return '	Error: Intro Marker syncing is requested but script is not run on target server, or value of database_folder is invalid'
 
-		#setup db connection
-		db = connect(db_file)
-		cursor = db.cursor()
+		#get the intro markers of the episodes on source in batches: target ratingkey -> (start, end)
+		intros = {}
+		def get_intros(episodes):
+			if not episodes: return
+			episodes_output = self.source.ssn.get(f'{self.source.base_url}/library/metadata/{",".join(episodes)}', params={'includeMarkers': '1'}).json()['MediaContainer'].get('Metadata', [])
+			for episode in episodes_output:
+				for marker in episode.get('Marker', []):
+					if marker['type'] == 'intro':
+						#intro marker found
+						intros[episodes[episode['ratingKey']]] = (marker['startTimeOffset'], marker['endTimeOffset'])
+						break
+			episodes.clear()
+			return
 
-		#loop through episodes
-		sections = self.__get_data('source','/library/sections')['MediaContainer'].get('Directory',[])
+		sections = self.source.get_data('/library/sections')['MediaContainer'].get('Directory',[])
 		for lib in sections:
 			if lib['type'] != 'show': continue
 			print(f'	{lib["title"]}')
-			lib_output = self.__get_data('source',f'/library/sections/{lib["key"]}/all', params={'type': '4', 'includeGuids': '1'})['MediaContainer'].get('Metadata',[])
-			for episode in lib_output:
-				#get markers of the episode on source
+			episodes = {}
+			for episode in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'type': '4', 'includeGuids': '1'}):
 				self.result_json.append(episode['ratingKey'])
-				episode_output = self.__get_data('source',f'/library/metadata/{episode["ratingKey"]}', params={'includeMarkers': '1'})['MediaContainer']['Metadata'][0].get('Marker',[])
-				for marker in episode_output:
-					if marker['type'] == 'intro':
-						#intro marker found
-						intro_start = marker['startTimeOffset']
-						intro_end = marker['endTimeOffset']
-						break
-				else:
-					#no intro marker found so skip episode
-					continue
-
 				#get ratingkey on target
-				target_ratingkey = self.__find_on_target(guid=episode.get('Guid',[]), title=episode.get('title',''), type='episode')
+				target_ratingkey = self.__map_to_target(target, episode, 'episode')
 				if target_ratingkey == None: continue
-				else: target_ratingkey = target_ratingkey.get('ratingKey','')
-				#check if media already has intro marker
-				cursor.execute(f"SELECT * FROM taggings WHERE text = 'intro' AND metadata_item_id = '{target_ratingkey}';")
-				if cursor.fetchone() == None:
-					#no intro marker exists so create one
-					d = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-					cursor.execute("SELECT tag_id FROM taggings WHERE text = 'intro' LIMIT 1;")
-					i = cursor.fetchone()
-					if i == None:
-						#no id yet for intro's so make one that isn't taken yet
-						cursor.execute("SELECT tag_id FROM taggings ORDER BY tag_id DESC LIMIT 1;")
-						i = int(cursor.fetchone()[0]) + 1
-					else:
-						i = i[0]
-					cursor.execute(f"INSERT INTO taggings (metadata_item_id,tag_id,[index],text,time_offset,end_time_offset,thumb_url,created_at,extra_data) VALUES ({target_ratingkey},{i},0,'intro',{intro_start},{intro_end},'','{d}','pv%3Aversion=5');")
-				else:
-					#intro marker exists so update timestamps
-					cursor.execute(f"UPDATE taggings SET time_offset = '{intro_start}' WHERE text = 'intro' AND metadata_item_id = '{target_ratingkey}';")
-					cursor.execute(f"UPDATE taggings SET end_time_offset = '{intro_end}' WHERE text = 'intro' AND metadata_item_id = '{target_ratingkey}';")
-				#save changes
-				db.commit()
+				episodes[episode['ratingKey']] = target_ratingkey
+				if len(episodes) == batch_size: get_intros(episodes)
+			get_intros(episodes)
+		if not intros: return self.result_json
+
+		#setup db connection
+		db = connect(db_file)
+		cursor = db.cursor()
+
+		#compare with the intro markers that already exist on target
+		cursor.execute("SELECT metadata_item_id, time_offset, end_time_offset FROM taggings WHERE text = 'intro';")
+		target_intros = {str(r[0]): (r[1], r[2]) for r in cursor}
+		cursor.execute("SELECT tag_id FROM taggings WHERE text = 'intro' LIMIT 1;")
+		tag_id = cursor.fetchone()
+		if tag_id == None:
+			#no id yet for intro's so make one that isn't taken yet
+			cursor.execute("SELECT tag_id FROM taggings ORDER BY tag_id DESC LIMIT 1;")
+			tag_id = int(cursor.fetchone()[0]) + 1
+		else:
+			tag_id = tag_id[0]
+		d = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+		new_intros = [(int(k), tag_id, start, end, d) for k, (start, end) in intros.items() if not k in target_intros]
+		changed_intros = [(start, end, int(k)) for k, (start, end) in intros.items() if k in target_intros and target_intros[k] != (start, end)]
+
+		#apply all changes at once
+		cursor.executemany("INSERT INTO taggings (metadata_item_id,tag_id,[index],text,time_offset,end_time_offset,thumb_url,created_at,extra_data) VALUES (?,?,0,'intro',?,?,'',?,'pv%3Aversion=5');", new_intros)
+		cursor.executemany("UPDATE taggings SET time_offset = ?, end_time_offset = ? WHERE text = 'intro' AND metadata_item_id = ?;", changed_intros)
+		db.commit()
+		db.close()
+		print(f'	Added {len(new_intros)} and updated {len(changed_intros)} intro markers')
 		return self.result_json
 
 	#user-specific actions
 	def _watch_history(self):
 		print('Watch History')
 
-		#get list of tokens (users) to apply action to
-		if not self.user_tokens:
-			from re import findall as re_findall
+		#get the ids of the accounts on the source server to get their watch history
+		accounts = {account['name']: account['id'] for account in self.source.get_data('/accounts')['MediaContainer'].get('Account', [])}
+		accounts['@me'] = 1
 
-			source_shared_users = self.source_ssn.get(f'http://plex.tv/api/servers/{self.source_machine_id}/shared_servers', headers={}).text
-			target_shared_users = self.target_ssn.get(f'http://plex.tv/api/servers/{self.target_machine_id}/shared_servers', headers={}).text
-
-			#add user self if requested
-			if '@me' in self.users or '@all' in self.users:
-				self.user_tokens.append(['@me', self.source_api_token, self.target_api_token])
-
-			#get data about every user (username at beginning and token at end)
-			source_user_data = re_findall(r'(?<=username=").*?accessToken="\w+?(?=")', source_shared_users)
-			for source_user in source_user_data:
-				username = source_user.split('"')[0]
-				if not '@all' in self.users and not username in self.users:
-					continue
-				source_token = source_user.split('"')[-1]
-				target_token = re_findall(rf'username="{username}.*?accessToken="\w+?(?=")', target_shared_users)
-				if target_token:
-					self.user_tokens.append([username, source_token, target_token[0].split('"')[-1]])
-
-		for user_token in self.user_tokens:
+		for user_token in self.__get_user_tokens():
 			print(f'	{user_token[0]}')
+			targets = [target for target in self.targets if target.name in user_token[2]]
 
 			#get sections on source server
-			sections = self.__get_data('source', '/library/sections', params={'X-Plex-Token': user_token[1]})['MediaContainer'].get('Directory', [])
+			sections = self.source.get_data('/library/sections', params={'X-Plex-Token': user_token[1]})['MediaContainer'].get('Directory', [])
+
+			#get the time the user last watched something; the next run continues from there
+			history_params = {'sort': 'viewedAt:desc', 'accountID': accounts.get(user_token[0], '')}
+			newest_history = self.source.ssn.get(f'{self.source.base_url}/status/sessions/history/all', params={**history_params, 'X-Plex-Container-Start': 0, 'X-Plex-Container-Size': 1}).json()['MediaContainer']
+			viewed_at = next(iter(newest_history.get('Metadata', [])), {}).get('viewedAt', 0)
+			last_viewed_at = {}
+			for target in targets:
+				self.map_cursor.execute("SELECT viewed_at FROM watch_history WHERE source_machine_id = ? AND target_machine_id = ? AND user = ?;", (self.source.machine_id, target.machine_id, user_token[0]))
+				last_viewed_at[target.name] = (self.map_cursor.fetchone() or (None,))[0]
+			#the requests per target with the time that the media was watched (None when unknown)
+			sent = []
+
+			if self.full_watch_history == False and not None in last_viewed_at.values() and user_token[0] in accounts:
+				#only sync the media that is in progress and the media that was watched since the last run of each target
+				entries = {}
+				for lib in sections:
+					if not lib['type'] in ('show','movie'): continue
+					print(f'		{lib["title"]}')
+					for entry in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'type': '1' if lib['type'] == 'movie' else '4', 'inProgress': '1', 'includeGuids': '1', 'X-Plex-Token': user_token[1]}):
+						entries[entry['ratingKey']] = (entry, None)
+				for history_entry in self.source.get_listing('/status/sessions/history/all', params={**history_params, 'viewedAt>': min(last_viewed_at.values(), default=0) + 1}):
+					if history_entry['ratingKey'] in entries: continue
+					response = self.source.ssn.get(f'{self.source.base_url}/library/metadata/{history_entry["ratingKey"]}', params={'includeGuids': '1', 'X-Plex-Token': user_token[1]})
+					if response.status_code != 200: continue
+					entries[history_entry['ratingKey']] = (response.json()['MediaContainer']['Metadata'][0], history_entry['viewedAt'])
+				for entry, entry_viewed_at in entries.values():
+					for target, request in self.__sync_watched_status([t for t in targets if entry_viewed_at == None or entry_viewed_at > last_viewed_at[t.name]], entry, user_token):
+						sent.append((target, entry_viewed_at, request))
 
-			#process every library (at the same time) in __process_watch_history
-			for lib in sections:
-				if not lib['type'] in ('show','movie','artist'): continue
-				if lib['type'] == 'show': content_type = '4'
-				elif lib['type'] == 'movie': content_type = '1'
-				elif lib['type'] == 'artist': content_type = '10'
-
-				handled_series = []
-				print(f'		{lib["title"]}')
-				#sync complete series to skip syncing every episode (reducing requests)
-				if lib['type'] == 'show':
-					lib_output = self.__get_data('source',f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1'})['MediaContainer'].get('Metadata', [])
-					for show in lib_output:
-						if not (show['viewedLeafCount'] == 0 or show['viewedLeafCount'] == show['leafCount']): continue
-						key = show['Guid'] if 'Guid' in show else show['title']
-						if not str(key) in self.map:
-							target_ratingkey = self.__find_on_target(guid=show['Guid'] if 'Guid' in show else [], title=show['title'] if 'title' in show else '', type='show')
-							if target_ratingkey == None: continue
-							self.map[str(key)] = target_ratingkey['ratingKey']
-
-						if show['viewedLeafCount'] == 0:
-							#mark complete series as not-viewed
-							self.target_ssn.get(f'{self.target_base_url}/:/scrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': self.map[str(key)], 'X-Plex-Token': user_token[2]})
-						else:
-							#mark complete series as viewed
-							self.target_ssn.get(f'{self.target_base_url}/:/unscrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': self.map[str(key)], 'X-Plex-Token': user_token[2]})
-						handled_series.append(show['ratingKey'])
-
-				lib_output = self.__get_data('source',f'/library/sections/{lib["key"]}/all', params={'type': content_type, 'includeGuids': '1', 'X-Plex-Token': user_token[1]})['MediaContainer'].get('Metadata', [])
-				#make map of media: guids or title -> target ratingkey
-				for entry in lib_output:
-					if lib['type'] == 'show' and entry['grandparentRatingKey'] in handled_series: continue
-					key = entry['Guid'] if 'Guid' in entry else entry['title']
-					if str(key) in self.map: continue
-
-					target_ratingkey = self.__find_on_target(guid=entry['Guid'] if 'Guid' in entry else [], title=entry['title'] if 'title' in entry else '', type=entry['type'])
-					if target_ratingkey == None: continue
-					self.map[str(key)] = target_ratingkey['ratingKey']
-
-				#go through every media item in the library
-				for entry in lib_output:
-					key = entry['Guid'] if 'Guid' in entry else entry['title']
-					if not str(key) in self.map: continue
-					target_ratingkey = self.map[str(key)]
-
-					#add the request that will set the watched status for the target media to a queue
-					if 'viewOffset' in entry:
-						#set media to offset (partially watched; on deck)
-						self.target_ssn.get(f'{self.target_base_url}/:/progress', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'time': entry['viewOffset'], 'state': 'stopped', 'X-Plex-Token': user_token[2]})
-					elif 'viewCount' in entry:
-						#mark media as watched
-						self.target_ssn.get(f'{self.target_base_url}/:/scrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'X-Plex-Token': user_token[2]})
-					elif not 'viewCount' in entry:
-						#mark media as not-watched
-						self.target_ssn.get(f'{self.target_base_url}/:/unscrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'X-Plex-Token': user_token[2]})
-					self.result_json.append(entry['ratingKey'])
+			else:
+				#sync the watched status of every media item
+				for lib in sections:
+					if not lib['type'] in ('show','movie','artist'): continue
+					if lib['type'] == 'show': content_type = '4'
+					elif lib['type'] == 'movie': content_type = '1'
+					elif lib['type'] == 'artist': content_type = '10'
+
+					handled_series = []
+					print(f'		{lib["title"]}')
+					#sync complete series to skip syncing every episode (reducing requests)
+					if lib['type'] == 'show':
+						for show in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1'}):
+							if not (show['viewedLeafCount'] == 0 or show['viewedLeafCount'] == show['leafCount']): continue
+							for target in targets:
+								target_ratingkey = self.__map_to_target(target, show, 'show')
+								if target_ratingkey == None: continue
+
+								if show['viewedLeafCount'] == 0:
+									#mark complete series as not-viewed
+									request = self.__request(target, 'GET', '/:/unscrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'X-Plex-Token': user_token[2][target.name]})
+								else:
+									#mark complete series as viewed
+									request = self.__request(target, 'GET', '/:/scrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'X-Plex-Token': user_token[2][target.name]})
+								sent.append((target, None, request))
+							handled_series.append(show['ratingKey'])
+
+					#go through every media item in the library
+					for entry in self.source.get_listing(f'/library/sections/{lib["key"]}/all', params={'type': content_type, 'includeGuids': '1', 'X-Plex-Token': user_token[1]}):
+						if lib['type'] == 'show' and entry['grandparentRatingKey'] in handled_series: continue
+						for target, request in self.__sync_watched_status(targets, entry, user_token):
+							sent.append((target, None, request))
+
+			#save the time to continue from next run, but not past media of which the watched status wasn't applied
+			self.__wait_requests()
+			for target in targets:
+				failed = [entry_viewed_at for request_target, entry_viewed_at, request in sent if request_target == target and not self.__succeeded([request])]
+				#the time of failed media that isn't from the history is unknown, so keep the old time
+				if None in failed: continue
+				new_viewed_at = min([viewed_at] + [entry_viewed_at - 1 for entry_viewed_at in failed])
+				self.map_cursor.execute("INSERT OR REPLACE INTO watch_history VALUES (?,?,?,?);", (self.source.machine_id, target.machine_id, user_token[0], max(new_viewed_at, last_viewed_at[target.name] or 0)))
+			self.map_db.commit()
 
 		return self.result_json
 
+	def __sync_watched_status(self, targets: list, entry: dict, user_token: list):
+		#returns the sent requests as [(target, request)]
+		requests = []
+		for target in targets:
+			target_ratingkey = self.__map_to_target(target, entry, entry['type'])
+			if target_ratingkey == None: continue
+
+			if 'viewOffset' in entry:
+				#set media to offset (partially watched; on deck)
+				request = self.__request(target, 'GET', '/:/progress', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'time': entry['viewOffset'], 'state': 'stopped', 'X-Plex-Token': user_token[2][target.name]})
+			elif 'viewCount' in entry:
+				#mark media as watched
+				request = self.__request(target, 'GET', '/:/scrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'X-Plex-Token': user_token[2][target.name]})
+			elif not 'viewCount' in entry:
+				#mark media as not-watched
+				request = self.__request(target, 'GET', '/:/unscrobble', params={'identifier': 'com.plexapp.plugins.library', 'key': target_ratingkey, 'X-Plex-Token': user_token[2][target.name]})
+			requests.append((target, request))
+		if requests:
+			self.result_json.append(entry['ratingKey'])
+		return requests
+
 	def _playlists(self):
 		print('Playlists')
 
-		#get list of tokens (users) to apply action to
-		if not self.user_tokens:
-			from re import findall as re_findall
-
-			source_shared_users = self.source_ssn.get(f'http://plex.tv/api/servers/{self.source_machine_id}/shared_servers', headers={}).text
-			target_shared_users = self.target_ssn.get(f'http://plex.tv/api/servers/{self.target_machine_id}/shared_servers', headers={}).text
-
-			#add user self if requested
-			if '@me' in self.users or '@all' in self.users:
-				self.user_tokens.append(['@me', self.source_api_token, self.target_api_token])
-
-			#get data about every user (username at beginning and token at end)
-			source_user_data = re_findall(r'(?<=username=").*?accessToken="\w+?(?=")', source_shared_users)
-			for source_user in source_user_data:
-				username = source_user.split('"')[0]
-				if not '@all' in self.users and not username in self.users:
-					continue
-				source_token = source_user.split('"')[-1]
-				target_token = re_findall(rf'username="{username}.*?accessToken="\w+?(?=")', target_shared_users)
-				if target_token:
-					self.user_tokens.append([username, source_token, target_token[0].split('"')[-1]])
-
-		for user_token in self.user_tokens:
+		for user_token in self.__get_user_tokens():
 			print(f'	{user_token[0]}')
 
 			#get playlists of user
-			source_playlists = self.__get_data('source','/playlists', params={'includeGuids': '1', 'X-Plex-Token': user_token[1]})['MediaContainer'].get('Metadata', [])
-			target_playlists = self.__get_data('target','/playlists', params={'includeGuids': '1', 'X-Plex-Token': user_token[2]})['MediaContainer'].get('Metadata', [])
-
-			#delete all playlists to keep deleted playlists synced
-			for target_playlist in target_playlists:
-				self.target_ssn.delete(f'{self.target_base_url}/playlists/{target_playlist["ratingKey"]}', params={'X-Plex-Token': user_token[2]})
-
-			#sync source playlists to target server
-			for playlist in source_playlists:
-				print(f'		{playlist["title"]}')
-				source_playlist_content = self.__get_data('source',f'/playlists/{playlist["ratingKey"]}/items', params={'includeGuids': '1', 'X-Plex-Token': user_token[1]})['MediaContainer'].get('Metadata', None)
-				if source_playlist_content == None: continue
-				#make map of media: guids or title -> target ratingkey
-				for entry in source_playlist_content:
-					key = entry['Guid'] if 'Guid' in entry else entry['title']
-					if str(key) in self.map: continue
-
-					target_ratingkey = self.__find_on_target(guid=entry['Guid'] if 'Guid' in entry else [], title=entry['title'] if 'title' in entry else '', type=entry['type'])
-					if target_ratingkey == None: continue
-					self.map[str(key)] = target_ratingkey['ratingKey']
-
-				#go through every media item in the library
-				target_playlist_content = []
-				for entry in source_playlist_content:
-					key = entry['Guid'] if 'Guid' in entry else entry['title']
-					if not str(key) in self.map: continue
-					target_ratingkey = self.map[str(key)]
-
-					target_playlist_content.append(target_ratingkey)
-					self.result_json.append(entry['ratingKey'])
-				if not target_playlist_content: continue
-
-				new_ratingkey = self.target_ssn.post(f'{self.target_base_url}/playlists', params={'type': 'video', 'title': playlist['title'], 'smart': '0', 'uri': f'server://{self.target_machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(target_playlist_content)}', 'X-Plex-Token': user_token[2]}).json()['MediaContainer']['Metadata'][0]['ratingKey']
-				#sync poster
-				if 'thumb' in playlist:
-					self.target_ssn.post(f'{self.target_base_url}/playlists/{new_ratingkey}/posters', params={'url': f'{self.source_base_url}{playlist["thumb"]}?X-Plex-Token={self.source_api_token}'})
-				#sync settings
-				payload = {
-					'summary': playlist.get('summary',''),
-					'X-Plex-Token': self.target_api_token
-				}
-				self.target_ssn.put(f'{self.target_base_url}/playlists/{new_ratingkey}', params=payload)
-
-				self.result_json += target_playlist_content
+			source_playlists = self.source.get_data('/playlists', params={'includeGuids': '1', 'X-Plex-Token': user_token[1]})['MediaContainer'].get('Metadata', [])
+
+			for target in self.targets:
+				if not target.name in user_token[2]: continue
+				target_token = user_token[2][target.name]
+
+				#match the playlists on title
+				target_playlists = target.get_data('/playlists', params={'includeGuids': '1', 'X-Plex-Token': target_token})['MediaContainer'].get('Metadata', [])
+				target_playlists = {target_playlist['title']: target_playlist for target_playlist in target_playlists}
+
+				#sync source playlists to target server
+				for playlist in source_playlists:
+					print(f'		{playlist["title"]}')
+					target_playlist = target_playlists.pop(playlist['title'], None)
+					source_playlist_content = self.source.get_data(f'/playlists/{playlist["ratingKey"]}/items', params={'includeGuids': '1', 'X-Plex-Token': user_token[1]})['MediaContainer'].get('Metadata', [])
+					#go through every media item in the playlist
+					target_playlist_content = []
+					for entry in source_playlist_content:
+						target_ratingkey = self.__map_to_target(target, entry, entry['type'])
+						if target_ratingkey == None: continue
+
+						target_playlist_content.append(target_ratingkey)
+						self.result_json.append(entry['ratingKey'])
+					if not target_playlist_content:
+						if target_playlist != None:
+							target.ssn.delete(f'{target.base_url}/playlists/{target_playlist["ratingKey"]}', params={'X-Plex-Token': target_token})
+						continue
+
+					if target_playlist == None:
+						new_ratingkey = target.ssn.post(f'{target.base_url}/playlists', params={'type': 'video', 'title': playlist['title'], 'smart': '0', 'uri': f'server://{target.machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(target_playlist_content)}', 'X-Plex-Token': target_token}).json()['MediaContainer']['Metadata'][0]['ratingKey']
+					else:
+						#only add and remove the media that differs
+						new_ratingkey = target_playlist['ratingKey']
+						current_content = {entry['ratingKey']: entry['playlistItemID'] for entry in target.get_listing(f'/playlists/{new_ratingkey}/items', params={'X-Plex-Token': target_token})}
+						added_content = [r for r in target_playlist_content if not r in current_content]
+						if added_content:
+							target.ssn.put(f'{target.base_url}/playlists/{new_ratingkey}/items', params={'uri': f'server://{target.machine_id}/com.plexapp.plugins.library/library/metadata/{",".join(added_content)}', 'X-Plex-Token': target_token})
+						for removed_ratingkey in set(current_content).difference(target_playlist_content):
+							target.ssn.delete(f'{target.base_url}/playlists/{new_ratingkey}/items/{current_content[removed_ratingkey]}', params={'X-Plex-Token': target_token})
+					self.result_json += target_playlist_content
+
+					#sync poster and settings if they changed since the last run
+					state = self.__changed(target, new_ratingkey, playlist, ('thumb','summary'))
+					if state == None: continue
+					responses = []
+					#sync poster
+					if 'thumb' in playlist:
+						responses.append(target.ssn.post(f'{target.base_url}/playlists/{new_ratingkey}/posters', params={'url': f'{self.source.base_url}{playlist["thumb"]}?X-Plex-Token={self.source.api_token}', 'X-Plex-Token': target_token}))
+					#sync settings
+					payload = {
+						'summary': playlist.get('summary',''),
+						'X-Plex-Token': target_token
+					}
+					responses.append(target.ssn.put(f'{target.base_url}/playlists/{new_ratingkey}', params=payload))
+					failed = [r for r in responses if not 200 <= r.status_code < 300]
+					for r in failed:
+						print(f'		Failed to apply change on {target.name}: playlist "{playlist["title"]}" returned {r.status_code}')
+					#only mark the playlist as synced when all changes were applied; otherwise it's tried again next run
+					if not failed:
+						self.__save_synced(target, new_ratingkey, state)
+
+				#delete the playlists that aren't on the source server anymore
+				for target_playlist in target_playlists.values():
+					target.ssn.delete(f'{target.base_url}/playlists/{target_playlist["ratingKey"]}', params={'X-Plex-Token': target_token})
 
 		return self.result_json
 
 if __name__ == '__main__':
 	from requests import Session as requests_Session
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
 	from argparse import ArgumentParser
 
 	#setup vars
 	og_start_time = perf_counter()
-	main_ssn = requests_Session()
-	main_ssn.headers.update({'Accept': 'application/json'})
-	main_ssn.params.update({'X-Plex-Token': main_plex_api_token})
-	backup_ssn = requests_Session()
-	backup_ssn.headers.update({'Accept': 'application/json'})
-	backup_ssn.params.update({'X-Plex-Token': backup_plex_api_token})
+	#keep connections alive and retry when a server fails to respond
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssns = {}
+	for name, (base_url, api_token) in plex_servers.items():
+		ssns[name] = requests_Session()
+		ssns[name].mount('http://', adapter)
+		ssns[name].mount('https://', adapter)
+		ssns[name].headers.update({'Accept': 'application/json'})
+		ssns[name].params.update({'X-Plex-Token': api_token})
 
 	#setup arg parsing
-	parser = ArgumentParser(description='Keep data between two plex servers synced', epilog='If you want to use the "intro_markers" feature, it is REQUIRED that the script is run on the target server and that the script is run using the root user (administrative user).')
-	parser.add_argument('-s','--SourceName', choices=[main_plex_name, backup_plex_name], help='Select the server that the data will be pulled from. It will be uploaded on the other server (target server)', required=True)
+	parser = ArgumentParser(description='Keep data between plex servers synced', epilog='If you want to use the "intro_markers" feature, it is REQUIRED that the script is run on the target server and that the script is run using the root user (administrative user).')
+	parser.add_argument('-s','--SourceName', choices=list(plex_servers), help='Select the server that the data will be pulled from. It will be uploaded on the other servers (target servers)', required=True)
+	parser.add_argument('-t','--TargetName', choices=list(plex_servers), help='Only upload the data on this server instead of on all other servers; This argument can be given multiple times', action='append', default=[])
 	parser.add_argument('-S','--Sync', choices=['collections','posters','watch_history','playlists','intro_markers'], help='Select what to sync; This argument can be given multiple times', action='append', required=True, default=[])
 	parser.add_argument('-u','--User', help='Apply user-specific sync actions to these users; This argument can be given multiple times; Use @me to target yourself; Use @all to target everyone', action='append', default=['@me'])
+	parser.add_argument('-f','--FullWatchHistory', help='When selecting "watch_history" as (one of) the sync action(s), sync the watched status of all media instead of only the media that was watched since the last run and the media that is in progress', action='store_true')
 	parser.add_argument('-p','--NoEpisodePosters', help='When selecting "posters" as (one of) the sync action(s), only sync movie, series and season posters and not episode posters', action='store_false')
 
 	args = parser.parse_args()
 	#initiate class and process result
-	instance = plex_sync(main_ssn=main_ssn, backup_ssn=backup_ssn, source=args.SourceName, sync=args.Sync, users=args.User, sync_episode_posters=args.NoEpisodePosters)
-	if isinstance(instance, str):
-		parser.error(instance)
+	try:
+		instance = plex_sync(ssns=ssns, source=args.SourceName, sync=args.Sync, targets=args.TargetName, users=args.User, sync_episode_posters=args.NoEpisodePosters, full_watch_history=args.FullWatchHistory)
+	except ValueError as e:
+		parser.error(e.args[0])
 
 	#run sync and process result
 	response = instance.start_sync()
@@ -33,6 +33,16 @@ types = ('export','import','list')
 # 'sections' -> sections output
 guid_map = {}
 
+def _setup_session(ssn):
+	# keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def _guid_to_ratingkey(ssn, guid: str):
 	rating_key = guid_map.get(guid)
 	if not rating_key:
@@ -288,7 +298,7 @@ if __name__ == '__main__':
 	from requests import Session
 
 	# Setup vars
-	ssn = Session()
+	ssn = _setup_session(Session())
 	ssn.headers.update({'Accept': 'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 
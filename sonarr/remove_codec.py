@@ -31,6 +31,16 @@ radarr_ip = getenv('radarr_ip', radarr_ip)
 radarr_port = getenv('radarr_port', radarr_port)
 radarr_api_token = getenv('radarr_api_token', radarr_api_token)
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def remove_codec(source: str, codec: str):
 	result_json = []
 
@@ -38,7 +48,7 @@ def remove_codec(source: str, codec: str):
 		if sonarr_ip and sonarr_port and sonarr_api_token:
 			#apply script to sonarr
 			sonarr_base_url = f'http://{sonarr_ip}:{sonarr_port}/api/v3'
-			sonarr_ssn = requests.Session()
+			sonarr_ssn = _setup_session(requests.Session())
 			sonarr_ssn.params.update({'apikey': sonarr_api_token})
 			try:
 				series_list = sonarr_ssn.get(f'{sonarr_base_url}/series').json()
@@ -65,7 +75,7 @@ def remove_codec(source: str, codec: str):
 		if radarr_ip and radarr_port and radarr_api_token:
 			#apply script to sonarr
 			radarr_base_url = f'http://{radarr_ip}:{radarr_port}/api/v3'
-			radarr_ssn = requests.Session()
+			radarr_ssn = _setup_session(requests.Session())
 			radarr_ssn.params.update({'apikey': radarr_api_token})
 			try:
 				movie_list = radarr_ssn.get(f'{radarr_base_url}/movie').json()
@@ -49,6 +49,16 @@ radarr_ip = getenv('radarr_ip', radarr_ip)
 radarr_port = getenv('radarr_port', radarr_port)
 radarr_api_token = getenv('radarr_api_token', radarr_api_token)
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def root_folder_tagger(source: str):
 	result_json = []
 
@@ -58,7 +68,7 @@ def root_folder_tagger(source: str):
 			for setting in sonarr_config.items():
 				sonarr_config[setting[0].rstrip('/')] = setting[1]
 			sonarr_base_url = f'http://{sonarr_ip}:{sonarr_port}/api/v3'
-			sonarr_ssn = requests.Session()
+			sonarr_ssn = _setup_session(requests.Session())
 			sonarr_ssn.params.update({'apikey': sonarr_api_token})
 			try:
 				series_list = sonarr_ssn.get(f'{sonarr_base_url}/series').json()
@@ -97,7 +107,7 @@ def root_folder_tagger(source: str):
 			for setting in radarr_config.items():
 				radarr_config[setting[0].rstrip('/')] = setting[1]
 			radarr_base_url = f'http://{radarr_ip}:{radarr_port}/api/v3'
-			radarr_ssn = requests.Session()
+			radarr_ssn = _setup_session(requests.Session())
 			radarr_ssn.params.update({'apikey': radarr_api_token})
 			try:
 				movie_list = radarr_ssn.get(f'{radarr_base_url}/movie').json()
@@ -30,6 +30,16 @@ plex_port = getenv('plex_port', plex_port)
 plex_api_token = getenv('plex_api_token', plex_api_token)
 plex_base_url = f'http://{plex_ip}:{plex_port}'
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def sonarr_refresh_tba(sonarr_ssn, plex_ssn, target: list):
 	result_json = []
 
@@ -73,9 +83,9 @@ if __name__ == '__main__':
 	from argparse import ArgumentParser
 
 	#setup vars
-	sonarr_ssn = Session()
+	sonarr_ssn = _setup_session(Session())
 	sonarr_ssn.params.update({'apikey': sonarr_api_token})
-	plex_ssn = Session()
+	plex_ssn = _setup_session(Session())
 	plex_ssn.headers.update({'Accept': 'application/json'})
 	plex_ssn.params.update({'X-Plex-Token': plex_api_token})
 
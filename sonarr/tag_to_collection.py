@@ -39,6 +39,16 @@ radarr_ip = getenv('radarr_ip', radarr_ip)
 radarr_port = getenv('radarr_port', radarr_port)
 radarr_api_token = getenv('radarr_api_token', radarr_api_token)
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def _find_in_plex(plex_ssn, path: str, sections: list):
 	#find library that file is in
 	for lib in sections:
@@ -77,7 +87,7 @@ def tag_to_collection(plex_ssn, source: str, tag_name: str, library_name: str, c
 		if sonarr_ip and sonarr_port and sonarr_api_token:
 			#apply script to sonarr
 			sonarr_base_url = f'http://{sonarr_ip}:{sonarr_port}/api/v3'
-			sonarr_ssn = requests.Session()
+			sonarr_ssn = _setup_session(requests.Session())
 			sonarr_ssn.params.update({'apikey': sonarr_api_token})
 			try:
 				series_list = sonarr_ssn.get(f'{sonarr_base_url}/series').json()
@@ -108,7 +118,7 @@ def tag_to_collection(plex_ssn, source: str, tag_name: str, library_name: str, c
 		if radarr_ip and radarr_port and radarr_api_token:
 			#apply script to sonarr
 			radarr_base_url = f'http://{radarr_ip}:{radarr_port}/api/v3'
-			radarr_ssn = requests.Session()
+			radarr_ssn = _setup_session(requests.Session())
 			radarr_ssn.params.update({'apikey': radarr_api_token})
 			try:
 				movie_list = radarr_ssn.get(f'{radarr_base_url}/movie').json()
@@ -149,7 +159,7 @@ if __name__ == '__main__':
 	from argparse import ArgumentParser
 
 	#setup vars
-	ssn = Session()
+	ssn = _setup_session(Session())
 	ssn.headers.update({'Accept': 'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 
@@ -24,6 +24,16 @@ sonarr_ip = getenv('sonarr_ip', sonarr_ip)
 sonarr_port = getenv('sonarr_port', sonarr_port)
 sonarr_api_token = getenv('sonarr_api_token', sonarr_api_token)
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def unmonitor_downloaded_episodes(ssn, episode_id: str):
 	result = ssn.put(f'http://{sonarr_ip}:{sonarr_port}/api/v3/episode/monitor', json={'episodeIds':[episode_id],'monitored': False})
 	return result
@@ -40,7 +50,7 @@ if __name__ == '__main__':
 	import requests
 
 	#setup vars
-	ssn = requests.Session()
+	ssn = _setup_session(requests.Session())
 	ssn.params.update({'apikey': sonarr_api_token})
 	episode_id = str(getenv('sonarr_episodefile_episodeids'))
 
@@ -7,6 +7,7 @@ The use case of this script is the following:
 Requirements (python3 -m pip install [requirement]):
 	requests
 	PlexAPI
+	websocket-client
 Setup:
 	Fill the variables below firstly,
 	then go to the tautulli web-ui -> Settings -> Notification Agents -> Add a new notification agent -> Script:
@@ -19,6 +20,9 @@ Setup:
 			Playback Start = check
 		Arguments:
 			Playback Start -> Script Arguments = --SessionId {session_id}
+Setup as supervisor:
+	Fill the variables below firstly, then run the script continuously with the --Supervisor flag instead of using tautulli.
+	All local streams on the main server are then monitored by one process.
 """
 
 main_plex_ip = ''
@@ -30,9 +34,11 @@ backup_plex_port = ''
 backup_plex_api_token = ''
 
 from os import getenv
-from time import sleep as time_sleep
+from threading import Lock
+from time import perf_counter, sleep as time_sleep
 from plexapi.server import PlexServer
 from plexapi.exceptions import NotFound as plexapi_notfound
+from requests.exceptions import RequestException
 
 # Environmental Variables
 main_plex_ip = getenv('main_plex_ip', main_plex_ip)
@@ -43,14 +49,92 @@ backup_plex_ip = getenv('backup_plex_ip', backup_plex_ip)
 backup_plex_port = getenv('backup_plex_port', backup_plex_port)
 backup_plex_api_token = getenv('backup_plex_api_token', backup_plex_api_token)
 backup_base_url = f"http://{backup_plex_ip}:{backup_plex_port}"
+type_map = {
+	'movie': ('movie', 1),
+	'episode': ('show', 4)
+}
 
-def plex_failover_switch(main_plex_ssn, backup_plex_ssn, media_id: str, player: str, offset: int=0):
-	main_plex = PlexServer(main_base_url, main_plex_api_token)
-	backup_plex = PlexServer(backup_base_url, backup_plex_api_token)
+class guid_index:
+	def __init__(self, ssn):
+		#index of the media on the backup server
+		self.ssn = ssn
+		self.lock = Lock()
+		#guids or (library type, title) -> rating key
+		self.media = {}
+		#rating key -> (guids, (library type, title))
+		self.keys = {}
+		for lib in self.__fetch('/library/sections').get('Directory', []):
+			for lib_type, content_type in type_map.values():
+				if lib['type'] != lib_type: continue
+				for media in self.__fetch(f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': content_type}).get('Metadata', []):
+					self.__add(lib_type, media)
+
+	def __fetch(self, link: str, params: dict={}) -> dict:
+		return self.ssn.get(f'{backup_base_url}{link}', params=params).json()['MediaContainer']
+
+	def __add(self, lib_type: str, media: dict):
+		self.__remove(media['ratingKey'])
+		keys = (tuple(guid['id'] for guid in media['Guid']) if 'Guid' in media else None, (lib_type, media.get('title')))
+		self.keys[media['ratingKey']] = keys
+		for key in keys:
+			if key: self.media.setdefault(key, media['ratingKey'])
+		return
+
+	def __remove(self, rating_key: str):
+		for key in self.keys.pop(rating_key, ()):
+			if key and self.media.get(key) == rating_key: self.media.pop(key)
+		return
+
+	def update(self, data: dict):
+		#process the library update notifications of the backup server
+		for entry in data.get('TimelineEntry', []):
+			if entry.get('identifier') != 'com.plexapp.plugins.library' or not entry.get('type') in (1,4): continue
+			if entry.get('state') == 9:
+				#media removed
+				with self.lock:
+					self.__remove(str(entry['itemID']))
+			elif entry.get('state') == 5:
+				#media added or updated
+				for media in self.__fetch(f'/library/metadata/{entry["itemID"]}', params={'includeGuids': '1'}).get('Metadata', []):
+					if not media['type'] in type_map: continue
+					with self.lock:
+						self.__add(type_map[media['type']][0], media)
+		return
+
+	def find(self, media: dict) -> str:
+		#get the rating key on the backup server of media on the main server
+		with self.lock:
+			if 'Guid' in media:
+				#media found on backup server using guids (reliable)
+				return self.media.get(tuple(guid['id'] for guid in media['Guid']))
+			elif media['type'] in type_map:
+				#media found on backup server using title (unreliable)
+				return self.media.get((type_map[media['type']][0], media['title']))
+		return None
+
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
+def plex_failover_switch(main_plex_ssn, backup_plex_ssn, media_id: str, player: str, offset: int=0, index: guid_index=None, main_plex=None, backup_plex=None):
+	if main_plex == None: main_plex = PlexServer(main_base_url, main_plex_api_token)
+	if backup_plex == None: backup_plex = PlexServer(backup_base_url, backup_plex_api_token)
 
 	#get info about source media
 	media_info = main_plex_ssn.get(f'{main_base_url}/library/metadata/{media_id}', params={'includeGuids': '1'})
-	if media_info.status_code != 404:
+	if media_info.status_code == 404:
+		return 'Media not found'
+	elif index != None:
+		#find media on backup server using the index
+		target_ratingkey = index.find(media_info.json()['MediaContainer']['Metadata'][0])
+		target_key = f'/library/metadata/{target_ratingkey}' if target_ratingkey != None else ''
+	else:
 		lib_id = str(media_info.json()['MediaContainer']['librarySectionID'])
 		sections = main_plex_ssn.get(f'{main_base_url}/library/sections').json()['MediaContainer']['Directory']
 		for lib in sections:
@@ -65,33 +149,31 @@ def plex_failover_switch(main_plex_ssn, backup_plex_ssn, media_id: str, player:
 			media_info = media_info['Guid']
 		else:
 			media_info = media_info['title']
-	else:
-		return 'Media not found'
-	#summary: lib_type = source lib type, lib_id = source lib id, media_info = source title (str) or source guids (list)
-
-	#try to find media on backup server
-	target_key = ''
-	sections = backup_plex_ssn.get(f'{backup_base_url}/library/sections').json()['MediaContainer']['Directory']
-	for lib in sections:
-		if lib['type'] != lib_type: continue
-		if lib['type'] == 'show':
-			lib_output = backup_plex_ssn.get(f'{backup_base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': '4'}).json()['MediaContainer']['Metadata']
-		else:
-			lib_output = backup_plex_ssn.get(f'{backup_base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1'}).json()['MediaContainer']['Metadata']
+		#summary: lib_type = source lib type, lib_id = source lib id, media_info = source title (str) or source guids (list)
 
-		for media in lib_output:
-			if isinstance(media_info, list) and 'Guid' in media and media['Guid'] == media_info:
-				#media found on backup server using guids (reliable)
-				target_key = f'/library/metadata/{media["ratingKey"]}'
-				break
+		#try to find media on backup server
+		target_key = ''
+		sections = backup_plex_ssn.get(f'{backup_base_url}/library/sections').json()['MediaContainer']['Directory']
+		for lib in sections:
+			if lib['type'] != lib_type: continue
+			if lib['type'] == 'show':
+				lib_output = backup_plex_ssn.get(f'{backup_base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': '4'}).json()['MediaContainer']['Metadata']
+			else:
+				lib_output = backup_plex_ssn.get(f'{backup_base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1'}).json()['MediaContainer']['Metadata']
 
-			elif isinstance(media_info, str) and 'title' in media and media['title'] == media_info:
-				#media found on backup server using title (unreliable)
-				target_key = f'/library/metadata/{media["ratingKey"]}'
-				break
-		else:
-			continue
-		break
+			for media in lib_output:
+				if isinstance(media_info, list) and 'Guid' in media and media['Guid'] == media_info:
+					#media found on backup server using guids (reliable)
+					target_key = f'/library/metadata/{media["ratingKey"]}'
+					break
+
+				elif isinstance(media_info, str) and 'title' in media and media['title'] == media_info:
+					#media found on backup server using title (unreliable)
+					target_key = f'/library/metadata/{media["ratingKey"]}'
+					break
+			else:
+				continue
+			break
 
 	#stop stream and if media is found on backup server, start stream from backup server
 	try:
@@ -148,24 +230,79 @@ def plex_failover(main_plex_ssn, backup_plex_ssn, session_id: str, buffer_thresh
 
 		time_sleep(check_interval)
 
+def plex_failover_supervisor(main_plex_ssn, backup_plex_ssn, buffer_threshold: int=10, check_interval: int=5):
+	main_plex = PlexServer(main_base_url, main_plex_api_token)
+	backup_plex = PlexServer(backup_base_url, backup_plex_api_token)
+	#keep an index of the media on the backup server that is updated when the library changes
+	index = guid_index(backup_plex_ssn)
+	listener = backup_plex.startAlertListener(callback=index.update)
+	#session id -> time the session started buffering
+	buffering = {}
+	print('Monitoring streams...')
+
+	try:
+		while True:
+			#get all local sessions at once
+			try:
+				sessions = main_plex_ssn.get(f'{main_base_url}/status/sessions').json()['MediaContainer'].get('Metadata', [])
+			except (RequestException, ValueError) as e:
+				#the main server can be unreachable for a moment (e.g. while it restarts) so try again next check
+				print(f'Failed to get the sessions of the main server: {e}')
+				time_sleep(check_interval)
+				continue
+			sessions = {session['Session']['id']: session for session in sessions if session['Session']['location'] == 'lan'}
+			now = perf_counter()
+			for session_id, session in sessions.items():
+				if session['Player']['state'] != 'buffering':
+					buffering.pop(session_id, None)
+					continue
+
+				if now - buffering.setdefault(session_id, now) >= buffer_threshold:
+					#session has been buffering for {buffer_threshold} seconds so initiate failover
+					try:
+						response = plex_failover_switch(main_plex_ssn, backup_plex_ssn, player=session['Player']['title'], media_id=session['ratingKey'], offset=session['viewOffset'], index=index, main_plex=main_plex, backup_plex=backup_plex)
+					except (RequestException, ValueError) as e:
+						#keep monitoring the other streams; this one is tried again when it keeps buffering
+						response = f'Failed: {e}'
+					print(f'Failover of {session["Player"]["title"]}: {response}')
+					buffering.pop(session_id)
+			#forget the sessions that ended
+			for session_id in set(buffering).difference(sessions):
+				buffering.pop(session_id)
+
+			#check every second while a session is buffering
+			time_sleep(1 if buffering else check_interval)
+	except KeyboardInterrupt:
+		print('Shutting down')
+		listener.stop()
+
+	return
+
 if __name__ == '__main__':
 	import requests, argparse
 
 	#setup vars
-	main_plex_ssn = requests.Session()
+	main_plex_ssn = _setup_session(requests.Session())
 	main_plex_ssn.headers.update({'Accept': 'application/json'})
 	main_plex_ssn.params.update({'X-Plex-Token': main_plex_api_token})
-	backup_plex_ssn = requests.Session()
+	backup_plex_ssn = _setup_session(requests.Session())
 	backup_plex_ssn.headers.update({'Accept': 'application/json'})
 	backup_plex_ssn.params.update({'X-Plex-Token': backup_plex_api_token})
 
 	#setup arg parsing
 	parser = argparse.ArgumentParser(description="When a local stream on the main server is buffering for x seconds, stop it and start it on the backup server")
-	parser.add_argument('-s','--SessionId', type=str, help="The plex session id of the stream that should be monitored", required=True)
+	parser.add_argument('-s','--SessionId', type=str, help="The plex session id of the stream that should be monitored")
+	parser.add_argument('-S','--Supervisor', help="Keep running and monitor all local streams instead of one", action='store_true')
 	parser.add_argument('-b','--BufferThreshold', type=int, help="The amount of seconds a stream should be buffering before the failover is triggered", default=10)
 	parser.add_argument('-i','--CheckInterval', type=int, help="The interval in seconds that the script checks a stream", default=5)
 
 	args = parser.parse_args()
+	if args.Supervisor:
+		plex_failover_supervisor(main_plex_ssn=main_plex_ssn, backup_plex_ssn=backup_plex_ssn, buffer_threshold=args.BufferThreshold, check_interval=args.CheckInterval)
+		exit(0)
+	if not args.SessionId:
+		parser.error('the following arguments are required: -s/--SessionId')
+
 	#call function and process result
 	response = plex_failover(main_plex_ssn=main_plex_ssn, backup_plex_ssn=backup_plex_ssn, session_id=args.SessionId, buffer_threshold=args.BufferThreshold, check_interval=args.CheckInterval)
 	print(response)
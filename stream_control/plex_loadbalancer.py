@@ -3,13 +3,14 @@
 
 """
 The use case of this script is the following:
-	Distribute local streams over two plex servers so that the load on both servers is even
+	Distribute local streams over multiple plex servers so that the load on the servers is even
 Requirements (python3 -m pip install [requirement]):
 	requests
 	PlexAPI
+	websocket-client
 Setup:
 	Fill the variables below firstly,
-	then ON BOTH SERVERS, go to their tautulli web-ui's -> Settings -> Notification Agents -> Add a new notification agent -> Script:
+	then ON ALL SERVERS, go to their tautulli web-ui's -> Settings -> Notification Agents -> Add a new notification agent -> Script:
 		Configuration:
 			Script Folder = /path/to/script/folder
 			Script File = select this script
@@ -23,6 +24,9 @@ Setup:
 Setup without Tautulli:
 	Fill the variables below firstly, then run the script with -h to see the arguments that you can give.
 	Run this script at an interval. Decide for yourself what the interval is (e.g. every 5m or every 1h).
+Setup as daemon:
+	Fill the variables below firstly, then run the script continuously with the --Daemon flag.
+	The streams are balanced as soon as they start or stop, using the notifications of the servers instead of tautulli or an interval.
 """
 
 main_plex_ip = ''
@@ -33,7 +37,28 @@ backup_plex_ip = ''
 backup_plex_port = ''
 backup_plex_api_token = ''
 
+#ADVANCED SETTINGS
+#More servers to distribute the streams over, on top of the main and backup server
+#Format: [{'name': 'replica', 'ip': '', 'port': '', 'api_token': ''}]
+extra_plex_servers = []
+#How the streams are distributed over the servers:
+# 'count': keep the amount of streams on every server even
+# 'load': keep the load of every server close to its share of the total load; transcodes and high bitrate streams put more load on a server than direct plays
+balance_policy = 'count'
+#Only used with 'load'. How much load a server can handle compared to the others (e.g. {'main': 2} to give main twice as much load as the other servers)
+#Servers that aren't listed get a capacity of 1
+server_capacity = {}
+#Only used with 'load'. How much load a stream puts on a server
+load_per_stream = 1
+load_per_video_transcode = 4
+load_per_audio_transcode = 1
+load_per_mbps = 0.1
+#Only used with 'load'. How far a server can go over its share of the load before streams are moved away from it (0.2 = 20%)
+load_tolerance = 0.2
+
 from os import getenv
+from threading import Lock
+from time import sleep
 from plexapi.server import PlexServer
 from plexapi.exceptions import NotFound as plexapi_notfound
 
@@ -46,140 +71,274 @@ backup_plex_ip = getenv('backup_plex_ip', backup_plex_ip)
 backup_plex_port = getenv('backup_plex_port', backup_plex_port)
 backup_plex_api_token = getenv('backup_plex_api_token', backup_plex_api_token)
 backup_base_url = f"http://{backup_plex_ip}:{backup_plex_port}"
+balance_policy = getenv('balance_policy', balance_policy)
+type_map = {
+	'movie': ('movie', 1),
+	'episode': ('show', 4)
+}
 
-def plex_loadbalancer(main_plex_ssn, backup_plex_ssn, session_id: str=None, prefered_server: str='main'):
-	result_json = {}
-	main_plex = PlexServer(main_base_url, main_plex_api_token)
-	backup_plex = PlexServer(backup_base_url, backup_plex_api_token)
+#server name -> (base url, api token)
+plex_servers = {
+	'main': (main_base_url, main_plex_api_token),
+	'backup': (backup_base_url, backup_plex_api_token),
+	**{s['name']: (f"http://{s['ip']}:{s['port']}", s['api_token']) for s in extra_plex_servers}
+}
+
+class guid_index:
+	def __init__(self, ssns: dict, warm: bool=True):
+		#server -> (ssn, base_url)
+		self.ssns = ssns
+		self.lock = Lock()
+		#server -> guids or (library type, title) -> rating key
+		self.media = {server: {} for server in ssns}
+		#server -> rating key -> (guids, (library type, title))
+		self.keys = {server: {} for server in ssns}
+		self.indexed = set()
+		if warm:
+			for server in ssns:
+				self.__index_server(server)
+
+	def __fetch(self, server: str, link: str, params: dict={}) -> dict:
+		ssn, base_url = self.ssns[server]
+		return ssn.get(f'{base_url}{link}', params=params).json()['MediaContainer']
+
+	def __add(self, server: str, lib_type: str, media: dict):
+		self.__remove(server, media['ratingKey'])
+		keys = (tuple(guid['id'] for guid in media['Guid']) if 'Guid' in media else None, (lib_type, media.get('title')))
+		self.keys[server][media['ratingKey']] = keys
+		for key in keys:
+			if key: self.media[server].setdefault(key, media['ratingKey'])
+		return
+
+	def __remove(self, server: str, rating_key: str):
+		for key in self.keys[server].pop(rating_key, ()):
+			if key and self.media[server].get(key) == rating_key: self.media[server].pop(key)
+		return
+
+	def __index_server(self, server: str):
+		for lib in self.__fetch(server, '/library/sections').get('Directory', []):
+			for lib_type, content_type in type_map.values():
+				if lib['type'] != lib_type: continue
+				for media in self.__fetch(server, f'/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': content_type}).get('Metadata', []):
+					self.__add(server, lib_type, media)
+		self.indexed.add(server)
+		return
+
+	def __update_media(self, server: str, rating_key: str):
+		for media in self.__fetch(server, f'/library/metadata/{rating_key}', params={'includeGuids': '1'}).get('Metadata', []):
+			if not media['type'] in type_map: continue
+			with self.lock:
+				self.__add(server, type_map[media['type']][0], media)
+		return
+
+	def update(self, server: str, data: dict):
+		#process the library update notifications of the server
+		for entry in data.get('TimelineEntry', []):
+			if entry.get('identifier') != 'com.plexapp.plugins.library' or not entry.get('type') in (1,4): continue
+			if entry.get('state') == 9:
+				#media removed
+				with self.lock:
+					self.__remove(server, str(entry['itemID']))
+			elif entry.get('state') == 5:
+				#media added or updated
+				self.__update_media(server, str(entry['itemID']))
+		return
+
+	def find(self, source: str, rating_key: str, target: str) -> str:
+		#get the rating key on the target server of media on the source server
+		if not target in self.indexed:
+			self.__index_server(target)
+		if not rating_key in self.keys[source]:
+			self.__update_media(source, rating_key)
+		with self.lock:
+			guids, title = self.keys[source].get(rating_key, (None, None))
+			if guids:
+				#media found on target server using guids (reliable)
+				return self.media[target].get(guids)
+			elif title:
+				#media found on target server using title (unreliable)
+				return self.media[target].get(title)
+		return None
+
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
+def _stream_load(session: dict) -> float:
+	#the load that a stream puts on the server
+	load = load_per_stream
+	transcode = session.get('TranscodeSession', {})
+	if transcode.get('videoDecision') == 'transcode': load += load_per_video_transcode
+	if transcode.get('audioDecision') == 'transcode': load += load_per_audio_transcode
+	load += int(next(iter(session.get('Media', [])), {}).get('bitrate', 0)) / 1000 * load_per_mbps
+	return load
+
+def _count_policy(sessions: dict, prefered_server: str, prefered_session: str=None) -> list:
+	#keep the amount of streams even; the prefered server gets the restant stream
+	counts = {server: len(server_sessions) for server, server_sessions in sessions.items()}
+	source = max(counts, key=lambda s: (counts[s], s != prefered_server))
+	target = min(counts, key=lambda s: (counts[s], s != prefered_server))
+	if counts[source] - counts[target] < 1 or (counts[source] - counts[target] == 1 and target != prefered_server):
+		#streams are balanced evenly (e.g. 2-2 or 0-0) or unevenly (e.g. 3-2 or 2-3 depending on prefered_server)
+		return []
+
+	#move a stream from the server with the most streams to the server with the least streams
+	return [(source, session_key, target) for session_key in sorted(sessions[source], key=lambda k: k != prefered_session)]
+
+def _load_policy(sessions: dict, prefered_server: str, prefered_session: str=None) -> list:
+	#keep the load of every server close to its share of the total load
+	loads = {server: {session_key: _stream_load(session) for session_key, session in server_sessions.items()} for server, server_sessions in sessions.items()}
+	capacity = {server: server_capacity.get(server, 1) for server in sessions}
+	total_load, total_capacity = sum(sum(l.values()) for l in loads.values()), sum(capacity.values())
+	share = {server: total_load * capacity[server] / total_capacity for server in sessions}
+	excess = {server: sum(loads[server].values()) - share[server] for server in sessions}
+
+	#move streams from the most overloaded server to the server with the most room left
+	result = []
+	target = min(excess, key=excess.get)
+	for source in sorted(excess, key=excess.get, reverse=True):
+		if source == target or excess[source] <= share[source] * load_tolerance: continue
+		#move the stream that evens out the load of the two servers the most, so that the least amount of streams are moved;
+		#streams that would overload the target server more than the source server is overloaded now are never moved
+		gap = excess[source] - excess[target]
+		session_keys = [session_key for session_key, load in loads[source].items() if load < gap]
+		session_keys.sort(key=lambda k: (k != prefered_session, abs(loads[source][k] - gap / 2)))
+		result += [(source, session_key, target) for session_key in session_keys]
+	return result
+
+balance_policies = {
+	'count': _count_policy,
+	'load': _load_policy
+}
 
+def _move_stream(servers: dict, index: guid_index, sessions: dict, source: str, session_key: str, target: str) -> bool:
+	stream = sessions[source][session_key]
+	if not 'Player' in stream: return False
+	#session can possibly be used; check if media of session is on both servers
+	target_ratingkey = index.find(source, stream['ratingKey'], target)
+	if target_ratingkey == None: return False
+	#check if client of session is on both servers
+	try:
+		source_client = servers[source].client(stream['Player']['title'])
+		target_client = servers[target].client(stream['Player']['title'])
+	except plexapi_notfound:
+		return False
+
+	#move session to target server
+	target_key = f'/library/metadata/{target_ratingkey}'
+	source_client.stop(mtype='video')
+	target_client.playMedia(servers[target].fetchItem(target_key), offset=stream.get('viewOffset', 0), key=target_key)
+	print(f'Moved a session from the {source} server to the {target} server')
+	#count the stream on the target server until the server reports the new session
+	sessions[source].pop(session_key)
+	sessions[target][f'moved-{session_key}'] = {k: v for k, v in stream.items() if k != 'Player'}
+	return True
+
+def _balance(servers: dict, index: guid_index, sessions: dict, policy: str, prefered_server: str, prefered_session: str=None):
 	#keep moving streams until they're in balance over the servers
 	while True:
-		#get all the streams from both servers
-		main_sessions = main_plex_ssn.get(f'{main_base_url}/status/sessions').json()['MediaContainer']
-		if 'Metadata' in main_sessions: main_sessions = main_sessions['Metadata']
-		else: main_sessions = []
-		backup_sessions = backup_plex_ssn.get(f'{backup_base_url}/status/sessions').json()['MediaContainer']
-		if 'Metadata' in backup_sessions: backup_sessions = backup_sessions['Metadata']
-		else: backup_sessions = []
-
-		#check if streams are balanced
-		if len(main_sessions) == len(backup_sessions):
-			#streams are balanced evenly (e.g. 2-2 or 0-0)
-			break
-
-		if (prefered_server == 'main' and len(main_sessions) - 1 == len(backup_sessions)) \
-		or (prefered_server == 'backup' and len(main_sessions) + 1 == len(backup_sessions)):
-			#stream are balanced unevenly (e.g. 3-2 or 2-3 depending on prefered_server)
-			break
-
-		#move stream from one server to the other
-		if len(main_sessions) > len(backup_sessions):
-			#move a stream from main server to backup server
-			source_plex = main_plex
-			source_plex_ssn = main_plex_ssn
-			source_base_url = main_base_url
-			target_plex = backup_plex
-			target_plex_ssn = backup_plex_ssn
-			target_base_url = backup_base_url
-			source_sessions = main_sessions
-
-		elif len(main_sessions) < len(backup_sessions):
-			#move a stream from backup server to main server
-			source_plex = backup_plex
-			source_plex_ssn = backup_plex_ssn
-			target_plex = main_plex
-			target_plex_ssn = main_plex_ssn
-			source_sessions = backup_sessions
-
-		#select source stream; if all fail (remote or media not found) exit
-		for check_id in True, False:
-			for stream in source_sessions:
-				if check_id == True and session_id != None and stream['Session']['id'] != session_id: continue
-				#session can possibly be used; check if client of session is on both servers
-				try:
-					source_client = source_plex.client(stream['Player']['title'])
-					target_client = target_plex.client(stream['Player']['title'])
-				except plexapi_notfound:
-					#session not able to be moved
-					continue
-
-				#session can be moved; check if media of session is on both servers
-				#get info about source media
-				media_info = source_plex_ssn.get(f'{source_base_url}/library/metadata/{stream["ratingKey"]}', params={'includeGuids': '1'})
-				lib_id = media_info.json()['MediaContainer']['librarySectionID']
-				sections = source_plex_ssn.get(f'{source_base_url}/library/sections').json()['MediaContainer']['Directory']
-				for lib in sections:
-					if lib['key'] == lib_id:
-						lib_type = lib['type']
-						break
-				else:
-					return 'Library type not found'
-
-				media_info = media_info.json()['MediaContainer']['Metadata'][0]
-				if 'Guid' in media_info:
-					media_info = media_info['Guid']
-				else:
-					media_info = media_info['title']
-
-				#try to find media on backup server
-				target_key = ''
-				sections = target_plex_ssn.get(f'{target_base_url}/library/sections').json()['MediaContainer']['Directory']
-				for lib in sections:
-					if lib['type'] != lib_type: continue
-					if lib['type'] == 'show':
-						lib_output = target_plex_ssn.get(f'{target_base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1', 'type': '4'}).json()['MediaContainer']['Metadata']
-					else:
-						lib_output = target_plex_ssn.get(f'{target_base_url}/library/sections/{lib["key"]}/all', params={'includeGuids': '1'}).json()['MediaContainer']['Metadata']
-
-					for media in lib_output:
-						if isinstance(media_info, list) and 'Guid' in media and media['Guid'] == media_info:
-							#media found on target server using guids (reliable)
-							target_key = f'/library/metadata/{media["ratingKey"]}'
-							break
-
-						elif isinstance(media_info, str) and 'title' in media and media['title'] == media_info:
-							#media found on target server using title (unreliable)
-							target_key = f'/library/metadata/{media["ratingKey"]}'
-							break
-					else:
-						continue
-					break
-				if not target_key:
-					#media not found on target server
-					continue
-
-				#move session to target server
-				source_client.stop(mtype='video')
-				media = target_plex.fetchItem(target_key)
-				target_client.playMedia(media, offset=stream['viewOffset'], key=target_key)
-				print('Moved a session from one server to the other')
+		for source, session_key, target in balance_policies[policy](sessions, prefered_server, prefered_session):
+			if _move_stream(servers, index, sessions, source, session_key, target):
 				break
-			else:
-				continue
-			break
+		else:
+			#balanced or no session can be moved
+			return
+
+def _get_sessions(ssn, base_url: str) -> dict:
+	return {session['sessionKey']: session for session in ssn.get(f'{base_url}/status/sessions').json()['MediaContainer'].get('Metadata', [])}
+
+def plex_loadbalancer(ssns: dict, session_id: str=None, prefered_server: str='main', policy: str=balance_policy):
+	result_json = {}
+	servers = {server: PlexServer(*plex_servers[server]) for server in ssns}
+	index = guid_index({server: (ssn, plex_servers[server][0]) for server, ssn in ssns.items()}, warm=False)
+
+	#get all the streams from the servers
+	sessions = {server: _get_sessions(ssn, plex_servers[server][0]) for server, ssn in ssns.items()}
+	prefered_session = next((session_key for server_sessions in sessions.values() for session_key, session in server_sessions.items() if session_id != None and session['Session']['id'] == session_id), None)
+
+	_balance(servers, index, sessions, policy, prefered_server, prefered_session)
 
-	result_json['main'] = main_sessions
-	result_json['backup'] = backup_sessions
+	for server, server_sessions in sessions.items():
+		result_json[server] = list(server_sessions.values())
 
 	return result_json
 
+def plex_loadbalancer_daemon(ssns: dict, prefered_server: str='main', policy: str=balance_policy):
+	servers = {server: PlexServer(*plex_servers[server]) for server in ssns}
+	index = guid_index({server: (ssn, plex_servers[server][0]) for server, ssn in ssns.items()})
+	#server -> session key -> session
+	sessions = {}
+	lock = Lock()
+
+	def process(server: str):
+		def _process(data: dict):
+			if data.get('type') == 'timeline':
+				index.update(server, data)
+				return
+			if data.get('type') != 'playing': return
+
+			with lock:
+				changed = False
+				for notification in data.get('PlaySessionStateNotification', []):
+					session_key = str(notification['sessionKey'])
+					if notification['state'] == 'stopped':
+						changed = sessions[server].pop(session_key, None) != None or changed
+					elif session_key in sessions[server]:
+						sessions[server][session_key]['viewOffset'] = notification.get('viewOffset', 0)
+					else:
+						#new session; get the info about it
+						sessions[server] = _get_sessions(ssns[server], plex_servers[server][0])
+						changed = True
+				if changed:
+					_balance(servers, index, sessions, policy, prefered_server)
+			return
+		return _process
+
+	with lock:
+		for server, ssn in ssns.items():
+			sessions[server] = _get_sessions(ssn, plex_servers[server][0])
+		_balance(servers, index, sessions, policy, prefered_server)
+	listeners = [plex.startAlertListener(callback=process(server)) for server, plex in servers.items()]
+	print('Balancing streams...')
+
+	try:
+		while sleep(5) is None:
+			pass
+	except KeyboardInterrupt:
+		print('Shutting down')
+		for listener in listeners:
+			listener.stop()
+
+	return
+
 if __name__ == '__main__':
 	import requests, argparse
 
 	#setup vars
-	main_plex_ssn = requests.Session()
-	main_plex_ssn.headers.update({'Accept': 'application/json'})
-	main_plex_ssn.params.update({'X-Plex-Token': main_plex_api_token})
-	backup_plex_ssn = requests.Session()
-	backup_plex_ssn.headers.update({'Accept': 'application/json'})
-	backup_plex_ssn.params.update({'X-Plex-Token': backup_plex_api_token})
+	ssns = {}
+	for server, (base_url, api_token) in plex_servers.items():
+		ssns[server] = _setup_session(requests.Session())
+		ssns[server].headers.update({'Accept': 'application/json'})
+		ssns[server].params.update({'X-Plex-Token': api_token})
 
 	#setup arg parsing
-	parser = argparse.ArgumentParser(description="Distribute local streams over two plex servers so that the load on both servers is even")
+	parser = argparse.ArgumentParser(description="Distribute local streams over multiple plex servers so that the load on the servers is even")
 	parser.add_argument('-s','--SessionId', type=str, help="The plex session id of the stream that will be prefered to be moved if needed; only needed for Tautulli setup")
-	parser.add_argument('-p','--PreferedServer', choices=['main','backup'], help="To which server should the restant stream go if there are uneven amount of streams", default='main')
+	parser.add_argument('-p','--PreferedServer', choices=list(plex_servers), help="To which server should the restant stream go if there are uneven amount of streams", default='main')
+	parser.add_argument('-P','--Policy', choices=list(balance_policies), help="How the streams are distributed over the servers; see balance_policy at the top of the script", default=balance_policy)
+	parser.add_argument('-d','--Daemon', help="Keep running and balance the streams as soon as they start or stop", action='store_true')
 
 	args = parser.parse_args()
+	if args.Daemon:
+		plex_loadbalancer_daemon(ssns=ssns, prefered_server=args.PreferedServer, policy=args.Policy)
+		exit(0)
+
 	#call function and process result
-	response = plex_loadbalancer(main_plex_ssn=main_plex_ssn, backup_plex_ssn=backup_plex_ssn, session_id=args.SessionId, prefered_server=args.PreferedServer)
+	response = plex_loadbalancer(ssns=ssns, session_id=args.SessionId, prefered_server=args.PreferedServer, policy=args.Policy)
 	print(response)
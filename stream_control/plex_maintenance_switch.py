@@ -25,6 +25,16 @@ plex_port = os.getenv('plex_port', plex_port)
 plex_api_token = os.getenv('plex_api_token', plex_api_token)
 base_url = f"http://{plex_ip}:{plex_port}"
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def plex_maintenance_switch(ssn, plex, set_state: str='on'):
 	result_json = []
 
@@ -86,7 +96,7 @@ if __name__ == '__main__':
 	from plexapi.server import PlexServer
 
 	#setup vars
-	ssn = requests.Session()
+	ssn = _setup_session(requests.Session())
 	ssn.headers.update({'Accept': 'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
 	plex = PlexServer(base_url, plex_api_token)
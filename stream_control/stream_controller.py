@@ -9,6 +9,7 @@ The use case of this script is the following:
 Requirements (python3 -m pip install [requirement]):
 	requests
 	PlexAPI
+	websocket-client
 Setup:
 	Fill the variables below firstly,
 	then go to the tautulli web-ui -> Settings -> Notification Agents -> Add a new notification agent -> Script:
@@ -25,6 +26,14 @@ Setup:
 			-- Value -- = lan
 		Arguments:
 			Playback Start -> Script Arguments = --Player {player} --RatingKey {rating_key} --Resolution {stream_video_full_resolution} --Channels {stream_audio_channels} --VideoResolution {video_resolution} --AudioChannels {audio_channels} --ViewOffset {progress_duration_sec}
+Daemon:
+	Run the script continuously with the --Daemon flag to keep an index of the media on the servers, so that versions are found without searching the libraries.
+	The index is kept up to date using the library update notifications of the servers.
+	The script started by tautulli then hands the stream to the daemon when it's running.
+	Instead of the script agent, the daemon can also be called directly with a Webhook agent in tautulli:
+		Webhook URL = http://{daemon_ip}:{daemon_port}
+		Webhook Method = POST
+		Data -> Playback Start -> JSON Data = {"player": "{player}", "rating_key": "{rating_key}", "resolution": "{stream_video_full_resolution}", "channels": "{stream_audio_channels}", "video_resolution": "{video_resolution}", "audio_channels": "{audio_channels}", "view_offset": "{progress_duration_sec}"}
 """
 
 plex_ip = ''
@@ -62,9 +71,18 @@ exclude_clients = []
 max_resolution = '4k'
 max_channel_count = 9 # 7.2 = 9, 5.1.2 = 8, etc.
 
+#--------------------
+#DAEMON
+
+#the address that the daemon listens on when the script is run with --Daemon
+daemon_ip = '127.0.0.1'
+daemon_port = '8300'
+
 #--------------------
 
 from os import getenv
+from collections import namedtuple
+from threading import Lock, Thread
 
 # Environmental Variables
 plex_ip = getenv('plex_ip', plex_ip)
@@ -75,42 +93,141 @@ backup_plex_ip = getenv('backup_plex_ip', backup_plex_ip)
 backup_plex_port = getenv('backup_plex_port', backup_plex_port)
 backup_plex_api_token = getenv('backup_plex_api_token', backup_plex_api_token)
 backup_base_url = f"http://{backup_plex_ip}:{backup_plex_port}"
+daemon_ip = getenv('daemon_ip', daemon_ip)
+daemon_port = getenv('daemon_port', daemon_port)
+daemon_url = f"http://{daemon_ip}:{daemon_port}"
 resolution_ladder = ['480','720','1080','2k','4k','6k','8k']
 type_map = {
 	'movie': ('movie',1),
 	'episode': ('show', 4)
 }
 
-def _extract_streams(media_info: dict, server: str) -> tuple:
+stream_record = namedtuple('stream_record', ('id', 'part_id', 'media_index', 'rating_key', 'server', 'rank', 'channel_count'))
+
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
+def _rank(resolution: str) -> int:
+	return resolution_ladder.index(resolution) if resolution in resolution_ladder else -1
+
+def _part(record: stream_record) -> tuple:
+	return record.part_id, record.server
+
+def _extract_streams(metadata: dict, server: str) -> tuple:
 	video_result, audio_result = [], []
-	for media_index, media in enumerate(media_info['MediaContainer']['Metadata'][0]['Media']):
+	for media_index, media in enumerate(metadata.get('Media', [])):
+		rank = _rank(media.get('videoResolution'))
 		for part in media['Part']:
-			for stream in part['Stream']:
+			for stream in part.get('Stream', []):
 				if not stream['streamType'] in (1,2): continue
-				result = {
-					'id': stream['id'],
-					'part_id': part['id'],
-					'media_index': media_index,
-					'media_id': media['id'],
-					'rating_key': media_info['MediaContainer']['Metadata'][0]['ratingKey'],
-					'server': server,
-
-					'streamType': stream['streamType'],
-					'index': stream['index'],
-					'selected': 'selected' in stream,
-
-					'resolution': media['videoResolution'],
-					'channel_count': stream.get('channels',0)
-				}
+				result = stream_record(stream['id'], part['id'], media_index, metadata['ratingKey'], server, rank, stream.get('channels',0))
 				if stream['streamType'] == 1: video_result.append(result)
 				elif stream['streamType'] == 2: audio_result.append(result)
 	return video_result, audio_result
 
-def _find_version(ssn, media_info: dict, resolution: str, channels: int, video_resolution: str, audio_channels: int) -> tuple:
+class guid_index:
+	def __init__(self, ssn):
+		self.ssn = ssn
+		self.servers = {'main': (base_url, plex_api_token)}
+		if backup_plex_ip and backup_plex_port and backup_plex_api_token:
+			self.servers['backup'] = (backup_base_url, backup_plex_api_token)
+		self.lock = Lock()
+		#guid -> {(server, rating_key)}
+		self.guids = {}
+		#(server, rating_key) -> guids
+		self.keys = {}
+		#(server, rating_key) -> (video stream records, audio stream records)
+		self.catalogue = {}
+		for server in self.servers:
+			self.__index_server(server)
+		#get the streams of all media in the background; media that isn't in the catalogue yet is fetched when needed
+		Thread(target=self.__fill_catalogue, daemon=True).start()
+
+	def __fetch(self, server: str, link: str, params: dict={}) -> dict:
+		url, token = self.servers[server]
+		return self.ssn.get(f'{url}{link}', params={**params, 'X-Plex-Token': token}).json()['MediaContainer']
+
+	def __add(self, server: str, media: dict):
+		key = (server, media['ratingKey'])
+		self.__remove(key)
+		self.keys[key] = tuple(guid['id'] for guid in media.get('Guid', []))
+		for guid in self.keys[key]:
+			self.guids.setdefault(guid, set()).add(key)
+		if 'Media' in media:
+			self.catalogue[key] = _extract_streams(media, server)
+		return
+
+	def __remove(self, key: tuple):
+		self.catalogue.pop(key, None)
+		for guid in self.keys.pop(key, ()):
+			self.guids[guid].discard(key)
+			if not self.guids[guid]: self.guids.pop(guid)
+		return
+
+	def __index_server(self, server: str):
+		for lib in self.__fetch(server, '/library/sections').get('Directory',[]):
+			for media_type in type_map.values():
+				if lib['type'] != media_type[0]: continue
+				for media in self.__fetch(server, f'/library/sections/{lib["key"]}/all', params={'type': media_type[1], 'includeGuids': '1'}).get('Metadata',[]):
+					self.__add(server, {'ratingKey': media['ratingKey'], 'Guid': media.get('Guid', [])})
+		return
+
+	def __update_media(self, key: tuple):
+		media_output = self.__fetch(key[0], f'/library/metadata/{key[1]}', params={'includeGuids': '1'}).get('Metadata',[])
+		with self.lock:
+			for media in media_output:
+				self.__add(key[0], media)
+		return
+
+	def __fill_catalogue(self):
+		for key in list(self.keys):
+			if not key in self.catalogue:
+				self.__update_media(key)
+		return
+
+	def update(self, server: str, data: dict):
+		#process the library update notifications of the server
+		for entry in data.get('TimelineEntry', []):
+			if entry.get('identifier') != 'com.plexapp.plugins.library' or not entry.get('type') in (1,4): continue
+			key = (server, str(entry['itemID']))
+			if entry.get('state') == 9:
+				#media removed
+				with self.lock:
+					self.__remove(key)
+			elif entry.get('state') == 5:
+				#media added or updated
+				self.__update_media(key)
+		return
+
+	def get_versions(self, rating_key: str) -> tuple:
+		#get the streams of the media and of the other versions of the media from the catalogue
+		video_result, audio_result = [], []
+		if not ('main', rating_key) in self.catalogue:
+			self.__update_media(('main', rating_key))
+		with self.lock:
+			keys = set().union(*(self.guids.get(guid, ()) for guid in self.keys.get(('main', rating_key), ())))
+		keys.discard(('main', rating_key))
+		#the streaming media first, then the versions on the main server, then the versions on the backup server
+		for key in [('main', rating_key)] + sorted(keys, key=lambda k: (k[0] != 'main', k)):
+			if not key in self.catalogue:
+				self.__update_media(key)
+			result = self.catalogue.get(key, ([], []))
+			video_result += result[0]
+			audio_result += result[1]
+		return video_result, audio_result
+
+def _search_versions(ssn, media_info: dict) -> tuple:
 	video_result, audio_result = [], []
 	#map all available versions and their streams
 	#search inside library entry
-	result = _extract_streams(media_info, server='main')
+	result = _extract_streams(media_info['MediaContainer']['Metadata'][0], server='main')
 	video_result += result[0]
 	audio_result += result[1]
 
@@ -125,7 +242,7 @@ def _find_version(ssn, media_info: dict, resolution: str, channels: int, video_r
 			if media['Guid'] == media_info['MediaContainer']['Metadata'][0]['Guid']:
 				#found media in other library
 				media_entry_info = ssn.get(f'{base_url}/library/metadata/{media["ratingKey"]}').json()
-				result = _extract_streams(media_entry_info, server='main')
+				result = _extract_streams(media_entry_info['MediaContainer']['Metadata'][0], server='main')
 				video_result += result[0]
 				audio_result += result[1]
 				break
@@ -144,7 +261,7 @@ def _find_version(ssn, media_info: dict, resolution: str, channels: int, video_r
 				if media['Guid'] == media_info['MediaContainer']['Metadata'][0]['Guid']:
 					#found media on backup server
 					media_entry_info = ssn.get(f'{backup_base_url}/library/metadata/{media["ratingKey"]}').json()
-					result = _extract_streams(media_entry_info, server='backup')
+					result = _extract_streams(media_entry_info['MediaContainer']['Metadata'][0], server='backup')
 					video_result += result[0]
 					audio_result += result[1]
 					break
@@ -154,118 +271,117 @@ def _find_version(ssn, media_info: dict, resolution: str, channels: int, video_r
 
 		ssn.params.update({'X-Plex-Token': plex_api_token})
 
-	#filter and sort streams
+	return video_result, audio_result
+
+def _top(records, key) -> list:
+	#get all records with the highest value for key, keeping their order
+	result, top = [], None
+	for record in records:
+		value = key(record)
+		if not result or value > top: result, top = [record], value
+		elif value == top: result.append(record)
+	return result
+
+def _select_version(video_result: list, audio_result: list, resolution: str, channels: int, video_resolution: str, audio_channels: int) -> tuple:
+	video, audio = None, None
+	rank, video_rank, max_rank = _rank(resolution), _rank(video_resolution), _rank(max_resolution)
+	lower_video = lambda m: rank <= m.rank < video_rank
+	higher_video = lambda m: rank < m.rank <= max_rank
+	lower_audio = lambda m: channels <= m.channel_count < audio_channels
+	higher_audio = lambda m: channels < m.channel_count <= max_channel_count
+
 	if process_video == True and process_audio == False:
+		audio = next(iter(audio_result), None)
 		if process_direction == 'down':
-			video_result = list(filter(lambda m: resolution_ladder.index(resolution) <= resolution_ladder.index(m['resolution']) < resolution_ladder.index(video_resolution), video_result))
-			video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']))
+			video = min(filter(lower_video, video_result), key=lambda m: m.rank, default=None)
 		else: #up
-			video_result = list(filter(lambda m: resolution_ladder.index(resolution) < resolution_ladder.index(m['resolution']) <= resolution_ladder.index(max_resolution), video_result))
-			video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']), reverse=True)
+			video = max(filter(higher_video, video_result), key=lambda m: m.rank, default=None)
 
 	elif process_audio == True and process_video == False:
+		video = next(iter(video_result), None)
 		if process_direction == 'down':
-			audio_result = list(filter(lambda m: channels <= m['channel_count'] < audio_channels, audio_result))
-			audio_result.sort(key=lambda m: m['channel_count'])
+			audio = min(filter(lower_audio, audio_result), key=lambda m: m.channel_count, default=None)
 		else: #up
-			audio_result = list(filter(lambda m: channels < m['channel_count'] <= max_channel_count, audio_result))
-			audio_result.sort(key=lambda m: m['channel_count'], reverse=True)
+			audio = max(filter(higher_audio, audio_result), key=lambda m: m.channel_count, default=None)
 
 	else:
 		if process_direction == 'down':
 			if process_priority == 'video':
-				#get all video streams between transcoding resolution and original stream resolution (tr <= s < or)
-				video_result = list(filter(lambda m: resolution_ladder.index(resolution) <= resolution_ladder.index(m['resolution']) < resolution_ladder.index(video_resolution), video_result))
-				video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']))
-				#keep the video streams closest to transcoding resolution
-				video_result = list(filter(lambda m: m['resolution'] == video_result[0]['resolution'], video_result))
-				if len(video_result) == 1:
-					#there is one video stream that better fits the stream
-					audio_result = list(filter(lambda m: m['part_id'] == video_result[0]['part_id'] and m['server'] == video_result[0]['server'], audio_result))
-					audio_result.sort(key=lambda m: m['channel_count'], reverse=True)
-					audio_result.sort(key=lambda m: abs(channels - m['channel_count']))
-				elif video_result:
-					#there are multiple video streams that better fit the stream; find the one that has a better fitting audio stream
-					part_ids = [(a['part_id'], a['server']) for a in video_result]
-					audio_result = list(filter(lambda m: (m['part_id'], m['server']) in part_ids, audio_result))
-					audio_result.sort(key=lambda m: m['channel_count'], reverse=True)
-					audio_result.sort(key=lambda m: abs(channels - m['channel_count']))
-					video_result = list(filter(lambda m: m['part_id'] == audio_result[0]['part_id'] and m['server'] == audio_result[0]['server'], video_result))
+				#get the video streams between transcoding resolution and original stream resolution (tr <= s < or) that are closest to transcoding resolution
+				video_result = _top(filter(lower_video, video_result), key=lambda m: -m.rank)
+				if video_result:
+					part_ids = {_part(m) for m in video_result}
+					audio_result = [m for m in audio_result if _part(m) in part_ids]
+					if len(video_result) == 1:
+						#there is one video stream that better fits the stream
+						video = video_result[0]
+					else:
+						#there are multiple video streams that better fit the stream; find the one that has a better fitting audio stream
+						closest = min(audio_result, key=lambda m: (abs(channels - m.channel_count), -m.channel_count), default=None)
+						video = next((m for m in video_result if closest and _part(m) == _part(closest)), video_result[0])
 				else:
 					#there is no video stream that is closer to transcoding resolution than the current one; find a better fitting audio stream where the video stream of the file matches the current resolution
-					audio_result = list(filter(lambda m: channels <= m['channel_count'] < audio_channels, audio_result))
-					audio_result.sort(key=lambda m: m['channel_count'])
+					audio_result = filter(lower_audio, audio_result)
 				#get the audio stream closest to the current transcoding channel count
-				audio_result.sort(key=lambda m: m['channel_count'])
+				audio = min(audio_result, key=lambda m: m.channel_count, default=None)
 			else: #'audio'
-				#get all audio streams between transcoding channel count and original stream channel count (tcc <= s < occ)
-				audio_result = list(filter(lambda m: channels <= m['channel_count'] < audio_channels, audio_result))
-				audio_result.sort(key=lambda m: m['channel_count'])
-				#keep the audio streams closest to transcoding channel count
-				audio_result = list(filter(lambda m: m['channel_count'] == audio_result[0]['channel_count'], audio_result))
-				if len(audio_result) == 1:
-					#there is one audio stream that better fits the stream
-					video_result = list(filter(lambda m: m['part_id'] == audio_result[0]['part_id'] and m['server'] == audio_result[0]['server'], video_result))
-				elif audio_result:
-					#there are multiple audio streams that all fit the stream the best; it doesn't matter which one we use so choose the one that has the video stream that best matches the transcoding video resolution
-					part_ids = [(a['part_id'], a['server']) for a in audio_result]
-					video_result = list(filter(lambda m: (m['part_id'], m['server']) in part_ids, video_result))
-					video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']), reverse=True)
-					video_result.sort(key=lambda m: abs(resolution_ladder.index(resolution) - resolution_ladder.index(m['resolution'])))
-					audio_result = list(filter(lambda m: m['part_id'] == video_result[0]['part_id'] and m['server'] == video_result[0]['server'], audio_result))
+				#get the audio streams between transcoding channel count and original stream channel count (tcc <= s < occ) that are closest to transcoding channel count
+				audio_result = _top(filter(lower_audio, audio_result), key=lambda m: -m.channel_count)
+				if audio_result:
+					part_ids = {_part(m) for m in audio_result}
+					video_result = [m for m in video_result if _part(m) in part_ids]
+					if len(audio_result) == 1:
+						#there is one audio stream that better fits the stream
+						audio, video = audio_result[0], next(iter(video_result), None)
+					else:
+						#there are multiple audio streams that all fit the stream the best; it doesn't matter which one we use so choose the one that has the video stream that best matches the transcoding video resolution
+						video = min(video_result, key=lambda m: (abs(rank - m.rank), -m.rank), default=None)
+						audio = next((m for m in audio_result if video and _part(m) == _part(video)), audio_result[0])
 				else:
 					#there are no audio streams that fit better; find better fitting video stream
-					video_result = list(filter(lambda m: resolution_ladder.index(resolution) <= resolution_ladder.index(m['resolution']) < resolution_ladder.index(video_resolution), video_result))
-					video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']))
+					video = min(filter(lower_video, video_result), key=lambda m: m.rank, default=None)
 
 		else: #up
 			if process_priority == 'video':
-				#get all video streams between transcoding resolution and max allowed resolution (tr < s <= mr)
-				video_result = list(filter(lambda m: resolution_ladder.index(resolution) < resolution_ladder.index(m['resolution']) <= resolution_ladder.index(max_resolution), video_result))
-				video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']), reverse=True)
-				#keep the highest resolution video streams
-				video_result = list(filter(lambda m: resolution_ladder.index(m['resolution']) == resolution_ladder.index(video_result[0]['resolution']), video_result))
-				if len(video_result) == 1:
-					#there is one video stream that is higher quality than the stream
-					audio_result = list(filter(lambda m: m['part_id'] == video_result[0]['part_id'] and m['server'] == video_result[0]['server'], audio_result))
-					audio_result.sort(key=lambda m: m['channel_count'], reverse=True)
-				elif video_result:
-					#there are multiple video streams that all fit the stream best; get the one with the highest audio channel count
-					part_ids = [(a['part_id'], a['server']) for a in video_result]
-					audio_result = list(filter(lambda m: (m['part_id'], m['server']) in part_ids, audio_result))
-					audio_result.sort(key=lambda m: m['channel_count'], reverse=True)
-					video_result = list(filter(lambda m: m['part_id'] == audio_result[0]['part_id'] and m['server']  == audio_result[0]['server'], video_result))
+				#get the highest resolution video streams between transcoding resolution and max allowed resolution (tr < s <= mr)
+				video_result = _top(filter(higher_video, video_result), key=lambda m: m.rank)
+				if video_result:
+					#get the highest channel count audio stream of the files
+					part_ids = {_part(m) for m in video_result}
+					audio = max((m for m in audio_result if _part(m) in part_ids), key=lambda m: m.channel_count, default=None)
+					video = next((m for m in video_result if audio and _part(m) == _part(audio)), video_result[0])
 				else:
 					#there are no video streams that fit better; find better fitting audio stream
-					audio_result = list(filter(lambda m: channels < m['channel_count'] <= max_channel_count, audio_result))
-					audio_result.sort(key=lambda m: (m['channel_count'], resolution_ladder.index(m['resolution'])), reverse=True)
+					audio = max(filter(higher_audio, audio_result), key=lambda m: (m.channel_count, m.rank), default=None)
 			else: #audio
-				#get all audio streams between transcoding channel count and max allowed channel count (tcc < s <= mcc)
-				audio_result = list(filter(lambda m: channels < m['channel_count'] <= max_channel_count, audio_result))
-				audio_result.sort(key=lambda m: m['channel_count'], reverse=True)
-				#keep the highest channel count audio streams
-				audio_result = list(filter(lambda m: m['channel_count'] == audio_result[0]['channel_count'], audio_result))
-				if len(audio_result) == 1:
-					#there is one audio stream that has a higher channel count than the stream
-					video_result = list(filter(lambda m: m['part_id'] == audio_result[0]['part_id'] and m['server'] == audio_result[0]['server'], video_result))
-					video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']), reverse=True)
-				elif audio_result:
-					#there are multiple audio streams that all fit the stream best; get the one with the highest resolution video stream
-					part_ids = [(a['part_id'], a['server']) for a in audio_result]
-					video_result = list(filter(lambda m: (m['part_id'], m['server']) in part_ids, video_result))
-					video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']), reverse=True)
-					audio_result = list(filter(lambda m: m['part_id'] == video_result[0]['part_id'] and m['server']  == video_result[0]['server'], audio_result))
+				#get the highest channel count audio streams between transcoding channel count and max allowed channel count (tcc < s <= mcc)
+				audio_result = _top(filter(higher_audio, audio_result), key=lambda m: m.channel_count)
+				if audio_result:
+					#get the highest resolution video stream of the files
+					part_ids = {_part(m) for m in audio_result}
+					video = max((m for m in video_result if _part(m) in part_ids), key=lambda m: m.rank, default=None)
+					audio = next((m for m in audio_result if video and _part(m) == _part(video)), audio_result[0])
 				else:
 					#there are no audio streams that fit better; find better fitting video stream
-					video_result = list(filter(lambda m: resolution_ladder.index(resolution) < resolution_ladder.index(m['resolution']) <= resolution_ladder.index(max_resolution), video_result))
-					video_result.sort(key=lambda m: resolution_ladder.index(m['resolution']), reverse=True)
+					video = max(filter(higher_video, video_result), key=lambda m: m.rank, default=None)
 
-	return video_result, audio_result
+	return [video] if video else [], [audio] if audio else []
+
+def _find_version(ssn, rating_key: str, resolution: str, channels: int, video_resolution: str, audio_channels: int, index: guid_index=None) -> tuple:
+	#map all available versions and their streams
+	if index is None:
+		media_info = ssn.get(f'{base_url}/library/metadata/{rating_key}', params={'includeGuids': '1'}).json()
+		video_result, audio_result = _search_versions(ssn, media_info)
+	else:
+		video_result, audio_result = index.get_versions(rating_key)
+
+	#pick the best video and audio stream
+	return _select_version(video_result, audio_result, resolution, channels, video_resolution, audio_channels)
 
 def stream_controller(
 	ssn, plex, player: str, rating_key: str,
 	resolution: str, channels: int, video_resolution: str, audio_channels: int, view_offset: int,
-	backup_plex=None
+	backup_plex=None, index: guid_index=None
 ):
 	result_json = [rating_key]
 	view_offset = view_offset * 1000
@@ -276,44 +392,82 @@ def stream_controller(
 	if exclude_clients and player in exclude_clients: return
 
 	#check for better versions
-	media_info = ssn.get(f'{base_url}/library/metadata/{rating_key}', params={'includeGuids': '1'}).json()
-	video_result, audio_result = _find_version(ssn, media_info, resolution.rstrip('p'), channels, video_resolution.rstrip('p'), audio_channels)
+	video_result, audio_result = _find_version(ssn, rating_key, resolution.rstrip('p'), channels, video_resolution.rstrip('p'), audio_channels, index)
 
 	#change stream if needed
 	if not video_result and not audio_result: return result_json
 	client = plex.client(player)
 	if not video_result and audio_result:
-		client.setAudioStream(audioStreamID=str(audio_result[0]['id']), mtype='video')
+		client.setAudioStream(audioStreamID=str(audio_result[0].id), mtype='video')
 	else:
 		client.stop(mtype='video')
-		if video_result[0]['server'] == 'main':
-			media = plex.fetchItem(f'/library/metadata/{video_result[0]["rating_key"]}')
-			client.playMedia(media, offset=view_offset, mediaIndex=video_result[0]['media_index'])
+		if video_result[0].server == 'main':
+			media = plex.fetchItem(f'/library/metadata/{video_result[0].rating_key}')
+			client.playMedia(media, offset=view_offset, mediaIndex=video_result[0].media_index)
 			if audio_result:
-				client.setAudioStream(audioStreamID=audio_result[0]['id'], mtype='video')
+				client.setAudioStream(audioStreamID=audio_result[0].id, mtype='video')
 		else: #backup
-			media = backup_plex.fetchItem(f'/library/metadata/{video_result[0]["rating_key"]}')
+			media = backup_plex.fetchItem(f'/library/metadata/{video_result[0].rating_key}')
 			backup_client = backup_plex.client(player)
-			backup_client.playMedia(media, offset=view_offset, mediaIndex=video_result[0]['media_index'])
+			backup_client.playMedia(media, offset=view_offset, mediaIndex=video_result[0].media_index)
 			if audio_result:
-				backup_client.setAudioStream(audioStreamID=audio_result[0]['id'], mtype='video')
+				backup_client.setAudioStream(audioStreamID=audio_result[0].id, mtype='video')
 
 	return result_json
 
+def stream_controller_daemon(ssn, plex, backup_plex=None):
+	from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+	from json import dumps, loads
+
+	#keep an index of the media on the servers that is updated when the libraries change
+	index = guid_index(ssn)
+	listeners = [plex.startAlertListener(callback=lambda data: index.update('main', data))]
+	if backup_plex != None and 'backup' in index.servers:
+		listeners.append(backup_plex.startAlertListener(callback=lambda data: index.update('backup', data)))
+
+	class trigger_handler(BaseHTTPRequestHandler):
+		def do_POST(self):
+			try:
+				args = loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or '{}')
+				response = stream_controller(
+					ssn=ssn, plex=plex, player=args['player'], rating_key=str(args['rating_key']),
+					resolution=args['resolution'], channels=int(args['channels']), video_resolution=args['video_resolution'], audio_channels=int(args['audio_channels']), view_offset=int(args['view_offset']),
+					backup_plex=backup_plex, index=index
+				)
+				status = 200
+			except (KeyError, ValueError) as e:
+				response, status = f'Invalid request: {e}', 400
+			except Exception as e:
+				response, status = str(e), 500
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.end_headers()
+			self.wfile.write(dumps(response).encode())
+			return
+
+		def log_message(self, format, *args):
+			return
+
+	server = ThreadingHTTPServer((daemon_ip, int(daemon_port)), trigger_handler)
+	print(f'Handling streams on {daemon_url}')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		print('Shutting down')
+		server.server_close()
+		for listener in listeners:
+			listener.stop()
+
+	return
+
 if __name__ == '__main__':
 	from requests import Session
 	from argparse import ArgumentParser
-	from plexapi.server import PlexServer
 
 	#setup vars
-	ssn = Session()
+	ssn = _setup_session(Session())
 	ssn.headers.update({'Accept': 'application/json'})
 	ssn.params.update({'X-Plex-Token': plex_api_token})
-	plex = PlexServer(base_url, plex_api_token)
-	if backup_plex_ip and backup_plex_port and backup_plex_api_token:
-		backup_plex = PlexServer(backup_base_url, backup_plex_api_token)
-	else:
-		backup_plex = None
 
 	#check / fix variables and argument parsing
 	if include_clients and exclude_clients:
@@ -329,15 +483,42 @@ if __name__ == '__main__':
 
 	#setup arg parsing
 	parser = ArgumentParser(description='When a local stream is started, check if a different version of the media exists that better matches the desired criteria (resolution or audio channel count).')
-	parser.add_argument('-p','--Player', type=str, help='The name of the player used for the stream', required=True)
-	parser.add_argument('-k','--RatingKey', type=str, help='The rating key of the media being streamed', required=True)
-	parser.add_argument('-r','--Resolution', type=str, help='The resolution of the stream', required=True)
-	parser.add_argument('-c','--Channels', type=int, help='The channel count of the stream', required=True)
-	parser.add_argument('-R','--VideoResolution', type=str, help='The resolution of the stream inside the file', required=True)
-	parser.add_argument('-C','--AudioChannels', type=int, help='The channel count of the stream inside the file', required=True)
-	parser.add_argument('-v','--ViewOffset', type=int, help='The offfset of the stream', required=True)
+	parser.add_argument('-d','--Daemon', help='Keep running and handle the streams that are handed over by tautulli', action='store_true')
+	parser.add_argument('-p','--Player', type=str, help='The name of the player used for the stream')
+	parser.add_argument('-k','--RatingKey', type=str, help='The rating key of the media being streamed')
+	parser.add_argument('-r','--Resolution', type=str, help='The resolution of the stream')
+	parser.add_argument('-c','--Channels', type=int, help='The channel count of the stream')
+	parser.add_argument('-R','--VideoResolution', type=str, help='The resolution of the stream inside the file')
+	parser.add_argument('-C','--AudioChannels', type=int, help='The channel count of the stream inside the file')
+	parser.add_argument('-v','--ViewOffset', type=int, help='The offfset of the stream')
 
 	args = parser.parse_args()
+	if not args.Daemon:
+		if None in (args.Player, args.RatingKey, args.Resolution, args.Channels, args.VideoResolution, args.AudioChannels, args.ViewOffset):
+			parser.error('the following arguments are required: -p/--Player, -k/--RatingKey, -r/--Resolution, -c/--Channels, -R/--VideoResolution, -C/--AudioChannels, -v/--ViewOffset')
+
+		#hand the stream to the daemon when it's running
+		from requests.exceptions import ConnectionError as requests_ConnectionError
+		try:
+			response = ssn.post(daemon_url, json={'player': args.Player, 'rating_key': args.RatingKey, 'resolution': args.Resolution, 'channels': args.Channels, 'video_resolution': args.VideoResolution, 'audio_channels': args.AudioChannels, 'view_offset': args.ViewOffset}, timeout=(1, None))
+		except requests_ConnectionError:
+			pass
+		else:
+			if response.status_code != 200:
+				parser.error(response.json())
+			exit(0)
+
+	from plexapi.server import PlexServer
+	plex = PlexServer(base_url, plex_api_token)
+	if backup_plex_ip and backup_plex_port and backup_plex_api_token:
+		backup_plex = PlexServer(backup_base_url, backup_plex_api_token)
+	else:
+		backup_plex = None
+
+	if args.Daemon:
+		stream_controller_daemon(ssn=ssn, plex=plex, backup_plex=backup_plex)
+		exit(0)
+
 	#call function and process result
 	response = stream_controller(ssn=ssn, plex=plex, player=args.Player, rating_key=args.RatingKey, resolution=args.Resolution, channels=args.Channels, video_resolution=args.VideoResolution, audio_channels=args.AudioChannels, view_offset=args.ViewOffset, backup_plex=backup_plex)
 	if not isinstance(response, list):
@@ -26,6 +26,16 @@ qbittorrent_username = getenv('qbittorrent_username', qbittorrent_username)
 qbittorrent_password = getenv('qbittorrent_password', qbittorrent_password)
 base_url = f"http://{qbittorrent_ip}:{qbittorrent_port}/api/v2"
 
+def _setup_session(ssn):
+	#keep connections alive and retry requests that failed to connect or got a 429 or 5xx response
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	adapter = HTTPAdapter(pool_maxsize=10, max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False))
+	ssn.mount('http://', adapter)
+	ssn.mount('https://', adapter)
+	return ssn
+
 def qbittorrent_tag_to_cat(ssn, tag_name: str, categories: list, wait: int=0):
 	result_json = []
 
@@ -52,7 +62,7 @@ if __name__ == '__main__':
 	import requests, argparse
 
 	#setup vars
-	ssn = requests.Session()
+	ssn = _setup_session(requests.Session())
 
 	#setup arg parsing
 	parser = argparse.ArgumentParser(description='If a torrent has a certain tag, then apply certain categories')